@@ -1,17 +1,54 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
 from flask_cors import CORS
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import traceback
 import re
+import threading
+import time
+import bisect
+import gzip
+import hashlib
+import heapq
+import itertools
+import math
+import mimetypes
+import multiprocessing
+import queue
+import random
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from fpdf import FPDF
 from io import BytesIO
 import tempfile
 from flask import send_from_directory
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
 from dotenv import load_dotenv
 
+from pdf_render import RenderTimeout, render_pdf_job, run_render_job
+from question_model import AnswerKeyEntry, Passage, Question
+
+try:
+    import fcntl  # Cross-worker single-flight locks (not available on Windows)
+except ImportError:
+    fcntl = None
+
+try:
+    import orjson  # Faster JSON responses, request bodies and structured model output
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # Brotli response compression; gzip is used without it
+except ImportError:
+    brotli = None
+
 # Try to import PyMuPDF for PDF processing
 try:
     import fitz  # PyMuPDF for PDF processing
@@ -36,7 +73,8 @@ DEBUG = os.environ.get('FLASK_ENV') == 'development'
 # Groq API configuration
 load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Point GROQ_API_URL at fake_groq_server.py to run without spending Groq quota
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
 
 # Startup check for API key
@@ -47,13 +85,266 @@ headers = {
     "Content-Type": "application/json"
 }
 
+# Groq HTTP client tuning. Each gunicorn worker keeps its own keep-alive pool so
+# repeated generations reuse the TCP+TLS connection to api.groq.com.
+GROQ_POOL_SIZE = int(os.environ.get('GROQ_POOL_SIZE', 10))
+GROQ_POOL_BLOCK = os.environ.get('GROQ_POOL_BLOCK', 'false').lower() == 'true'
+GROQ_CONNECT_TIMEOUT = float(os.environ.get('GROQ_CONNECT_TIMEOUT', 10))
+GROQ_READ_TIMEOUT = float(os.environ.get('GROQ_READ_TIMEOUT', 60))
+GROQ_TOTAL_TIMEOUT = float(os.environ.get('GROQ_TOTAL_TIMEOUT', 120))
+
+# Sectional passages are generated concurrently. GENERATION_MAX_WORKERS bounds the
+# whole process, GENERATION_PER_REQUEST bounds how many one request may run at once.
+GENERATION_MAX_WORKERS = int(os.environ.get('GENERATION_MAX_WORKERS', 8))
+GENERATION_PER_REQUEST = int(os.environ.get('GENERATION_PER_REQUEST', 3))
+
+# LLM response cache: an in-memory LRU tier backed by a directory on local disk.
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+LLM_CACHE_DIR = os.environ.get('LLM_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'clatai', 'llm-cache'))
+LLM_CACHE_DISK_MAX_BYTES = int(os.environ.get('LLM_CACHE_DISK_MAX_BYTES', 256 * 1024 * 1024))
+# Seconds a cached response stays fresh, per service (0 disables caching for it).
+# Override with e.g. LLM_CACHE_TTL_GK_RESEARCH=3600.
+LLM_CACHE_TTLS = {
+    service: int(os.environ.get(f'LLM_CACHE_TTL_{service.upper()}', default))
+    for service, default in {
+        'gk_research': 6 * 3600,
+        'gk_assistant': 24 * 3600,
+        'gk_upload': 24 * 3600,
+        'lexa_chatbot': 3600,
+        'qt_mentor': 0,
+        'sectional_tests': 0,
+    }.items()
+}
+# Chat replies quote users' own messages, so they stay in worker memory and are
+# not written to the shared disk tier unless LLM_CACHE_PERSIST_CHAT is set.
+LLM_CACHE_PERSIST_CHAT = os.environ.get('LLM_CACHE_PERSIST_CHAT', 'false').lower() == 'true'
+LLM_CACHE_MEMORY_ONLY = set() if LLM_CACHE_PERSIST_CHAT else {'lexa_chatbot'}
+
+# Groq admission control. Calls wait in a priority queue until the request and
+# token budgets allow them; limits learned from Groq's rate-limit headers take
+# over from these defaults. 0 disables a limit. The limits are for the whole
+# Groq account; each gunicorn worker runs its own scheduler and admits
+# 1/GROQ_WORKER_COUNT of them. The worker count defaults to WEB_CONCURRENCY,
+# which gunicorn also reads, so set one of the two when running several workers.
+GROQ_RPM_LIMIT = int(os.environ.get('GROQ_RPM_LIMIT', 30))
+GROQ_TPM_LIMIT = int(os.environ.get('GROQ_TPM_LIMIT', 0))
+GROQ_WORKER_COUNT = max(1, int(os.environ.get('GROQ_WORKER_COUNT', os.environ.get('WEB_CONCURRENCY', 1))))
+GROQ_MAX_QUEUE_WAIT = float(os.environ.get('GROQ_MAX_QUEUE_WAIT', 30))
+# Lower runs first. Services not listed here are 'standard'.
+GROQ_PRIORITIES = {'interactive': 0, 'standard': 1, 'bulk': 2, 'background': 3}
+SERVICE_PRIORITIES = {'lexa_chatbot': 'interactive', 'gk_assistant': 'interactive'}
+
+# Transient Groq failures (timeouts, connection errors, 5xx, 429) are retried
+# with full-jitter exponential backoff; a Retry-After longer than
+# GROQ_RETRY_MAX_DELAY is not waited out. Hedging sends a duplicate request when
+# a call runs past the service's GROQ_HEDGE_PERCENTILE latency. The circuit
+# breaker opens after GROQ_BREAKER_THRESHOLD consecutive failures and fails
+# fast (serving stale cached content where possible) for GROQ_BREAKER_COOLDOWN.
+GROQ_MAX_RETRIES = int(os.environ.get('GROQ_MAX_RETRIES', 2))
+GROQ_RETRY_BASE_DELAY = float(os.environ.get('GROQ_RETRY_BASE_DELAY', 0.5))
+GROQ_RETRY_MAX_DELAY = float(os.environ.get('GROQ_RETRY_MAX_DELAY', 10))
+GROQ_HEDGE_ENABLED = os.environ.get('GROQ_HEDGE_ENABLED', 'false').lower() == 'true'
+GROQ_HEDGE_PERCENTILE = float(os.environ.get('GROQ_HEDGE_PERCENTILE', 95))
+GROQ_HEDGE_MIN_SAMPLES = int(os.environ.get('GROQ_HEDGE_MIN_SAMPLES', 20))
+GROQ_BREAKER_THRESHOLD = int(os.environ.get('GROQ_BREAKER_THRESHOLD', 5))
+GROQ_BREAKER_COOLDOWN = float(os.environ.get('GROQ_BREAKER_COOLDOWN', 30))
+
+# Identical Groq calls in flight at the same time are made once and shared.
+# SINGLE_FLIGHT_LOCK_DIR extends this across gunicorn workers; set it empty to
+# coalesce only within each worker.
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+SINGLE_FLIGHT_LOCK_DIR = os.environ.get('SINGLE_FLIGHT_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'clatai', 'single-flight'))
+
+# Structured output: ask Groq for JSON (sectional passages and QT) and validate it
+# against a schema instead of parsing free text. Replies that do not validate
+# fall back to the text prompts and regex parsers.
+STRUCTURED_OUTPUT_ENABLED = os.environ.get('STRUCTURED_OUTPUT_ENABLED', 'false').lower() == 'true'
+
+# Sectional question bank: background producers keep parsed passages ready per
+# topic. Depth follows each topic's recent demand, bounded by MIN/MAX depth, and
+# each worker banks at most MAX_TOTAL passages across all topics. Off by default:
+# every banked passage is Groq usage nobody may ask for.
+QUESTION_BANK_ENABLED = os.environ.get('QUESTION_BANK_ENABLED', 'false').lower() == 'true'
+QUESTION_BANK_MIN_DEPTH = int(os.environ.get('QUESTION_BANK_MIN_DEPTH', 0))
+QUESTION_BANK_MAX_DEPTH = int(os.environ.get('QUESTION_BANK_MAX_DEPTH', 5))
+QUESTION_BANK_MAX_TOTAL = int(os.environ.get('QUESTION_BANK_MAX_TOTAL', 10))
+QUESTION_BANK_WORKERS = int(os.environ.get('QUESTION_BANK_WORKERS', 2))
+QUESTION_BANK_REFILL_SECONDS = float(os.environ.get('QUESTION_BANK_REFILL_SECONDS', 90))
+QUESTION_BANK_RATE_WINDOW = float(os.environ.get('QUESTION_BANK_RATE_WINDOW', 1800))
+
+# Background jobs for long-running test generation. Job state is persisted under
+# JOB_STORE_DIR so status and results survive a worker restart.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_STORE_DIR = os.environ.get('JOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'clatai', 'jobs'))
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 24 * 3600))
+JOB_TIMEOUT_SECONDS = int(os.environ.get('JOB_TIMEOUT_SECONDS', 30 * 60))
+
+# Generated sectional tests are kept under a test_id so /download-pdf and
+# /download-answer-key can render them without generating a new test. Tests are
+# held in a byte-bounded in-memory LRU and written through to TEST_STORE_DIR,
+# shared by every worker.
+TEST_STORE_MAX_BYTES = int(os.environ.get('TEST_STORE_MAX_BYTES', 16 * 1024 * 1024))
+TEST_STORE_DIR = os.environ.get('TEST_STORE_DIR', os.path.join(tempfile.gettempdir(), 'clatai', 'tests'))
+TEST_STORE_DISK_MAX_BYTES = int(os.environ.get('TEST_STORE_DISK_MAX_BYTES', 128 * 1024 * 1024))
+TEST_RETENTION_SECONDS = int(os.environ.get('TEST_RETENTION_SECONDS', 24 * 3600))
+
+# Rendered PDFs are cached on disk by a hash of what they are rendered from, so
+# repeated downloads of the same test or answer key skip rendering. The least
+# recently used PDFs are evicted once the directory is over PDF_CACHE_MAX_BYTES.
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'clatai', 'pdf-cache'))
+PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# PDFs are rendered in a pool of PDF_RENDER_WORKERS processes per worker, so the
+# CPU-bound rendering does not hold the GIL while request threads wait on Groq.
+# 0 renders in the request thread. Each process is replaced after
+# PDF_RENDER_MAX_TASKS renders to bound its memory. A render still running after
+# PDF_RENDER_TIMEOUT stops with a 503; the default stays under gunicorn's default
+# 30s worker timeout (the Procfile keeps it), so the worker is not killed first.
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_MAX_TASKS = int(os.environ.get('PDF_RENDER_MAX_TASKS', 50))
+PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', 20))
+
+# JSON encoder for responses and request bodies: 'orjson' (the default when it is
+# installed) or 'stdlib' for Flask's json-module provider
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson' if orjson else 'stdlib').lower()
+
+# Response compression. Text responses of at least COMPRESSION_MIN_BYTES are
+# sent gzip or brotli encoded to clients that accept it; static HTML, CSS, JS and
+# SVG files are compressed once at startup (except in development, so edits show
+# up without a restart) and served from memory.
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', 6))  # gzip level, and brotli quality, for dynamic responses
+
+# =============================================================================
+# RESPONSE COMPRESSION
+# =============================================================================
+
+# Preferred first when the client rates them equally
+COMPRESSION_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'image/svg+xml'
+}
+STATIC_PRECOMPRESS_EXTENSIONS = ('.html', '.css', '.js', '.svg')
+# Precompressed at startup: the pages and scripts next to app.py, plus these
+# directories. Nothing else under the app directory (a virtualenv,
+# node_modules) is read.
+STATIC_PRECOMPRESS_DIRS = ('radix-icons',)
+
+def negotiate_encoding():
+    """The encoding we support that the request's Accept-Encoding rates highest, or None for identity"""
+    best, best_quality = None, 0
+    for encoding in COMPRESSION_ENCODINGS:
+        quality = request.accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress_body(body, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output, and so the ETag, stable for the same body
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+@app.after_request
+def compress_response(response):
+    """Compress large text responses for clients that accept gzip or brotli"""
+    if not COMPRESSION_ENABLED or response.direct_passthrough or response.is_streamed:
+        # Files sent by send_file and event streams go out as they are
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+    compressed = compress_body(body, encoding, COMPRESSION_LEVEL)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def static_asset_paths(root):
+    """The files load_static_assets reads: root's own files and STATIC_PRECOMPRESS_DIRS"""
+    try:
+        names = sorted(os.listdir(root))
+    except OSError:
+        names = []
+    paths = [os.path.join(root, name) for name in names]
+    for subdirectory in STATIC_PRECOMPRESS_DIRS:
+        for directory, _, filenames in os.walk(os.path.join(root, subdirectory)):
+            paths.extend(os.path.join(directory, name) for name in sorted(filenames))
+    return [path for path in paths if path.endswith(STATIC_PRECOMPRESS_EXTENSIONS) and os.path.isfile(path)]
+
+def load_static_assets(root=None):
+    """Read the static text files served from root and compress each at the highest level, once"""
+    root = root or app.root_path
+    assets = {}
+    raw_bytes = sent_bytes = 0
+    for path in static_asset_paths(root):
+        name = os.path.basename(path)
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            modified = os.path.getmtime(path)
+        except OSError as e:
+            print(f"[STATIC] Could not read {path}: {e}")
+            continue
+        variants = {None: raw}
+        if len(raw) >= COMPRESSION_MIN_BYTES:
+            for encoding in COMPRESSION_ENCODINGS:
+                compressed = compress_body(raw, encoding, 11 if encoding == 'br' else 9)
+                if len(compressed) < len(raw):
+                    variants[encoding] = compressed
+        assets[os.path.relpath(path, root).replace(os.sep, '/')] = {
+            'variants': variants,
+            'etag': hashlib.sha1(raw).hexdigest(),
+            'mimetype': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            'modified': datetime.fromtimestamp(modified)
+        }
+        raw_bytes += len(raw)
+        sent_bytes += min(len(variant) for variant in variants.values())
+    if assets:
+        print(f"🗜️ Precompressed {len(assets)} static files: {raw_bytes // 1024}KB -> {sent_bytes // 1024}KB")
+    return assets
+
+static_assets = load_static_assets() if COMPRESSION_ENABLED and not DEBUG else {}
+
+def serve_static(filename):
+    """Serve a file from the app directory, precompressed from memory when it was loaded at startup"""
+    asset = static_assets.get(filename)
+    if asset is None:
+        return send_from_directory('.', filename)
+    variants = asset['variants']
+    encoding = negotiate_encoding() if len(variants) > 1 else None
+    if encoding not in variants:
+        encoding = None
+    response = Response(variants[encoding], mimetype=asset['mimetype'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(f"{asset['etag']}-{encoding}" if encoding else asset['etag'])
+    response.last_modified = asset['modified']
+    return response.make_conditional(request)
+
 @app.route("/")
 def home():
-    return send_from_directory('.', '1.land.html')
+    return serve_static('1.land.html')
 
 @app.route("/<path:filename>")
 def serve_file(filename):
-    return send_from_directory('.', filename)
+    return serve_static(filename)
 
 # =============================================================================
 # SYSTEM PROMPTS FOR DIFFERENT SERVICES
@@ -661,9 +952,781 @@ QT_TOPIC_MAPPING = {
 # =============================================================================
 # UTILITY FUNCTIONS
 # =============================================================================
-                                                              
-def call_groq_api(messages, temperature=0.7, max_tokens=7000):
-    """Generic function to call Groq API"""
+
+_groq_session = None
+_groq_session_pid = None
+_groq_session_lock = threading.Lock()
+
+def get_groq_session():
+    """Return the pooled keep-alive session shared by every service in this worker"""
+    global _groq_session, _groq_session_pid
+    pid = os.getpid()
+    if _groq_session is None or _groq_session_pid != pid:
+        with _groq_session_lock:
+            # Sessions must not be shared across a fork, so rebuild per worker pid
+            if _groq_session is None or _groq_session_pid != pid:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=GROQ_POOL_SIZE,
+                    pool_block=GROQ_POOL_BLOCK,
+                    max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update(headers)
+                session.headers["Connection"] = "keep-alive"
+                _groq_session = session
+                _groq_session_pid = pid
+                print(f"[DEBUG] Created Groq connection pool (size={GROQ_POOL_SIZE}) for worker {pid}")
+    return _groq_session
+
+def read_response_with_deadline(response, deadline):
+    """Read a streamed response body, failing once the overall deadline has passed"""
+    chunks = []
+    for chunk in response.iter_content(chunk_size=16384):
+        if time.monotonic() > deadline:
+            response.close()
+            raise requests.exceptions.Timeout(
+                f"Groq response exceeded total timeout of {GROQ_TOTAL_TIMEOUT}s"
+            )
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+class DiskLRU:
+    """Files in a directory every worker shares, keyed by a hex digest.
+
+    Writes are atomic. Once the directory holds more than max_bytes, prune()
+    removes the files with the oldest mtime, so readers touch() what they use.
+    """
+
+    def __init__(self, directory, max_bytes, suffix, prune_every=1):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def read(self, key):
+        """Return the bytes stored under key, or None if there are none"""
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def touch(self, key):
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            pass
+
+    def write(self, key, data):
+        """Store data under key and return how many files pruning removed"""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path), suffix='.tmp', delete=False) as tmp:
+            tmp.write(data)
+        os.replace(tmp.name, path)
+        with self._lock:
+            self._writes_since_prune += 1
+            should_prune = self._writes_since_prune >= self.prune_every
+            if should_prune:
+                self._writes_since_prune = 0
+        return self.prune() if should_prune else 0
+
+    def prune(self):
+        """Remove the least recently used files until the directory fits in max_bytes"""
+        if self.max_bytes <= 0:
+            return 0
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        files.sort()
+        evicted = 0
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+                evicted += 1
+            except OSError:
+                pass
+        return evicted
+
+class LLMResponseCache:
+    """Content-addressed cache of Groq completions.
+
+    Entries live in a byte-bounded in-memory LRU and are written through to a
+    directory on disk so they survive restarts and are shared between workers.
+    Freshness is decided on read from the per-service TTL.
+    """
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=0):
+        self.max_bytes = max_bytes
+        self.disk = DiskLRU(directory, disk_max_bytes, '.json', prune_every=50) if directory else None
+        self._entries = OrderedDict()  # key -> (value, created, nbytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stale': 0,
+            'stores': 0,
+            'evictions': 0,
+            'bypassed': 0,
+        }
+
+    @staticmethod
+    def make_key(payload):
+        """Hash the parts of a request that determine its completion"""
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, key, value, created):
+        nbytes = len(key) + len(value.encode('utf-8'))
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old[2]
+            self._entries[key] = (value, created, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self._bytes -= evicted_bytes
+                self.counters['evictions'] += 1
+
+    def get(self, key, ttl, allow_stale=False):
+        """Return a cached value younger than ttl seconds, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and (allow_stale or now - entry[1] <= ttl):
+                self._entries.move_to_end(key)
+                self.counters['memory_hits'] += 1
+                return entry[0]
+        if self.disk:
+            try:
+                data = self.disk.read(key)
+                if data is not None:
+                    stored = json.loads(data)
+                    if allow_stale or now - stored['created'] <= ttl:
+                        self._remember(key, stored['value'], stored['created'])
+                        self._count('disk_hits')
+                        self.disk.touch(key)
+                        return stored['value']
+                    self._count('stale')
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[CACHE] Ignoring unreadable cache entry {key[:12]}: {e}")
+        self._count('misses')
+        return None
+
+    def record_bypass(self):
+        """Count a lookup skipped because the caller asked for fresh content"""
+        self._count('bypassed')
+
+    def put(self, key, value, persist=True):
+        """Store a completion in memory, and on disk unless persist is False"""
+        created = time.time()
+        self._remember(key, value, created)
+        self._count('stores')
+        if not self.disk or not persist:
+            return
+        data = json.dumps({'created': created, 'value': value}).encode('utf-8')
+        try:
+            self.disk.write(key, data)
+        except OSError as e:
+            print(f"[CACHE] Could not write cache entry {key[:12]}: {e}")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 3) if lookups else 0.0
+        stats['max_bytes'] = self.max_bytes
+        stats['disk_enabled'] = bool(self.disk)
+        return stats
+
+llm_cache = LLMResponseCache(
+    LLM_CACHE_MAX_BYTES,
+    directory=LLM_CACHE_DIR or None,
+    disk_max_bytes=LLM_CACHE_DISK_MAX_BYTES
+)
+
+def llm_cache_key(payload, variant=None):
+    """Cache key for a Groq payload; variant separates otherwise identical prompts"""
+    return LLMResponseCache.make_key({
+        "model": payload["model"],
+        "messages": payload["messages"],
+        "temperature": payload["temperature"],
+        "max_tokens": payload["max_tokens"],
+        "variant": variant
+    })
+
+def cache_ttl_for(service):
+    """Freshness window for a service, or 0 when its responses are not cached"""
+    if not LLM_CACHE_ENABLED or not service:
+        return 0
+    return LLM_CACHE_TTLS.get(service, 0)
+
+def cache_on_disk(service):
+    """Whether a service's completions may go to the shared disk tier"""
+    return service not in LLM_CACHE_MEMORY_ONLY
+
+class GroqUnavailable(Exception):
+    """Groq cannot take a call right now; status is the HTTP status to report"""
+
+    def __init__(self, message, status=503, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after)) if retry_after else None
+
+def parse_groq_duration(value):
+    """Seconds in a Groq reset header such as '7.66s', '2m59.56s' or '120ms'"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+class GroqScheduler:
+    """Process-wide admission control for Groq calls.
+
+    Calls reserve one request and an estimate of their tokens from
+    per-minute buckets. Waiters are admitted strictly in priority order, so a
+    chat message queued behind a bulk PDF generation goes first, and a call
+    that cannot be admitted within max_wait raises GroqUnavailable.
+    Groq's x-ratelimit-* headers and 429 Retry-After responses correct the
+    buckets as responses come back.
+
+    Groq's limits are per account; with shares > 1 this process admits only
+    its share of them, and of what the headers report.
+    """
+
+    def __init__(self, rpm, tpm, max_wait, shares=1):
+        self.shares = shares
+        self.rpm = rpm / shares
+        self.tpm = tpm / shares
+        self.max_wait = max_wait
+        self._requests = self.rpm
+        self._tokens = self.tpm
+        self._refilled = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self.counters = {
+            'admitted': 0,
+            'queued': 0,
+            'queue_timeouts': 0,
+            'rate_limited': 0,
+            'max_queue_seconds': 0.0,
+        }
+
+    def _refill(self, now):
+        elapsed = now - self._refilled
+        self._refilled = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _delay(self, tokens, now):
+        """Seconds until a call needing tokens could be admitted"""
+        delay = self._blocked_until - now
+        if self.rpm and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tpm)
+        return delay
+
+    def acquire(self, priority, tokens):
+        """Block until a call may be sent; returns the number of tokens reserved"""
+        rank = GROQ_PRIORITIES.get(priority, GROQ_PRIORITIES['standard'])
+        entry = (rank, next(self._sequence))
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        with self._cond:
+            # Nothing is reserved while the token limit is still unknown
+            tokens = min(tokens, self.tpm) if self.tpm else 0
+            heapq.heappush(self._waiting, entry)
+            self._cond.notify_all()
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    delay = None
+                    if self._waiting[0] == entry:
+                        delay = self._delay(tokens, now)
+                        if delay <= 0:
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.counters['queue_timeouts'] += 1
+                        raise GroqUnavailable(
+                            "The AI service is busy right now. Please try again shortly.",
+                            status=503, retry_after=delay or 1
+                        )
+                    self._cond.wait(min(remaining, delay) if delay else remaining)
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+            waited = time.monotonic() - start
+            self.counters['admitted'] += 1
+            if waited > 0.001:
+                self.counters['queued'] += 1
+            self.counters['max_queue_seconds'] = round(max(self.counters['max_queue_seconds'], waited), 3)
+            self._cond.notify_all()
+        if waited > 0.001:
+            print(f"[SCHEDULER] {priority} call waited {waited:.2f}s for Groq capacity")
+        return tokens
+
+    def settle(self, reserved, used):
+        """Return the unused part of a token reservation once usage is known"""
+        # Calls admitted before the token limit was known reserved nothing, and
+        # the headers that taught it already count what they used
+        if not self.tpm or not reserved or used is None:
+            return
+        with self._cond:
+            self._tokens = min(self.tpm, self._tokens + reserved - used)
+            self._cond.notify_all()
+
+    def observe(self, response):
+        """Update budgets from a Groq response's rate-limit headers"""
+        headers = response.headers
+        now = time.monotonic()
+        with self._cond:
+            self._refill(now)
+            limit_tokens = headers.get('x-ratelimit-limit-tokens')
+            remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+            try:
+                if limit_tokens:
+                    learned = not self.tpm
+                    self.tpm = float(limit_tokens) / self.shares
+                    if learned:
+                        # Start from what Groq reports below, not an empty bucket
+                        self._tokens = self.tpm
+                if remaining_tokens and self.tpm:
+                    self._tokens = min(self._tokens, float(remaining_tokens) / self.shares)
+            except ValueError:
+                pass
+            # Groq's request headers count requests per day
+            if headers.get('x-ratelimit-remaining-requests') == '0':
+                reset = parse_groq_duration(headers.get('x-ratelimit-reset-requests'))
+                if reset:
+                    self._blocked_until = max(self._blocked_until, now + reset)
+            if response.status_code == 429:
+                self.counters['rate_limited'] += 1
+                retry_after = (parse_groq_duration(headers.get('retry-after'))
+                               or parse_groq_duration(headers.get('x-ratelimit-reset-tokens'))
+                               or 1)
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._cond.notify_all()
+
+    def retry_after(self):
+        with self._cond:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                **self.counters,
+                'waiting': len(self._waiting),
+                'shares': self.shares,
+                'rpm_limit': round(self.rpm, 2),
+                'tpm_limit': int(self.tpm),
+                'requests_available': round(self._requests, 2) if self.rpm else None,
+                'tokens_available': int(self._tokens) if self.tpm else None,
+                'blocked_for': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            }
+
+groq_scheduler = GroqScheduler(GROQ_RPM_LIMIT, GROQ_TPM_LIMIT, GROQ_MAX_QUEUE_WAIT, GROQ_WORKER_COUNT)
+
+def estimate_tokens(payload):
+    """Rough token reservation for a payload: prompt length plus the completion cap"""
+    prompt_chars = sum(len(m.get('content') or '') for m in payload['messages'])
+    return prompt_chars // 4 + payload['max_tokens']
+
+def groq_unavailable_response(e):
+    """JSON error response for a GroqUnavailable, with Retry-After when known"""
+    body = {'error': str(e)}
+    if e.retry_after:
+        body['retry_after'] = e.retry_after
+    response = jsonify(body)
+    response.status_code = e.status
+    if e.retry_after:
+        response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+class TransientGroqError(Exception):
+    """A failed Groq attempt that is worth retrying"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class GroqResilience:
+    """Circuit breaker and latency tracking for the Groq client.
+
+    The breaker opens after `threshold` consecutive transient failures and
+    rejects calls for `cooldown` seconds, then lets a single probe through
+    (half-open); the probe's outcome closes or reopens it. Failures count once
+    per call, however many attempts it made. Successful call latencies are
+    kept per service to pick hedging delays.
+    """
+
+    def __init__(self, threshold, cooldown, hedge_percentile, hedge_min_samples):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_thread = None
+        self._latencies = {}  # service -> deque of seconds
+        self._lock = threading.Lock()
+        self.counters = {
+            'retries': 0,
+            'retries_exhausted': 0,
+            'hedges_sent': 0,
+            'hedges_won': 0,
+            'breaker_opened': 0,
+            'short_circuited': 0,
+            'stale_served': 0,
+            'bank_served': 0,
+        }
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def allow(self):
+        """Whether a call may go to Groq now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                self._probe_thread = threading.get_ident()
+                return True
+            self.counters['short_circuited'] += 1
+            return False
+
+    def retry_after(self):
+        with self._lock:
+            return max(1.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print("[GROQ] Circuit breaker closed")
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self._failures >= self.threshold):
+                if self.state == 'closed':
+                    self.counters['breaker_opened'] += 1
+                print(f"[GROQ] Circuit breaker open for {self.cooldown:.0f}s after {self._failures} failures")
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def finish_probe(self):
+        """Let another probe through if this thread's half-open probe ended without an outcome"""
+        with self._lock:
+            if self.state == 'half_open' and self._probe_thread == threading.get_ident():
+                self._probing = False
+                self._probe_thread = None
+
+    def record_latency(self, service, seconds):
+        with self._lock:
+            self._latencies.setdefault(service, deque(maxlen=200)).append(seconds)
+
+    def hedge_delay(self, service):
+        """Seconds after which to hedge a call, or None without enough history"""
+        with self._lock:
+            samples = sorted(self._latencies.get(service, ()))
+        if len(samples) < self.hedge_min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * self.hedge_percentile / 100))
+        return samples[index]
+
+    def stats(self):
+        with self._lock:
+            latencies = {service: sorted(samples) for service, samples in self._latencies.items()}
+            stats = {**self.counters, 'breaker_state': self.state, 'consecutive_failures': self._failures}
+        stats['latency'] = {
+            service: {
+                'samples': len(samples),
+                'p50': round(samples[len(samples) // 2], 3),
+                'p95': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+            }
+            for service, samples in latencies.items() if samples
+        }
+        return stats
+
+groq_resilience = GroqResilience(
+    GROQ_BREAKER_THRESHOLD,
+    GROQ_BREAKER_COOLDOWN,
+    GROQ_HEDGE_PERCENTILE,
+    GROQ_HEDGE_MIN_SAMPLES
+)
+
+def retry_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than Retry-After"""
+    delay = random.uniform(0, min(GROQ_RETRY_MAX_DELAY, GROQ_RETRY_BASE_DELAY * 2 ** attempt))
+    return max(delay, retry_after or 0)
+
+_hedge_executor = None
+_hedge_executor_pid = None
+_hedge_executor_lock = threading.Lock()
+
+def get_hedge_executor():
+    """Return this worker's pool for hedged Groq attempts"""
+    global _hedge_executor, _hedge_executor_pid
+    pid = os.getpid()
+    if _hedge_executor is None or _hedge_executor_pid != pid:
+        with _hedge_executor_lock:
+            if _hedge_executor is None or _hedge_executor_pid != pid:
+                _hedge_executor = ThreadPoolExecutor(max_workers=GROQ_POOL_SIZE * 2, thread_name_prefix="hedge")
+                _hedge_executor_pid = pid
+    return _hedge_executor
+
+class SingleFlight:
+    """Coalesces identical calls that are in flight at the same time.
+
+    The first caller for a key runs the call; concurrent callers with the same
+    key wait for it and share its result. With a lock directory, workers in
+    other processes take a file lock per key and pick up the leader's result
+    from a short-lived result file instead of repeating the call.
+    """
+
+    RESULT_MAX_AGE = 300
+
+    def __init__(self, wait_timeout, lock_dir=None):
+        self.wait_timeout = wait_timeout
+        self.lock_dir = lock_dir if fcntl else None
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._leads_since_prune = 0
+        self.counters = {
+            'calls': 0,
+            'coalesced': 0,
+            'coalesced_cross_worker': 0,
+            'wait_timeouts': 0,
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def do(self, key, fn):
+        """Return fn(), sharing the result with concurrent callers for key"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+
+        if not leader:
+            try:
+                result = flight.result(timeout=self.wait_timeout)
+            except TimeoutError:
+                self._count('wait_timeouts')
+                self._count('calls')
+                return fn()
+            self._count('coalesced')
+            return result
+
+        try:
+            result = self._lead(key, fn)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+        return result
+
+    def _lead(self, key, fn):
+        if not self.lock_dir:
+            self._count('calls')
+            return fn()
+        try:
+            os.makedirs(self.lock_dir, exist_ok=True)
+            lock_file = open(os.path.join(self.lock_dir, f"{key}.lock"), 'a')
+        except OSError as e:
+            print(f"[SINGLE-FLIGHT] Lock directory unavailable, calling directly: {e}")
+            self._count('calls')
+            return fn()
+
+        result_path = os.path.join(self.lock_dir, f"{key}.result")
+        try:
+            started = time.time()
+            if not self._try_lock(lock_file):
+                # Another worker is making this call; wait for it to finish
+                locked = self._wait_for_lock(lock_file)
+                shared = self._read_result(result_path, started)
+                if shared is not None:
+                    self._count('coalesced_cross_worker')
+                    return shared
+                if not locked:
+                    self._count('wait_timeouts')
+                    self._count('calls')
+                    return fn()
+            os.utime(lock_file.name)
+            self._count('calls')
+            result = fn()
+            if isinstance(result, str):
+                self._write_result(result_path, result)
+            return result
+        finally:
+            lock_file.close()  # releases the lock
+
+    @staticmethod
+    def _try_lock(lock_file):
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _wait_for_lock(self, lock_file):
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            if self._try_lock(lock_file):
+                return True
+            time.sleep(0.05)
+        return False
+
+    @staticmethod
+    def _read_result(path, since):
+        try:
+            if os.path.getmtime(path) < since:
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)['value']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_result(self, path, value):
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.lock_dir,
+                                             suffix='.tmp', delete=False) as tmp:
+                json.dump({'value': value}, tmp)
+            os.replace(tmp.name, path)
+        except OSError as e:
+            print(f"[SINGLE-FLIGHT] Could not share result {os.path.basename(path)[:12]}: {e}")
+            return
+        with self._lock:
+            self._leads_since_prune += 1
+            should_prune = self._leads_since_prune >= 50
+            if should_prune:
+                self._leads_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Remove lock and result files no flight has touched recently"""
+        cutoff = time.time() - max(self.RESULT_MAX_AGE, 2 * self.wait_timeout)
+        try:
+            names = os.listdir(self.lock_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.lock_dir, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if not name.endswith('.lock'):
+                    os.unlink(path)
+                    continue
+                # A leader in another worker may still hold an old lock file
+                with open(path, 'a') as lock_file:
+                    if self._try_lock(lock_file):
+                        os.unlink(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['in_flight'] = len(self._flights)
+        stats['saved'] = stats['coalesced'] + stats['coalesced_cross_worker']
+        stats['cross_worker'] = bool(self.lock_dir)
+        return stats
+
+def groq_call_budget():
+    """Longest a call_groq_api call can run: every attempt's queueing and timeouts plus the backoff between them"""
+    attempts = GROQ_MAX_RETRIES + 1
+    return (attempts * (GROQ_MAX_QUEUE_WAIT + GROQ_CONNECT_TIMEOUT + GROQ_TOTAL_TIMEOUT)
+            + GROQ_MAX_RETRIES * GROQ_RETRY_MAX_DELAY)
+
+single_flight = SingleFlight(
+    wait_timeout=groq_call_budget(),
+    lock_dir=SINGLE_FLIGHT_LOCK_DIR or None
+)
+
+def call_groq_api(messages, temperature=0.7, max_tokens=7000, service=None, fresh=False, variant=None,
+                  priority=None, response_format=None):
+    """Generic function to call Groq API.
+
+    When the service has a cache TTL the completion is served from and stored in
+    llm_cache; fresh=True skips the lookup but still stores the new result.
+    Identical concurrent calls share one request through single_flight, except
+    fresh calls, which always get their own completion. The call waits its turn
+    in groq_scheduler at the service's priority unless one is given, and raises
+    GroqUnavailable if Groq has no capacity for it. response_format is passed
+    through to Groq (JSON_RESPONSE_FORMAT asks for a JSON object).
+    """
     if not GROQ_API_KEY:
         print("[ERROR] GROQ_API_KEY is not set. Cannot call Groq API.")
         return None
@@ -674,25 +1737,304 @@ def call_groq_api(messages, temperature=0.7, max_tokens=7000):
         "max_tokens": max_tokens,
         "top_p": 0.9
     }
-                                                              
+    if response_format:
+        payload["response_format"] = response_format
+
+    ttl = cache_ttl_for(service)
+    cache_key = llm_cache_key(payload, variant) if ttl else None
+    if cache_key:
+        if fresh:
+            llm_cache.record_bypass()
+        else:
+            cached = llm_cache.get(cache_key, ttl)
+            if cached is not None:
+                print(f"[CACHE] Serving cached {service} response ({cache_key[:12]})")
+                return cached
+
+    priority = priority or SERVICE_PRIORITIES.get(service, 'standard')
+
+    def complete():
+        try:
+            content = post_groq_completion(payload, priority, service)
+        except GroqUnavailable:
+            stale = stale_completion(cache_key, service)
+            if stale is None:
+                raise
+            return stale
+        if content is None:
+            return stale_completion(cache_key, service)
+        if cache_key:
+            llm_cache.put(cache_key, content, persist=cache_on_disk(service))
+        return content
+
+    if fresh or not SINGLE_FLIGHT_ENABLED:
+        return complete()
+    return single_flight.do(cache_key or llm_cache_key(payload, variant), complete)
+
+def stale_completion(cache_key, service):
+    """An expired cached completion to fall back on while Groq is failing"""
+    if not cache_key:
+        return None
+    stale = llm_cache.get(cache_key, 0, allow_stale=True)
+    if stale is not None:
+        groq_resilience.count('stale_served')
+        print(f"[CACHE] Groq unavailable, serving stale {service} response ({cache_key[:12]})")
+    return stale
+
+def post_groq_completion(payload, priority='standard', service=None):
+    """Send a completion request to Groq and return the message content.
+
+    Transient failures are retried with backoff. Returns None when the request
+    fails, and raises GroqUnavailable when the circuit breaker is open or Groq
+    keeps rate limiting the call.
+    """
+    if not groq_resilience.allow():
+        raise GroqUnavailable("The AI service is temporarily unavailable. Please try again shortly.",
+                              status=503, retry_after=groq_resilience.retry_after())
+    try:
+        return retry_groq_completion(payload, priority, service)
+    finally:
+        groq_resilience.finish_probe()
+
+def retry_groq_completion(payload, priority, service):
+    """Attempt a completion, retrying transient failures with jittered backoff"""
+    outage = False
+    for attempt in range(GROQ_MAX_RETRIES + 1):
+        try:
+            content = hedged_groq_completion(payload, priority, service)
+        except TransientGroqError as e:
+            # 429s are the scheduler's concern; only outages trip the breaker
+            outage = outage or e.status != 429
+            error = e
+            if attempt == GROQ_MAX_RETRIES or not groq_resilience.allow():
+                break
+            if e.retry_after and e.retry_after > GROQ_RETRY_MAX_DELAY:
+                break
+            delay = retry_delay(attempt, e.retry_after)
+            groq_resilience.count('retries')
+            print(f"[GROQ] {e}; retrying in {delay:.1f}s (attempt {attempt + 2}/{GROQ_MAX_RETRIES + 1})")
+            time.sleep(delay)
+            continue
+        except requests.exceptions.RequestException as e:
+            # Groq answered, so it is up even though this request was rejected
+            groq_resilience.record_success()
+            print(f"Error calling Groq API: {e}")
+            return None
+        except (KeyError, IndexError, ValueError) as e:
+            groq_resilience.record_success()
+            print(f"Error parsing Groq API response: {e}")
+            return None
+        groq_resilience.record_success()
+        return content
+
+    if outage:
+        groq_resilience.record_failure()
+    groq_resilience.count('retries_exhausted')
+    print(f"Error calling Groq API: {error}")
+    if error.status == 429:
+        raise GroqUnavailable("The AI service rate limit was reached. Please try again shortly.",
+                              status=429, retry_after=max(error.retry_after or 0, groq_scheduler.retry_after()))
+    return None
+
+def hedged_groq_completion(payload, priority, service):
+    """Run one attempt, adding a duplicate if it outlasts the service's usual latency"""
+    delay = None
+    if GROQ_HEDGE_ENABLED and priority in ('interactive', 'standard'):
+        delay = groq_resilience.hedge_delay(service)
+    if delay is None:
+        return timed_groq_completion(payload, priority, service)
+
+    executor = get_hedge_executor()
+    primary = executor.submit(timed_groq_completion, payload, priority, service)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    groq_resilience.count('hedges_sent')
+    print(f"[GROQ] {service} call exceeded {delay:.1f}s, sending a hedged request")
+    hedge = executor.submit(timed_groq_completion, payload, priority, service)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    groq_resilience.count('hedges_won')
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+def timed_groq_completion(payload, priority, service):
+    """Send one attempt and record its latency for hedging"""
+    started = time.monotonic()
+    content = send_groq_completion(payload, priority)
+    groq_resilience.record_latency(service or 'default', time.monotonic() - started)
+    return content
+
+def send_groq_completion(payload, priority):
+    """Make a single Groq request, raising TransientGroqError for retryable failures"""
+    reserved = groq_scheduler.acquire(priority, estimate_tokens(payload))
+    used = None
     try:
         print(f"[DEBUG] Sending payload with max_tokens={payload['max_tokens']}")
         print(f"[DEBUG] Payload preview: {json.dumps(payload)[:500]}...")
-        response = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=120)
+        deadline = time.monotonic() + GROQ_TOTAL_TIMEOUT
+        response = get_groq_session().post(
+            GROQ_API_URL,
+            json=payload,
+            timeout=(GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT),
+            stream=True
+        )
+        body = read_response_with_deadline(response, deadline)
+        groq_scheduler.observe(response)
+        if response.status_code == 429 or response.status_code >= 500:
+            if response.status_code == 429:
+                used = 0
+            raise TransientGroqError(
+                f"Groq returned HTTP {response.status_code}",
+                status=response.status_code,
+                retry_after=parse_groq_duration(response.headers.get('retry-after'))
+            )
 
+        if response.status_code >= 400:
+            print(f"Groq API response: {body.decode('utf-8', 'replace')}")
         response.raise_for_status()
         
-        data = response.json()
+        data = json.loads(body)
+        used = (data.get('usage') or {}).get('total_tokens')
         return data['choices'][0]['message']['content']
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Groq API: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Groq API response: {e.response.text}")
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+            requests.exceptions.ChunkedEncodingError) as e:
+        raise TransientGroqError(f"Groq request failed: {e}") from e
+    finally:
+        groq_scheduler.settle(reserved, used)
+
+def open_groq_stream(messages, temperature=0.7, max_tokens=1024, service=None, fresh=False, priority=None,
+                     variant=None):
+    """Start a streaming Groq completion and return an iterator of content deltas.
+
+    The request is sent eagerly so connection and HTTP errors are reported here
+    (returning None, like call_groq_api); the deltas are then read lazily. A
+    cached completion is replayed as a single delta, and a completed stream is
+    stored in the cache under the same key call_groq_api would use.
+    """
+    if not GROQ_API_KEY:
+        print("[ERROR] GROQ_API_KEY is not set. Cannot call Groq API.")
         return None
-    except KeyError as e:
-        print(f"Error parsing Groq API response: {e}")
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "top_p": 0.9
+    }
+
+    ttl = cache_ttl_for(service)
+    cache_key = llm_cache_key(payload, variant) if ttl else None
+    if cache_key:
+        if fresh:
+            llm_cache.record_bypass()
+        else:
+            cached = llm_cache.get(cache_key, ttl)
+            if cached is not None:
+                print(f"[CACHE] Replaying cached {service} response ({cache_key[:12]})")
+                return iter([cached])
+    if not groq_resilience.allow():
+        stale = stale_completion(cache_key, service)
+        if stale is not None:
+            return iter([stale])
+        raise GroqUnavailable("The AI service is temporarily unavailable. Please try again shortly.",
+                              status=503, retry_after=groq_resilience.retry_after())
+    payload["stream"] = True
+    prompt_tokens = estimate_tokens(payload) - max_tokens
+    try:
+        reserved = groq_scheduler.acquire(priority or SERVICE_PRIORITIES.get(service, 'standard'),
+                                          estimate_tokens(payload))
+    except GroqUnavailable:
+        # Turned away before reaching Groq, so this says nothing about its health
+        groq_resilience.finish_probe()
+        raise
+
+    def on_close(content):
+        # Streamed chunks carry no usage totals, so settle on an estimate of
+        # what was read, whether the stream finished, failed or was abandoned
+        groq_scheduler.settle(reserved, prompt_tokens + len(content) // 4)
+
+    def on_complete(content):
+        if cache_key:
+            llm_cache.put(cache_key, content, persist=cache_on_disk(service))
+
+    # A call that fails before streaming may still have spent its prompt
+    used = prompt_tokens
+    try:
+        print(f"[DEBUG] Opening Groq stream with max_tokens={payload['max_tokens']}")
+        deadline = time.monotonic() + GROQ_TOTAL_TIMEOUT
+        response = get_groq_session().post(
+            GROQ_API_URL,
+            json=payload,
+            timeout=(GROQ_CONNECT_TIMEOUT, GROQ_READ_TIMEOUT),
+            stream=True
+        )
+        groq_scheduler.observe(response)
+        if response.status_code == 429:
+            response.close()
+            used = 0
+            raise GroqUnavailable(
+                "The AI service rate limit was reached. Please try again shortly.",
+                status=429, retry_after=groq_scheduler.retry_after()
+            )
+        if response.status_code >= 400:
+            body = read_response_with_deadline(response, deadline)
+            print(f"Groq API response: {body.decode('utf-8', 'replace')}")
+            response.raise_for_status()
+        groq_resilience.record_success()
+        # From here the stream settles the reservation when it is closed
+        used = None
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)) or (
+                e.response is not None and e.response.status_code >= 500):
+            groq_resilience.record_failure()
+        print(f"Error opening Groq stream: {e}")
         return None
+    finally:
+        groq_resilience.finish_probe()
+        if used is not None:
+            groq_scheduler.settle(reserved, used)
+    return iter_groq_stream(response, deadline, on_complete, on_close)
+
+def iter_groq_stream(response, deadline, on_complete=None, on_close=None):
+    """Yield content deltas from a Groq server-sent event stream.
+
+    on_complete gets the full text once the stream ends normally; on_close gets
+    whatever was read when the generator finishes, fails or is closed early.
+    """
+    parts = []
+    try:
+        for line in response.iter_lines():
+            if time.monotonic() > deadline:
+                raise requests.exceptions.Timeout(
+                    f"Groq stream exceeded total timeout of {GROQ_TOTAL_TIMEOUT}s"
+                )
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            chunk = json.loads(data.decode("utf-8"))
+            choices = chunk.get("choices") or []
+            if not choices:
+                continue
+            delta = (choices[0].get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+        if on_complete and parts:
+            on_complete("".join(parts))
+    finally:
+        response.close()
+        if on_close:
+            on_close("".join(parts))
 
 def validate_qt_content(content):
     """Basic validation to ensure QT content quality"""
@@ -704,124 +2046,386 @@ def validate_qt_content(content):
     except:
         return False
 
+# The cleaning was five regex deletion passes, then the line break and space
+# normalization (remove_formatting_artifacts_by_pass in test_cleaning.py keeps
+# them as the reference). The deletions are fused into one scan. Each (tags,
+# stray backslashes, hashes, and stars that do not end up directly before "(")
+# is decided on the original text by looking past the tags, hashes and stray
+# backslashes the earlier passes would have removed. The pattern starts with a
+# character class so the scan skips ordinary text quickly.
+FORMATTING_TAG = r'<[^>]+>'
+FORMATTING_STRAY_BACKSLASH = r'(?!(?:' + FORMATTING_TAG + r')*[ntr\\"\'])'
+FORMATTING_DELETE_RE = re.compile(
+    r'[<\\#*](?:'
+    r'(?<=<)[^>]+>'
+    r'|(?<=\\)' + FORMATTING_STRAY_BACKSLASH +
+    r'|(?<=#)#*'
+    r'|(?<=\*)(?!(?:\*|' + FORMATTING_TAG + r'|#|\\' + FORMATTING_STRAY_BACKSLASH + r')*\()'
+    r')'
+)
+# Stars left before "(" lose pairs from the left, keeping one only from an odd run
+FORMATTING_STAR_PAIRS_RE = re.compile(r'\*\*(?:\*\*)*(?=\*?\()')
+FORMATTING_LINE_BREAKS_RE = re.compile(r'\n\s*\n\s*\n')
+# Single spaces are left alone rather than replaced by themselves
+FORMATTING_SPACES_RE = re.compile(r'  +')
+
+def remove_formatting_artifacts(text):
+    """Apply the artifact-cleaning passes without trimming the result.
+
+    One scan for all the deletions, then the line break and space
+    normalization; test_cleaning.py checks it against the passes it replaced.
+    """
+    cleaned = FORMATTING_DELETE_RE.sub('', text)
+    if '*' in cleaned:
+        cleaned = FORMATTING_STAR_PAIRS_RE.sub('', cleaned)
+    cleaned = FORMATTING_LINE_BREAKS_RE.sub('\n\n', cleaned)
+    if '  ' in cleaned:
+        cleaned = FORMATTING_SPACES_RE.sub(' ', cleaned)
+    return cleaned
+
 def clean_formatting_artifacts(text):
     """Clean up formatting artifacts from AI-generated content"""
     if not text:
         return text
     
-    cleaned = text
-
-    # Remove XML/HTML-like tags such as <lend_header_idl>
-    cleaned = re.sub(r'<[^>]+>', '', cleaned)
-    
-    # Remove backslashes that are not part of valid escape sequences
-    cleaned = re.sub(r'\\(?!n|t|r|\\|"|\')', '', cleaned)
-    
-    # Remove hashtags and markdown symbols that shouldn't be visible
-    cleaned = re.sub(r'#+', '', cleaned)  # Remove hashtags
-    cleaned = re.sub(r'\*\*(?!MCQs|ANSWER KEY)', '', cleaned)  # Remove ** except for MCQs and ANSWER KEY
-    cleaned = re.sub(r'\*(?!\()', '', cleaned)  # Remove * except for option markers like (A)
-    
-    # Remove extra whitespace and normalize line breaks
-    cleaned = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned)  # Remove excessive line breaks
-    cleaned = re.sub(r' +', ' ', cleaned)  # Remove multiple spaces
-    
     # Clean up the text
-    cleaned = cleaned.strip()
-    
-    return cleaned
+    return remove_formatting_artifacts(text).strip()
+
+class IncrementalCleaner:
+    """Apply clean_formatting_artifacts chunk by chunk to streamed text.
+
+    Text is held back until it ends in a character that cleaning never changes
+    and that is outside any tag, so the released prefix cleans the same on its
+    own as in the whole response and the concatenated output always equals
+    clean_formatting_artifacts(full_text). Only the trailing cluster, or an
+    unclosed tag, is ever held back.
+    """
+
+    # Characters whose cleaning depends on what follows them
+    SPECIAL_CHARS = '<>\\*#'
+
+    def __init__(self):
+        self._pending = ''
+        self._started = False
+
+    def _safe_length(self):
+        text = self._pending
+        end = len(text)
+        while end > 0:
+            if text[end - 1].isspace() or text[end - 1] in self.SPECIAL_CHARS:
+                end -= 1
+                continue
+            # Never split inside a tag that is still open at the split point
+            open_tag = text.find('<', text.rfind('>', 0, end) + 1, end)
+            if open_tag == -1:
+                break
+            end = open_tag
+        return end
+
+    def _emit(self, cleaned):
+        if not self._started:
+            cleaned = cleaned.lstrip()
+            self._started = bool(cleaned)
+        return cleaned
+
+    def feed(self, chunk):
+        """Add raw text and return whatever cleaned text is now final"""
+        if not chunk:
+            return ''
+        self._pending += chunk
+        end = self._safe_length()
+        if end == 0:
+            return ''
+        ready, self._pending = self._pending[:end], self._pending[end:]
+        return self._emit(remove_formatting_artifacts(ready))
+
+    def flush(self):
+        """Return the cleaned remainder once the stream has finished"""
+        ready, self._pending = self._pending, ''
+        return self._emit(remove_formatting_artifacts(ready)).rstrip()
+
+def sse_event(data, event=None):
+    """Format a server-sent event carrying a JSON payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {app.json.dumps(data)}\n\n"
+
+def wants_compact(data):
+    """Whether the client asked for each passage once in a table instead of on every question"""
+    return isinstance(data, dict) and data.get('compact') is True
+
+def wants_event_stream(data):
+    """Whether the client opted in to a server-sent event response"""
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
 
-def generate_study_material(topic, count):
-    """Generate study material for sectional tests"""
-    all_sections = []
-    for i in range(count):
-        print(f"📝 Generating section {i+1}/{count} for {topic}...")
-        mapped_topic = SUBCATEGORY_MAPPINGS.get(topic or "", topic or "")
-        prompt = SECTIONAL_PROMPTS.get(mapped_topic, f"Generate a CLAT-level {mapped_topic} test with passage, questions, and answer key.")
+def stream_cleaned_response(deltas, service):
+    """Relay Groq deltas as cleaned server-sent events"""
+    cleaner = IncrementalCleaner()
+    try:
+        for delta in deltas:
+            text = cleaner.feed(delta)
+            if text:
+                yield sse_event({"delta": text})
+        text = cleaner.flush()
+        if text:
+            yield sse_event({"delta": text})
+        yield sse_event({
+            "status": "success",
+            "service": service,
+            "timestamp": datetime.now().isoformat()
+        }, event="done")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        print(f"{service} stream error: {e}")
+        yield sse_event({"error": "Response stream interrupted. Please try again."}, event="error")
+
+def event_stream_response(events):
+    """Wrap a generator of server-sent events in an unbuffered response"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+_generation_executor = None
+_generation_executor_pid = None
+_generation_executor_lock = threading.Lock()
+
+def get_generation_executor():
+    """Return the process-wide executor used to fan out passage generation"""
+    global _generation_executor, _generation_executor_pid
+    pid = os.getpid()
+    if _generation_executor is None or _generation_executor_pid != pid:
+        with _generation_executor_lock:
+            if _generation_executor is None or _generation_executor_pid != pid:
+                _generation_executor = ThreadPoolExecutor(
+                    max_workers=GENERATION_MAX_WORKERS,
+                    thread_name_prefix="generation"
+                )
+                _generation_executor_pid = pid
+    return _generation_executor
+
+def section_messages(topic, structured=False):
+    """Chat messages asking Groq for one sectional passage on topic, as JSON if structured"""
+    mapped_topic = SUBCATEGORY_MAPPINGS.get(topic or "", topic or "")
+    prompt = SECTIONAL_PROMPTS.get(mapped_topic, f"Generate a CLAT-level {mapped_topic} test with passage, questions, and answer key.")
 
-        # Remove strict word count rules from enhanced_prompt
-        enhanced_prompt = f"""
+    # Remove strict word count rules from enhanced_prompt
+    enhanced_prompt = f"""
 {prompt}
 
 Start now.
 """
-
-        messages = [
-            {"role": "system", "content": "You are an expert CLAT study material generator. You MUST follow the exact format specified in the prompt."},
-            {"role": "user", "content": enhanced_prompt}
-        ]
-        result = call_groq_api(messages)
-        if result:
-            # Clean up formatting artifacts
-            cleaned_result = clean_formatting_artifacts(result)
-            print(f"[DEBUG] Raw AI response length: {len(result)}")
-            print(f"[DEBUG] Cleaned response length: {len(cleaned_result)}")
-            print(f"[DEBUG] Response preview: {cleaned_result[:300]}...")
-            if "**MCQs**" in cleaned_result:
-                print(f"[DEBUG] ✅ MCQs section found")
-            else:
-                print(f"[DEBUG] ❌ MCQs section NOT found")
-                print(f"[DEBUG] Full response: {cleaned_result}")
-            all_sections.append(f"Topic: {topic}\n\n{cleaned_result.strip()}")
-        else:
-            print(f"❌ Failed to generate section {i+1}")
+    if structured:
+        enhanced_prompt += SECTION_JSON_INSTRUCTIONS
+
+    return [
+        {"role": "system", "content": "You are an expert CLAT study material generator. You MUST follow the exact format specified in the prompt."},
+        {"role": "user", "content": enhanced_prompt}
+    ]
+
+def generate_section(topic, index, count, fresh=False, priority=None):
+    """Generate a single sectional passage, returning None if generation failed"""
+    print(f"📝 Generating section {index+1}/{count} for {topic}...")
+    messages = section_messages(topic)
+    # The passage index is part of the cache key so one request never gets
+    # the same cached passage twice
+    result = call_groq_api(messages, service='sectional_tests', fresh=fresh, variant=index, priority=priority)
+    if not result:
+        print(f"❌ Failed to generate section {index+1}")
+        return None
+    # Clean up formatting artifacts
+    cleaned_result = clean_formatting_artifacts(result)
+    print(f"[DEBUG] Raw AI response length: {len(result)}")
+    print(f"[DEBUG] Cleaned response length: {len(cleaned_result)}")
+    print(f"[DEBUG] Response preview: {cleaned_result[:300]}...")
+    if "**MCQs**" in cleaned_result:
+        print(f"[DEBUG] ✅ MCQs section found")
+    else:
+        print(f"[DEBUG] ❌ MCQs section NOT found")
+        print(f"[DEBUG] Full response: {cleaned_result}")
+    return f"Topic: {topic}\n\n{cleaned_result.strip()}"
+
+def generate_structured_section(topic, index, count, fresh=False, priority=None):
+    """Generate a single sectional passage as JSON, returning None if the reply was unusable"""
+    print(f"📝 Generating structured section {index+1}/{count} for {topic}...")
+    result = call_groq_api(section_messages(topic, structured=True), service='sectional_tests', fresh=fresh,
+                           variant=index, priority=priority, response_format=JSON_RESPONSE_FORMAT)
+    if not result:
+        print(f"❌ Failed to generate section {index+1}")
+        return None
+    data = load_structured_output(result, validate_section_output, f"Section {index+1}")
+    return structured_section(topic, data) if data else None
+
+def build_section(topic, index, count, fresh=False, priority=None):
+    """Generate a single sectional passage with its questions, returning None if generation failed.
+
+    With STRUCTURED_OUTPUT_ENABLED the passage is requested as JSON first; the
+    text prompt and parse_mcqs are only used when that reply does not validate.
+    """
+    if STRUCTURED_OUTPUT_ENABLED:
+        section = generate_structured_section(topic, index, count, fresh, priority)
+        if section:
+            return section
+        count_structured_output('fallbacks')
+        print(f"[STRUCTURED] Falling back to the text prompt for section {index+1}")
+    raw = generate_section(topic, index, count, fresh, priority)
+    return make_section(raw) if raw else None
+
+def stream_section(topic, index, count, fresh=False, priority=None, cancelled=None):
+    """Generate a single sectional passage over a Groq stream.
+
+    Yields MCQStreamParser events for the same text generate_section would
+    return, so each question is available as soon as the model moves on to
+    the next one. Yields nothing if the stream could not be opened, and stops
+    reading from Groq once the cancelled event is set.
+    """
+    print(f"📝 Streaming section {index+1}/{count} for {topic}...")
+    deltas = open_groq_stream(section_messages(topic), max_tokens=7000, service='sectional_tests',
+                              fresh=fresh, priority=priority, variant=index)
+    if deltas is None:
+        print(f"❌ Failed to generate section {index+1}")
+        return
+    try:
+        cleaner = IncrementalCleaner()
+        parser = MCQStreamParser()
+        yield from parser.feed(f"Topic: {topic}\n\n")
+        for delta in deltas:
+            if cancelled and cancelled.is_set():
+                print(f"[STREAM] Section {index+1}/{count} for {topic} cancelled")
+                return
+            yield from parser.feed(cleaner.feed(delta))
+        yield from parser.feed(cleaner.flush())
+        yield from parser.close()
+    finally:
+        # Closes the Groq response and settles its reservation (cached replays have nothing to close)
+        if hasattr(deltas, 'close'):
+            deltas.close()
+
+def generate_study_material(topic, count, fresh=False, priority=None):
+    """Generate study material for sectional tests, running passages concurrently.
+
+    Returns the sections that were generated, each with its parsed questions.
+    Raises GroqUnavailable only if Groq had no capacity for any of the passages.
+    """
+    if count <= 1:
+        section = build_section(topic, 0, 1, fresh, priority)
+        return [section] if section else []
+
+    executor = get_generation_executor()
+    # Cap how many of this request's passages occupy the shared executor at once
+    slots = threading.BoundedSemaphore(max(1, min(GENERATION_PER_REQUEST, count)))
+    futures = []
+    for i in range(count):
+        slots.acquire()
+        try:
+            future = executor.submit(build_section, topic, i, count, fresh, priority)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _f: slots.release())
+        futures.append(future)
+
+    # Collect in submission order; a failed passage is dropped, not fatal
+    all_sections = []
+    unavailable = None
+    for i, future in enumerate(futures):
+        try:
+            section = future.result()
+        except GroqUnavailable as e:
+            print(f"❌ Section {i+1}/{count} was not generated: {e}")
+            unavailable = e
+            section = None
+        except Exception as e:
+            print(f"❌ Section {i+1}/{count} raised an error: {e}")
+            traceback.print_exc()
+            section = None
+        if section:
+            all_sections.append(section)
+    print(f"✅ Generated {len(all_sections)}/{count} sections for {topic}")
+    if not all_sections and unavailable:
+        raise unavailable
     return all_sections
 
+def json_default(value):
+    """Serialize the question model in JSON responses, SSE events and job results"""
+    if isinstance(value, (Question, AnswerKeyEntry, Passage)):
+        return value.to_dict()
+    return DefaultJSONProvider.default(value)
+
+class ModelJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, extended to serialize the question model"""
+    default = staticmethod(json_default)
+
+class OrjsonJSONProvider(ModelJSONProvider):
+    """JSON provider backed by orjson, for both responses and request.get_json.
+
+    Output matches ModelJSONProvider's apart from non-ASCII text being sent as
+    UTF-8 rather than \\u escapes: keys are sorted, responses end in a newline
+    and are indented in debug mode, and dates are passed to Flask's default so
+    they stay HTTP dates instead of orjson's RFC 3339. Responses are built
+    from orjson's bytes directly instead of going through a str.
+    """
+
+    def options(self, indent=False):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.options(bool(kwargs.get('indent')))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self.options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+JSON_PROVIDERS = {'stdlib': ModelJSONProvider, 'orjson': OrjsonJSONProvider}
+
+def select_json_provider(name):
+    """The provider class for JSON_PROVIDER, falling back to the stdlib one"""
+    if name == 'orjson' and not orjson:
+        print("⚠️ JSON_PROVIDER is 'orjson' but orjson is not installed; using the stdlib encoder")
+        name = 'stdlib'
+    if name not in JSON_PROVIDERS:
+        print(f"⚠️ Unknown JSON_PROVIDER '{name}'; using the stdlib encoder")
+        name = 'stdlib'
+    return JSON_PROVIDERS[name]
+
+app.json = select_json_provider(JSON_PROVIDER)(app)
+
+# Question headers are not line-anchored: 'Question 3:', 'Q3.' or 'q 3 ' anywhere starts a block
+MCQ_HEADER_RE = re.compile(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)', re.IGNORECASE)
+# The question text runs up to the first (A) or A), in either case
+MCQ_QUESTION_END_RE = re.compile(r'\(A\)|A\)', re.IGNORECASE)
+# An option runs up to a newline followed by one of these, or a newline ending the block
+MCQ_OPTION_STOPS = ('(A)', '(B)', '(C)', '(D)', 'Answer:', 'Explanation:')
+
 def parse_mcqs(raw_text):
-    """Parse MCQs from raw text – robust for 'Question X', 'Question X:', 'QX', etc., and options (A)-(D)."""
-    import re
+    """Parse MCQs from raw text – robust for 'Question X', 'Question X:', 'QX', etc., and options (A)-(D).
+
+    Headers are found in one scan of the text; each block between headers is
+    then read with bounded forward scans, so parsing stays linear in the
+    length of the response however malformed it is.
+    """
     try:
         print("[DEBUG] Parsing MCQs...")
-        # Find all question blocks (match 'Question 1', 'Question 1:', 'Q1', etc.)
-        question_blocks = re.findall(
-            r'(Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s).*?)(?=Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)|\Z)',
-            raw_text, re.DOTALL | re.IGNORECASE
-        )
-        if not question_blocks:
+        headers = list(MCQ_HEADER_RE.finditer(raw_text))
+        if not headers:
             print("[DEBUG] ❌ No questions found in 'Question X' format")
             return []
-        # Try to extract passage (before first Question)
-        passage_match = re.split(
-            r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)', raw_text, maxsplit=1, flags=re.IGNORECASE
-        )
-        passage = passage_match[0].strip() if passage_match else "Passage not found"
+        # Passage is everything before the first question
+        passage = raw_text[:headers[0].start()].strip()
         structured_questions = []
-        for idx, block in enumerate(question_blocks, start=1):
+        for idx, header in enumerate(headers, start=1):
+            end = headers[idx].start() if idx < len(headers) else len(raw_text)
             try:
-                # Extract question text (up to first option marker)
-                q_text_match = re.match(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)+(.*?)(?=\(A\)|A\))', block, re.DOTALL | re.IGNORECASE)
-                if q_text_match:
-                    question = q_text_match.group(1).strip()
-                else:
-                    # Fallback: first non-empty line after 'Question X'
-                    after_q = re.split(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)+', block, maxsplit=1, flags=re.IGNORECASE)[-1]
-                    lines = [l.strip() for l in after_q.split('\n') if l.strip()]
-                    question = lines[0] if lines else "Unknown question"
-                if question == "Unknown question" or len(question) < 5:
-                    print(f"[DEBUG] Skipping invalid question block: {block[:100]}...")
-                    continue
-                # Extract options (A)-(D)
-                options = []
-                for opt in ['A', 'B', 'C', 'D']:
-                    pattern = rf'\({opt}\)\s*(.+?)(?=\n\([A-D]\)|\nAnswer:|\nExplanation:|\n\Z)'
-                    match = re.search(pattern, block, re.DOTALL)
-                    options.append(match.group(1).strip() if match else f"Option {opt} missing")
-                # Extract answer
-                ans_match = re.search(r'Answer:\s*\(([A-D])\)', block)
-                correct_letter = ans_match.group(1).strip().upper() if ans_match else 'A'
-                # Extract explanation
-                exp_match = re.search(r'Explanation:\s*(.*)', block, re.DOTALL)
-                explanation = exp_match.group(1).strip() if exp_match else "Explanation not available"
-                correct_index = ord(correct_letter) - ord('A')
-                structured_questions.append({
-                    "id": idx,
-                    "passage": passage,
-                    "question": question,
-                    "options": options,
-                    "correct": correct_index,
-                    "explanation": explanation
-                })
-                print(f"[DEBUG] ✅ Parsed Q{idx}: {question[:40]}... (Correct: {correct_letter})")
+                question = parse_mcq_block(raw_text, header.start(), header.end(), end, passage, idx)
+                if question:
+                    structured_questions.append(question)
             except Exception as e:
                 print(f"[ERROR PARSING Q{idx}]: {e}")
                 continue
@@ -831,6 +2435,134 @@ def parse_mcqs(raw_text):
         print(f"[ERROR in parse_mcqs]: {e}")
         return []
 
+def parse_mcq_block(text, start, header_end, end, passage, idx):
+    """Parse the question block text[start:end], or return None if it has no usable question"""
+    # Question text: after the header's whitespace, up to the first (A)/A)
+    body = header_end
+    while body < end and text[body].isspace():
+        body += 1
+    question_end = MCQ_QUESTION_END_RE.search(text, body, end)
+    if question_end:
+        question = text[body:question_end.start()].strip()
+    else:
+        # Fallback: first non-empty line after 'Question X'
+        question = next((line.strip() for line in text[body:end].split('\n') if line.strip()), "Unknown question")
+    if question == "Unknown question" or len(question) < 5:
+        print(f"[DEBUG] Skipping invalid question block: {text[start:min(end, start + 100)]}...")
+        return None
+
+    # Newlines that end an option, found in one pass over the block's lines
+    stops = []
+    newline = text.find('\n', start, end)
+    while newline != -1:
+        if newline + 1 == end or text.startswith(MCQ_OPTION_STOPS, newline + 1, end):
+            stops.append(newline)
+        newline = text.find('\n', newline + 1, end)
+
+    # Options (A)-(D): the first label whose text reaches a stop
+    options = []
+    for opt in 'ABCD':
+        label = f"({opt})"
+        option = None
+        pos = text.find(label, start, end)
+        while pos != -1:
+            value_start = value = pos + 3
+            while value < end and text[value].isspace():
+                value += 1
+            stop = bisect.bisect_left(stops, value + 1)
+            if stop < len(stops):
+                option = text[value:stops[stop]].strip()
+                break
+            if value - value_start >= 2 and stops and stops[-1] == value - 1:
+                # Only whitespace separates the label from the stop
+                option = ""
+                break
+            pos = text.find(label, pos + 1, end)
+        options.append(option if option is not None else f"Option {opt} missing")
+
+    # Answer: the first 'Answer:' followed by (A)-(D)
+    correct_letter = 'A'
+    pos = text.find('Answer:', start, end)
+    while pos != -1:
+        letter = pos + 7
+        while letter < end and text[letter].isspace():
+            letter += 1
+        if letter + 2 < end and text[letter] == '(' and text[letter + 1] in 'ABCD' and text[letter + 2] == ')':
+            correct_letter = text[letter + 1]
+            break
+        pos = text.find('Answer:', pos + 1, end)
+
+    pos = text.find('Explanation:', start, end)
+    explanation = text[pos + 12:end].strip() if pos != -1 else "Explanation not available"
+
+    print(f"[DEBUG] ✅ Parsed Q{idx}: {question[:40]}... (Correct: {correct_letter})")
+    return Question(idx, passage, question, options, ord(correct_letter) - ord('A'), explanation)
+
+class MCQStreamParser:
+    """Push-based parse_mcqs for text that arrives in chunks.
+
+    feed() returns ('passage', text) once the first question header arrives and
+    ('question', Question) for each question once the next header closes it; close()
+    returns the last question. The questions are exactly those parse_mcqs
+    returns for the concatenated text.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._passage = None
+        self._block_start = None   # start of the open question block
+        self._header_end = None
+        self._scan = 0             # where the next header search starts
+        self._count = 0
+        self._parsed = 0
+
+    def _close_block(self, end):
+        self._count += 1
+        try:
+            question = parse_mcq_block(self._buffer, self._block_start, self._header_end, end,
+                                       self._passage, self._count)
+        except Exception as e:
+            print(f"[ERROR PARSING Q{self._count}]: {e}")
+            question = None
+        if not question:
+            return []
+        self._parsed += 1
+        return [('question', question)]
+
+    def feed(self, chunk):
+        """Add streamed text and return the events it completes"""
+        if not chunk:
+            return []
+        self._buffer += chunk
+        events = []
+        while True:
+            header = MCQ_HEADER_RE.search(self._buffer, self._scan)
+            if not header:
+                # Only a header starting at the last Q can still be completed by later text
+                last_q = max(self._buffer.rfind('Q', self._scan), self._buffer.rfind('q', self._scan))
+                self._scan = max(self._scan, last_q if last_q != -1 else len(self._buffer))
+                break
+            if self._passage is None:
+                self._passage = self._buffer[:header.start()].strip()
+                events.append(('passage', self._passage))
+            else:
+                events.extend(self._close_block(header.start()))
+            # Drop text no later block can refer to
+            offset = header.start()
+            self._buffer = self._buffer[offset:]
+            self._block_start, self._header_end = 0, header.end() - offset
+            self._scan = self._header_end
+        return events
+
+    def close(self):
+        """Return the events for the question still open when the stream ends"""
+        if self._block_start is None:
+            return []
+        events = self._close_block(len(self._buffer))
+        self._block_start = None
+        print(f"[DEBUG] Total questions parsed: {self._parsed}")
+        return events
+
 def parse_answer_key(raw_text):
     """Parse answer key from raw text (robust version)"""
     try:
@@ -853,11 +2585,7 @@ def parse_answer_key(raw_text):
         for pattern in answer_patterns:
             matches = re.findall(pattern, answer_key_text)
             for question_num, answer_letter in matches:
-                answers.append({
-                    "question": int(question_num),
-                    "answer": answer_letter,
-                    "answer_index": ord(answer_letter) - ord('A')
-                })
+                answers.append(AnswerKeyEntry(int(question_num), answer_letter, ord(answer_letter) - ord('A')))
         print(f"[DEBUG] Successfully parsed {len(answers)} answer key entries")
         return answers
         
@@ -865,258 +2593,570 @@ def parse_answer_key(raw_text):
         print(f"[ERROR in parse_answer_key]: {e}")
         return []
 
-def create_answer_key_pdf(questions, answer_key, test_metadata):
-    """Create answer key PDF with watermark image and professional formatting using PyMuPDF only."""
-    try:
-        if 'fitz' not in globals() or not PDF_PROCESSING_AVAILABLE:
-            raise RuntimeError("PyMuPDF is required for watermark-based PDF generation.")
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
 
+SECTION_JSON_INSTRUCTIONS = """
+Respond with a single JSON object instead of the text layout above, in exactly this shape:
+{"passage": "<the complete passage>", "questions": [{"question": "<question text>", "options": ["<option A>", "<option B>", "<option C>", "<option D>"], "answer": <index of the correct option, 0 for A to 3 for D>, "explanation": "<the full explanation>"}]}
+Include every question the prompt asks for. Use plain text inside the strings, with no markdown.
+"""
 
-        from io import BytesIO
-        import os
+QT_JSON_INSTRUCTIONS = """
+Respond with a single JSON object instead of the text layout above, in exactly this shape:
+{"passage": "<the complete passage>", "visualData": {"type": "bar", "labels": ["<label>"], "values": [<number>]}, "questions": [{"question": "<question text>", "options": ["<option A>", "<option B>", "<option C>", "<option D>"], "answer": <index of the correct option, 0 for A to 3 for D>, "explanation": "<the full step-by-step explanation>"}]}
+visualData is required for data-interpretation, bar-chart, line-graph and pie-chart topics and may be left out otherwise. Use plain text inside the strings, with no markdown.
+"""
 
-        logo_path = os.path.join("images", "CLAT COMMUNITY ILLUSTRATED LOGO .png")
-        # Open the image and get its size
-        logo_img = fitz.Pixmap(logo_path)
-
-        # PDF page size (A4: 612x792 points)
-        page_width, page_height = 612, 792
-
-        # Calculate watermark size (scale to 60% of page width, keep aspect ratio)
-        max_logo_width = page_width * 0.6
-        scale = max_logo_width / logo_img.width
-        logo_width = int(logo_img.width * scale)
-        logo_height = int(logo_img.height * scale)
-        logo_x = (page_width - logo_width) // 2
-        logo_y = (page_height - logo_height) // 2
-
-        # Create new PDF
-        result_pdf = fitz.open()
-        page = result_pdf.new_page(width=page_width, height=page_height)
-
-        # Draw watermark (20% opacity)
-        page.insert_image(
-            fitz.Rect(logo_x, logo_y, logo_x + logo_width, logo_y + logo_height),
-            pixmap=logo_img,
-            overlay=False,
-            opacity=0.2
-        )
-        logo_img = None  # Free memory
-
-        # --- Layout constants ---
-        margin_x = 50
-        y = 60
-        line_height = 18
-        font = "helv"
-        font_bold = "helv"
-        font_size_title = 28
-        font_size_header = 16
-        font_size_table = 13
-        font_size_normal = 12
-        color_black = (0, 0, 0)
-
-        # Title
-        page.insert_textbox(
-            fitz.Rect(margin_x, y, page_width - margin_x, y + 40),
-            "Answer Key",
-            fontname=font_bold,
-            fontsize=font_size_title,
-            align=1,  # center
-            color=color_black
-        )
-        y += 45
-
-        # Answer Key Summary Header
-        page.insert_textbox(
-            fitz.Rect(margin_x, y, page_width - margin_x, y + line_height),
-            "Answer Key Summary:",
-            fontname=font_bold,
-            fontsize=font_size_header,
-            color=color_black
-        )
-        y += line_height + 5
-
-        # Table headers
-        col1_x = margin_x
-        col2_x = margin_x + 70
-        col3_x = margin_x + 130
-        col1_w = 60
-        col2_w = 50
-        col3_w = page_width - margin_x - col3_x  # fill remaining width
-        table_y = y
-        page.insert_textbox(
-            fitz.Rect(col1_x, table_y, col1_x + col1_w, table_y + line_height),
-            "Question", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
-        )
-        page.insert_textbox(
-            fitz.Rect(col2_x, table_y, col2_x + col2_w, table_y + line_height),
-            "Answer", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
-        )
-        page.insert_textbox(
-            fitz.Rect(col3_x, table_y, col3_x + col3_w, table_y + line_height),
-            "Correct Option", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
-        )
-        y += line_height
-
-        # Table content
-        for i,answer in enumerate(answer_key, 1):
-            question_num = answer.get('question', str(i))
-            answer_letter = answer.get('answer', 'N/A')
-            answer_index = answer.get('answer_index', 0)
-            correct_option = "N/A"
-            if i <= len(questions):
-                question = questions[i-1]
-                if 'options' in question and answer_index < len(question['options']):
-                    correct_option = question['options'][answer_index]
-            # Insert each cell as a textbox to wrap text
-            page.insert_textbox(
-                fitz.Rect(col1_x, y, col1_x + col1_w, y + line_height),
-                f"Q{question_num}", fontsize=font_size_table, fontname=font, color=color_black, align=1
-            )
-            page.insert_textbox(
-                fitz.Rect(col2_x, y, col2_x + col2_w, y + line_height),
-                answer_letter, fontsize=font_size_table, fontname=font, color=color_black, align=1
-            )
-            # Correct Option: wrap and allow up to 2 lines
-            bbox = fitz.Rect(col3_x, y, col3_x + col3_w, y + 2*line_height)
-            page.insert_textbox(
-                bbox,
-                correct_option,
-                fontsize=font_size_table,
-                fontname=font,
-                color=color_black,
-                align=0
-            )
-            y += 2*line_height  # allow for wrapping
+MCQ_SCHEMA = {
+    "type": "object",
+    "required": ["question", "options", "answer", "explanation"],
+    "properties": {
+        "question": {"type": "string", "minLength": 5},
+        "options": {"type": "array", "minItems": 4, "maxItems": 4, "items": {"type": "string", "minLength": 1}},
+        "answer": {"type": "integer", "minimum": 0, "maximum": 3},
+        "explanation": {"type": "string"}
+    }
+}
 
-        y += 15
+VISUAL_DATA_SCHEMA = {
+    "type": "object",
+    "required": ["type", "labels", "values"],
+    "properties": {
+        "type": {"type": "string", "enum": ["bar", "line", "pie", "table"]},
+        "labels": {"type": "array", "minItems": 1, "items": {"type": "string"}},
+        "values": {"type": "array", "minItems": 1, "items": {"type": "number"}}
+    }
+}
 
-        # Detailed Explanations Header
-        page.insert_textbox(
-            fitz.Rect(margin_x, y, page_width - margin_x, y + line_height),
-            "Detailed Explanations:",
-            fontname=font_bold,
-            fontsize=font_size_header,
-            color=color_black
-        )
-        y += line_height + 5
-
-        # Explanations
-        for i, question in enumerate(questions, 1):
-            if y > page_height - 120:
-                # Add new page with watermark
-                page = result_pdf.new_page(width=page_width, height=page_height)
-                logo_img = fitz.Pixmap(logo_path)
-                page.insert_image(
-                    fitz.Rect(logo_x, logo_y, logo_x + logo_width, logo_y + logo_height),
-                    pixmap=logo_img,
-                    overlay=False,
-                    opacity=0.2
-                )
-                logo_img = None
-                y = 60
-            # Question number
-            page.insert_text((margin_x, y), f"Question {i}:", fontsize=font_size_table, fontname=font_bold, color=color_black)
-            y += line_height - 4
-            # Question text
-            question_text = question.get('question', 'Question text not available')
-            y = page.insert_textbox(
-                fitz.Rect(margin_x, y, page_width - margin_x, y + 3*line_height),
-                f"Q: {question_text}",
-                fontname=font,
-                fontsize=font_size_normal,
-                color=color_black
-            ).y1 + 2
-            # Options
-            options = question.get('options', [])
-            for j, option in enumerate(options):
-                option_letter = chr(65 + j)
-                is_correct = j == question.get('correct', 0)
-                option_text = f"{option_letter}. {option}"
-                font_used = font_bold if is_correct else font
-                y = page.insert_textbox(
-                    fitz.Rect(margin_x + 10, y, page_width - margin_x, y + 2*line_height),
-                    option_text,
-                    fontname=font_used,
-                    fontsize=font_size_normal,
-                    color=color_black
-                ).y1 + 1
-            # Correct answer
-            correct_index = question.get('correct', 0)
-            correct_letter = chr(65 + correct_index)
-            y = page.insert_textbox(
-                fitz.Rect(margin_x, y, page_width - margin_x, y + line_height),
-                f"Correct Answer: {correct_letter}",
-                fontname=font_bold,
-                fontsize=font_size_normal,
-                color=color_black
-            ).y1 + 2
-            # Explanation
-            explanation = question.get('explanation', 'No explanation available.')
-            y = page.insert_textbox(
-                fitz.Rect(margin_x, y, page_width - margin_x, y + 3*line_height),
-                f"Explanation: {explanation}",
-                fontname=font,
-                fontsize=font_size_normal,
-                color=color_black
-            ).y1 + 8
-        # Footer
-        page.insert_textbox(
-            fitz.Rect(margin_x, page_height - 40, page_width - margin_x, page_height - 10),
-            'Generated by CLAT.GPT.1 - For more material visit: https://discord.gg/63WcH73DH2\nContact: 7702832727 | Telegram: https://t.me/CLAT_Community',
-            fontname=font,
-            fontsize=9,
-            color=(0.3, 0.3, 0.3),
-            align=1
-        )
-        output_bytes = result_pdf.write()
-        result_pdf.close()
-        return BytesIO(output_bytes)
-    except Exception as e:
-        print(f"[ERROR in create_answer_key_pdf]: {e}")
-        import traceback
-        traceback.print_exc()
+SECTION_SCHEMA = {
+    "type": "object",
+    "required": ["passage", "questions"],
+    "properties": {
+        "passage": {"type": "string", "minLength": 1},
+        "questions": {"type": "array", "minItems": 1, "maxItems": 10, "items": MCQ_SCHEMA}
+    }
+}
+
+QT_SCHEMA = {
+    "type": "object",
+    "required": ["passage", "questions"],
+    "properties": {
+        "passage": {"type": "string", "minLength": 1},
+        "visualData": VISUAL_DATA_SCHEMA,
+        "questions": {"type": "array", "minItems": 1, "maxItems": 10, "items": MCQ_SCHEMA}
+    }
+}
+
+SCHEMA_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool
+}
+
+def compile_schema(schema, path='$'):
+    """Compile a JSON Schema subset into a function returning the first error, or None if valid.
+
+    Supports type, enum, minimum/maximum, minLength, minItems/maxItems, items,
+    properties and required, which is all the generation schemas use. The
+    checks are built once, so validating a reply only runs plain closures.
+    """
+    checks = []
+    kind = schema.get("type")
+    if kind:
+        expected = SCHEMA_TYPES[kind]
+        # bool is an int subclass but never a valid integer or number here
+        allow_bool = kind == "boolean"
+        checks.append(lambda value: None if isinstance(value, expected) and (allow_bool or not isinstance(value, bool))
+                      else f"{path}: expected {kind}")
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda value: None if value in allowed else f"{path}: must be one of {allowed}")
+    if "minimum" in schema:
+        low = schema["minimum"]
+        checks.append(lambda value: None if value >= low else f"{path}: must be at least {low}")
+    if "maximum" in schema:
+        high = schema["maximum"]
+        checks.append(lambda value: None if value <= high else f"{path}: must be at most {high}")
+    if "minLength" in schema:
+        min_length = schema["minLength"]
+        checks.append(lambda value: None if len(value.strip()) >= min_length
+                      else f"{path}: must be at least {min_length} characters")
+    if "minItems" in schema:
+        min_items = schema["minItems"]
+        checks.append(lambda value: None if len(value) >= min_items else f"{path}: needs at least {min_items} items")
+    if "maxItems" in schema:
+        max_items = schema["maxItems"]
+        checks.append(lambda value: None if len(value) <= max_items else f"{path}: allows at most {max_items} items")
+    if "items" in schema:
+        validate_item = compile_schema(schema["items"], f"{path}[]")
+        checks.append(lambda value: next(filter(None, map(validate_item, value)), None))
+    for name in schema.get("required", ()):
+        checks.append(lambda value, name=name: None if name in value else f"{path}: missing '{name}'")
+    for name, subschema in schema.get("properties", {}).items():
+        validate_property = compile_schema(subschema, f"{path}.{name}")
+        checks.append(lambda value, name=name, validate_property=validate_property:
+                      validate_property(value[name]) if name in value else None)
+
+    def validate(value):
+        for check in checks:
+            error = check(value)
+            if error:
+                return error
         return None
+    return validate
 
-def create_pdf(contents, title):
-    """Create PDF from content with improved formatting"""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
+validate_section_output = compile_schema(SECTION_SCHEMA)
+validate_qt_output = compile_schema(QT_SCHEMA)
+
+structured_output_counters = {'valid': 0, 'invalid': 0, 'fallbacks': 0}
+structured_output_lock = threading.Lock()
+
+def count_structured_output(name):
+    with structured_output_lock:
+        structured_output_counters[name] += 1
+
+def structured_output_stats():
+    with structured_output_lock:
+        return {'enabled': STRUCTURED_OUTPUT_ENABLED, **structured_output_counters}
+
+def load_structured_output(text, validate, label):
+    """Parse a JSON reply and check it against a compiled schema, returning None if either fails"""
+    text = text.strip()
+    if not text.startswith('{'):
+        # Tolerate a reply wrapped in a markdown code fence
+        text = text[text.find('{'):text.rfind('}') + 1]
     try:
-        font_path = "DejaVuSans.ttf"
-        if os.path.exists(font_path):
-            pdf.add_font("DejaVu", "", font_path, uni=True)
-            pdf.set_font("DejaVu", size=12)
-        else:
-            pdf.set_font("Arial", size=12)
-    except:
-        pdf.set_font("Arial", size=12)
-    
-    # Title
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(0, 15, title, ln=True, align='C')
-    pdf.ln(10)
-    
-    # Content
-    pdf.set_font("Arial", '', 12)
-    for section in contents:
+        data = orjson.loads(text) if orjson else json.loads(text)
+    except ValueError as e:
+        count_structured_output('invalid')
+        print(f"[STRUCTURED] {label} reply is not valid JSON: {e}")
+        return None
+    error = validate(data)
+    if error:
+        count_structured_output('invalid')
+        print(f"[STRUCTURED] {label} reply failed validation: {error}")
+        return None
+    count_structured_output('valid')
+    return data
+
+def structured_questions(data, passage):
+    """Questions in the parse_mcqs format from a validated JSON reply"""
+    return [Question(
+        idx,
+        passage,
+        clean_formatting_artifacts(q["question"]),
+        [clean_formatting_artifacts(option) for option in q["options"]],
+        q["answer"],
+        clean_formatting_artifacts(q["explanation"]) or "Explanation not available"
+    ) for idx, q in enumerate(data["questions"], start=1)]
+
+def format_mcq_text(questions):
+    """Render questions in the text layout the sectional prompts ask for"""
+    return "\n\n".join(
+        f"Question {q.id}:\n{q.question}\n"
+        + "".join(f"({letter}) {option}\n" for letter, option in zip("ABCD", q.options))
+        + f"Answer: ({q.letter})\nExplanation: {q.explanation}"
+        for q in questions
+    )
+
+def structured_section(topic, data):
+    """A Passage like make_section returns, built from a validated JSON reply"""
+    passage = f"Topic: {topic}\n\n{clean_formatting_artifacts(data['passage'])}"
+    questions = structured_questions(data, passage)
+    return Passage(f"{passage}\n\n{format_mcq_text(questions)}", questions, structured=True)
+
+# =============================================================================
+# SECTIONAL QUESTION BANK
+# =============================================================================
+
+def make_section(raw):
+    """Pair a generated sectional passage with its parsed questions"""
+    return Passage(raw, parse_mcqs(raw))
+
+class QuestionBank:
+    """Warm pool of already-parsed sectional passages, refilled in the background.
+
+    Each topic's target depth follows its demand rate over the last rate
+    window: enough passages to cover the requests expected while one refill
+    runs, clamped to [min_depth, max_depth]. A single large request does not
+    raise the depth on its own. Producers stop once max_total passages are
+    banked or being generated across all topics.
+    """
+
+    def __init__(self, min_depth, max_depth, workers, refill_seconds, rate_window, max_total):
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.max_total = max_total
+        self.workers = workers
+        self.refill_seconds = refill_seconds
+        self.rate_window = rate_window
+        self._pools = {}      # topic -> deque of sections
+        self._demand = {}     # topic -> deque of (timestamp, passages requested)
+        self._in_flight = {}  # topic -> passages being generated
+        self._cond = threading.Condition()
+        self._started_pid = None
+        self._failures = 0
+        self.counters = {'hits': 0, 'misses': 0, 'produced': 0, 'failed': 0}
+
+    def _target_depth(self, topic, now):
+        demand = self._demand.get(topic)
+        while demand and now - demand[0][0] > self.rate_window:
+            demand.popleft()
+        if not demand:
+            return self.min_depth
+        per_second = sum(n for _, n in demand) / self.rate_window
+        depth = math.ceil(per_second * self.refill_seconds)
+        return max(self.min_depth, min(self.max_depth, depth))
+
+    def _deficit(self, topic, now):
+        have = len(self._pools.get(topic, ())) + self._in_flight.get(topic, 0)
+        return self._target_depth(topic, now) - have
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._cond:
+            if self._started_pid == pid:
+                return
+            # Threads do not survive a fork, so each worker starts its own producers
+            self._pools, self._demand, self._in_flight = {}, {}, {}
+            for i in range(self.workers):
+                threading.Thread(target=self._produce, name=f"question-bank-{i}", daemon=True).start()
+            self._started_pid = pid
+            print(f"[BANK] Started {self.workers} question bank producers in worker {pid}")
+
+    def take(self, topic, count):
+        """Pop up to count banked sections for topic and record the demand"""
+        if not QUESTION_BANK_ENABLED or not GROQ_API_KEY or self.workers <= 0:
+            return []
+        self._ensure_started()
+        with self._cond:
+            self._demand.setdefault(topic, deque()).append((time.time(), count))
+            pool = self._pools.get(topic)
+            taken = []
+            while pool and len(taken) < count:
+                taken.append(pool.popleft())
+            self.counters['hits'] += len(taken)
+            self.counters['misses'] += count - len(taken)
+            # Wake the producers: this topic now needs a refill
+            self._cond.notify_all()
+        if taken:
+            print(f"[BANK] Served {len(taken)}/{count} {topic} passages from the bank")
+        return taken
+
+    def _next_topic(self):
+        banked = sum(map(len, self._pools.values())) + sum(self._in_flight.values())
+        if banked >= self.max_total:
+            return None
+        now = time.time()
+        topics = set(self._pools) | set(self._demand)
+        if self.min_depth > 0:
+            topics |= set(SECTIONAL_PROMPTS)
+        best, best_deficit = None, 0
+        for topic in topics:
+            deficit = self._deficit(topic, now)
+            if deficit > best_deficit:
+                best, best_deficit = topic, deficit
+        return best
+
+    def _produce(self):
+        while True:
+            with self._cond:
+                topic = self._next_topic()
+                while topic is None:
+                    self._cond.wait(timeout=60)
+                    topic = self._next_topic()
+                self._in_flight[topic] = self._in_flight.get(topic, 0) + 1
+            section = None
+            try:
+                section = build_section(topic, 0, 1, fresh=True, priority='background')
+            except Exception as e:
+                print(f"[BANK] Error producing {topic} passage: {e}")
+            with self._cond:
+                self._in_flight[topic] -= 1
+                if section and section.questions:
+                    self._pools.setdefault(topic, deque()).append(section)
+                    self.counters['produced'] += 1
+                    self._failures = 0
+                else:
+                    self.counters['failed'] += 1
+                    self._failures += 1
+                backoff = min(300, 5 * 2 ** min(self._failures, 6)) if self._failures else 0
+            if backoff:
+                print(f"[BANK] Generation failing, backing off {backoff}s")
+                time.sleep(backoff)
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            topics = set(self._pools) | set(self._demand)
+            return {
+                **self.counters,
+                'enabled': QUESTION_BANK_ENABLED,
+                'max_total': self.max_total,
+                'topics': {
+                    topic: {
+                        'depth': len(self._pools.get(topic, ())),
+                        'target': self._target_depth(topic, now),
+                        'in_flight': self._in_flight.get(topic, 0)
+                    }
+                    for topic in sorted(topics)
+                }
+            }
+
+question_bank = QuestionBank(
+    QUESTION_BANK_MIN_DEPTH,
+    QUESTION_BANK_MAX_DEPTH,
+    QUESTION_BANK_WORKERS,
+    QUESTION_BANK_REFILL_SECONDS,
+    QUESTION_BANK_RATE_WINDOW,
+    QUESTION_BANK_MAX_TOTAL
+)
+
+def take_sections(topic, count, fresh=False, priority=None):
+    """Return count sections for a sectional topic, banked passages first"""
+    sections = [] if fresh else question_bank.take(topic, count)
+    missing = count - len(sections)
+    if missing > 0:
         try:
-            clean = section.encode('latin1', 'replace').decode('latin1')
-        except:
-            clean = section
-        pdf.multi_cell(0, 10, clean)
-        pdf.ln(5)
-    
-    # Add footer
-    pdf.set_y(-30)
-    pdf.set_font("Arial", '', 8)
-    pdf.set_text_color(107, 114, 128)
-    pdf.cell(0, 5, 'Generated by CLAT.GPT.1 - For more material visit: https://discord.gg/63WcH73DH2', ln=True, align='C')
-    pdf.cell(0, 5, 'Contact: 7702832727 | Telegram: https://t.me/CLAT_Community', ln=True, align='C')
-    
-    return BytesIO(pdf.output(dest='S'))
+            generated = generate_study_material(topic, missing, fresh=fresh, priority=priority)
+        except GroqUnavailable:
+            if fresh:
+                # Banked passages beat an error while Groq is unavailable
+                sections = question_bank.take(topic, missing)
+                groq_resilience.count('bank_served', len(sections))
+            if not sections:
+                raise
+            generated = []
+        sections.extend(generated)
+    return sections
+
+def section_events(section):
+    """MCQStreamParser-style events for an already parsed section"""
+    return [('passage', section.text)] + [('question', q) for q in section.questions]
+
+class SectionStream:
+    """The events of one passage streaming on the generation executor.
+
+    Iterating yields events as they arrive. cancel() makes the worker stop
+    reading from Groq, or skip the passage if it has not started yet.
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def __iter__(self):
+        return iter(self.events.get, None)
+
+    def cancel(self):
+        self.cancelled.set()
+
+def start_section_stream(topic, index, count, fresh=False):
+    """Stream a passage on the generation executor and return its SectionStream.
+
+    Failures arrive as an ('error', exception) event; a fresh request that finds
+    Groq unavailable gets a banked passage instead, as in take_sections.
+    """
+    stream = SectionStream()
+    events = stream.events
+
+    def run():
+        try:
+            if stream.cancelled.is_set():
+                return
+            for event in stream_section(topic, index, count, fresh, cancelled=stream.cancelled):
+                events.put(event)
+        except GroqUnavailable as e:
+            banked = question_bank.take(topic, 1) if fresh else []
+            if not banked:
+                events.put(('error', e))
+            for section in banked:
+                groq_resilience.count('bank_served')
+                for event in section_events(section):
+                    events.put(event)
+        except Exception as e:
+            traceback.print_exc()
+            events.put(('error', e))
+        finally:
+            events.put(None)
+
+    get_generation_executor().submit(run)
+    return stream
+
+def stream_sections(topic, count, fresh=False):
+    """Yield one iterator of events per passage, banked passages first.
+
+    Missing passages are streamed GENERATION_PER_REQUEST at a time; the caller
+    drains each iterator before asking for the next, so passages arrive in
+    order while the ones behind them are already generating. Closing the
+    generator early cancels every passage still streaming.
+    """
+    banked = [] if fresh else question_bank.take(topic, count)
+    for section in banked:
+        yield section_events(section)
+    missing = count - len(banked)
+    streams = deque()
+    try:
+        for index in range(missing):
+            streams.append(start_section_stream(topic, index, missing, fresh))
+            if len(streams) >= max(1, GENERATION_PER_REQUEST):
+                # The passage being drained stays in streams, so closing cancels it too
+                yield streams[0]
+                streams.popleft()
+        while streams:
+            yield streams[0]
+            streams.popleft()
+    finally:
+        for stream in streams:
+            stream.cancel()
+
+# =============================================================================
+# PDF RENDER POOL
+# =============================================================================
+
+_pdf_render_pool = None
+_pdf_render_pool_pid = None
+_pdf_render_pool_lock = threading.Lock()
+
+def get_pdf_render_pool():
+    """Return this worker's PDF render process pool, or None when PDF_RENDER_WORKERS is 0"""
+    global _pdf_render_pool, _pdf_render_pool_pid
+    if PDF_RENDER_WORKERS <= 0:
+        return None
+    pid = os.getpid()
+    if _pdf_render_pool is None or _pdf_render_pool_pid != pid:
+        with _pdf_render_pool_lock:
+            if _pdf_render_pool is None or _pdf_render_pool_pid != pid:
+                # Recycling processes needs a start method other than fork. With
+                # forkserver, pdf_render is imported once and each render process
+                # is forked from that copy; the rest of the app is never loaded.
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['pdf_render'])
+                else:
+                    context = multiprocessing.get_context('spawn')
+                _pdf_render_pool = ProcessPoolExecutor(
+                    max_workers=PDF_RENDER_WORKERS,
+                    mp_context=context,
+                    max_tasks_per_child=max(1, PDF_RENDER_MAX_TASKS)
+                )
+                _pdf_render_pool_pid = pid
+    return _pdf_render_pool
+
+def retire_pdf_render_pool(pool):
+    """Send new renders to a fresh pool, and shut this one down once the renders it has finish.
+
+    The shutdown waits in a background thread: with max_tasks_per_child,
+    shutdown(wait=False) can strand a queued render when its process is recycled.
+    """
+    global _pdf_render_pool
+    with _pdf_render_pool_lock:
+        if _pdf_render_pool is pool:
+            _pdf_render_pool = None
+    threading.Thread(target=pool.shutdown, name="pdf-render-shutdown", daemon=True).start()
+
+def render_pdf(kind, content):
+    """Render a PDF in the render pool, or in this thread when the pool is disabled"""
+    for _ in range(2):
+        pool = get_pdf_render_pool()
+        if pool is None:
+            return render_pdf_job(kind, content)
+        try:
+            future = pool.submit(run_render_job, kind, content, PDF_RENDER_TIMEOUT)
+            # The render stops itself at the timeout; this wait only catches a
+            # process stuck where the alarm cannot interrupt it
+            return future.result(timeout=PDF_RENDER_TIMEOUT + 5)
+        except RenderTimeout:
+            print(f"[PDF] Rendering a {kind} PDF took over {PDF_RENDER_TIMEOUT}s and was stopped")
+            raise GenerationError('PDF rendering timed out. Please try again.', 503)
+        except FuturesTimeoutError:
+            print(f"[PDF] A {kind} render is not responding; sending new renders to a fresh pool")
+            retire_pdf_render_pool(pool)
+            raise GenerationError('PDF rendering timed out. Please try again.', 503)
+        except BrokenProcessPool:
+            # A render process died, which fails every render the pool was running
+            print(f"[PDF] Render pool broke while rendering a {kind} PDF; starting a new one")
+            retire_pdf_render_pool(pool)
+    raise GenerationError('PDF rendering failed. Please try again.')
+
+# Part of every PDF cache key: bump it whenever create_pdf or create_answer_key_pdf
+# output changes, so PDFs rendered by the old code are not served again
+PDF_RENDERER_VERSION = 2
+
+class PDFRenderCache:
+    """Disk cache of rendered PDFs keyed by a hash of their content.
+
+    Every worker shares the directory, which is pruned to max_bytes least
+    recently used first.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.disk = DiskLRU(directory, max_bytes, '.pdf') if directory else None
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    @staticmethod
+    def make_key(kind, content):
+        """Hash a PDF's kind and the JSON-ready content it is rendered from"""
+        return LLMResponseCache.make_key({'renderer': PDF_RENDERER_VERSION, 'kind': kind, 'content': content})
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get(self, key):
+        """Return the cached PDF bytes for key, or None"""
+        if not self.disk:
+            return None
+        try:
+            pdf_bytes = self.disk.read(key)
+        except OSError:
+            pdf_bytes = None
+        if pdf_bytes is None:
+            self._count('misses')
+            return None
+        self.disk.touch(key)
+        self._count('hits')
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        if not self.disk or len(pdf_bytes) > self.disk.max_bytes:
+            return
+        try:
+            evicted = self.disk.write(key, pdf_bytes)
+        except OSError as e:
+            print(f"[PDF CACHE] Could not write {key[:12]}: {e}")
+            return
+        self._count('stores')
+        if evicted:
+            self._count('evictions', evicted)
+
+    def render(self, kind, content, render):
+        """Return the PDF bytes for content, calling render(kind, content) only on a miss"""
+        key = self.make_key(kind, content)
+        pdf_bytes = self.get(key)
+        if pdf_bytes is None:
+            pdf_bytes = render(kind, content)
+            if not pdf_bytes:
+                return None
+            self.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        stats['max_bytes'] = self.disk.max_bytes if self.disk else 0
+        stats['enabled'] = bool(self.disk)
+        return stats
+
+pdf_render_cache = PDFRenderCache(PDF_CACHE_DIR or None, PDF_CACHE_MAX_BYTES)
 
 # =============================================================================
 # MAIN ROUTES
@@ -1188,7 +3228,7 @@ def gk_generate_response():
             {"role": "user", "content": enhanced_message}
         ]
         
-        response = call_groq_api(messages)
+        response = call_groq_api(messages, service='gk_research', fresh=data.get('fresh') is True)
         
         if response is None:
             return jsonify({'error': 'Failed to generate response from Groq API'}), 500
@@ -1205,6 +3245,8 @@ def gk_generate_response():
             'service': 'gk_research'
         })
         
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         print(f"Error in gk_generate_response: {e}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -1225,7 +3267,7 @@ def gk_study_assistant():
             {"role": "system", "content": assistant_prompt},
             {"role": "user", "content": user_message}
         ]
-        response = call_groq_api(messages)
+        response = call_groq_api(messages, service='gk_assistant', fresh=data.get('fresh') is True)
         if response is None:
             return jsonify({'error': 'Failed to generate assistant response. Please check GROQ_API_KEY and Groq API status.'}), 500
         
@@ -1237,6 +3279,8 @@ def gk_study_assistant():
             'service': 'gk_assistant',
             'timestamp': datetime.now().isoformat()
         })
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         print(f"Study assistant error: {e}")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
@@ -1324,7 +3368,8 @@ Focus on the most important facts and current affairs from the PDF content."""
             ]
             
             print("Generating GK content with Groq API...")
-            response = call_groq_api(messages, temperature=0.7, max_tokens=4000)
+            response = call_groq_api(messages, temperature=0.7, max_tokens=4000, service='gk_upload',
+                                     fresh=request.form.get('fresh') == 'true')
             
             if response is None:
                 return jsonify({'error': 'Failed to generate content from PDF'}), 500
@@ -1348,6 +3393,8 @@ Focus on the most important facts and current affairs from the PDF content."""
             print(f"❌ PDF processing error: {pdf_error}")
             raise pdf_error
 
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         print(f"❌ PDF upload error: {e}")
         return jsonify({
@@ -1382,7 +3429,14 @@ def lexa_chat():
             {"role": "system", "content": LEXA_SYSTEM_PROMPT},
             {"role": "user", "content": user_message}
         ]
-        response = call_groq_api(messages, temperature=0.7, max_tokens=1024)
+        if wants_event_stream(data):
+            deltas = open_groq_stream(messages, temperature=0.7, max_tokens=1024,
+                                      service="lexa_chatbot", fresh=data.get("fresh") is True)
+            if deltas is None:
+                return jsonify({"error": "Failed to get response from Lexa. Please check GROQ_API_KEY and Groq API status."}), 500
+            return event_stream_response(stream_cleaned_response(deltas, "lexa_chatbot"))
+        response = call_groq_api(messages, temperature=0.7, max_tokens=1024,
+                                 service="lexa_chatbot", fresh=data.get("fresh") is True)
         if response is None:
             return jsonify({"error": "Failed to get response from Lexa. Please check GROQ_API_KEY and Groq API status."}), 500
         
@@ -1395,6 +3449,8 @@ def lexa_chat():
             "service": "lexa_chatbot",
             "timestamp": datetime.now().isoformat()
         })
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except requests.exceptions.Timeout:
         print("Lexa request timeout")
         return jsonify({"error": "Request timeout"}), 504
@@ -1416,9 +3472,12 @@ def qt_test_connection():
         "available_topics": list(QT_TOPIC_MAPPING.keys())
     })
 
+QT_VISUAL_SUBTOPICS = ["tables", "bar-charts", "line-graphs", "pie-charts"]
+validate_qt_visual_output = compile_schema({**QT_SCHEMA, "required": QT_SCHEMA["required"] + ["visualData"]})
+
 def has_valid_visual_data(text, subtopic):
     # Only enforce for relevant subtopics
-    if subtopic not in ["tables", "bar-charts", "line-graphs", "pie-charts"]:
+    if subtopic not in QT_VISUAL_SUBTOPICS:
         return True
     # Look for visualData JSON block
     match = re.search(r'visualData\s*:\s*\{[^}]+\}', text)
@@ -1440,6 +3499,34 @@ def has_valid_visual_data(text, subtopic):
     except Exception:
         return False
 
+def generate_structured_qt(messages, topic, fresh=False):
+    """Generate QT content as JSON, returning (rawOutput text, structured content) or None if unusable"""
+    messages = messages[:-1] + [{"role": "user", "content": messages[-1]["content"] + QT_JSON_INSTRUCTIONS}]
+    result = call_groq_api(messages, temperature=0.7, max_tokens=4000, service="qt_mentor", fresh=fresh,
+                           response_format=JSON_RESPONSE_FORMAT)
+    if result is None:
+        return None
+    validate = validate_qt_visual_output if topic in QT_VISUAL_SUBTOPICS else validate_qt_output
+    data = load_structured_output(result, validate, "QT")
+    if not data:
+        return None
+    passage = clean_formatting_artifacts(data["passage"])
+    questions = structured_questions(data, passage)
+    visual_data = data.get("visualData")
+    # The same layout the text prompt produces, for clients that parse rawOutput
+    raw = passage
+    if visual_data:
+        raw += f"\n\nvisualData: {json.dumps(visual_data)}"
+    raw += "\n\n" + "\n\n".join(
+        f"1.{q.id} {q.question}\n"
+        + "\n".join(f"({letter}) {option}" for letter, option in zip("ABCD", q.options))
+        for q in questions
+    )
+    raw += "\n\nAnswer Key\n\n" + "\n\n".join(
+        f"1.{q.id} – ({q.letter}) {q.explanation}" for q in questions
+    )
+    return raw, {"passage": passage, "visualData": visual_data, "questions": questions}
+
 @app.route("/qt/generate-question", methods=["POST"])
 def qt_generate_question():
     """Generate QT questions based on topic"""
@@ -1461,26 +3548,36 @@ def qt_generate_question():
             {"role": "user", "content": user_prompt}
         ]
         print("Making QT request to Groq API...")
-        response = call_groq_api(messages, temperature=0.7, max_tokens=4000)
-        if response is None:
-            return jsonify({
-                "success": False,
-                "error": "Failed to generate QT content. Please check GROQ_API_KEY and Groq API status.",
-                "service": "qt_mentor"
-            }), 500
-        print(f"QT Generated content length: {len(response)}")
-        
-        # Clean up formatting artifacts
-        cleaned_response = clean_formatting_artifacts(response)
-        
-        # Strict validation for visualData for relevant subtopics
-        if not has_valid_visual_data(cleaned_response, topic):
-            print("QT Content missing or invalid visualData, retrying...")
-            return jsonify({
-                "success": False,
-                "error": "Generated content missing or invalid visualData. Please try again.",
-                "service": "qt_mentor"
-            }), 400
+        fresh = data.get("fresh") is True
+        structured = generate_structured_qt(messages, topic, fresh) if STRUCTURED_OUTPUT_ENABLED else None
+        if structured:
+            cleaned_response, content = structured
+        else:
+            if STRUCTURED_OUTPUT_ENABLED:
+                count_structured_output('fallbacks')
+                print("[STRUCTURED] Falling back to the text prompt for QT")
+            content = None
+            response = call_groq_api(messages, temperature=0.7, max_tokens=4000,
+                                     service="qt_mentor", fresh=fresh)
+            if response is None:
+                return jsonify({
+                    "success": False,
+                    "error": "Failed to generate QT content. Please check GROQ_API_KEY and Groq API status.",
+                    "service": "qt_mentor"
+                }), 500
+            print(f"QT Generated content length: {len(response)}")
+            
+            # Clean up formatting artifacts
+            cleaned_response = clean_formatting_artifacts(response)
+            
+            # Strict validation for visualData for relevant subtopics
+            if not has_valid_visual_data(cleaned_response, topic):
+                print("QT Content missing or invalid visualData, retrying...")
+                return jsonify({
+                    "success": False,
+                    "error": "Generated content missing or invalid visualData. Please try again.",
+                    "service": "qt_mentor"
+                }), 400
         
         # Basic validation of generated content
         if not validate_qt_content(cleaned_response):
@@ -1491,14 +3588,20 @@ def qt_generate_question():
                 "details": "Please try generating again",
                 "service": "qt_mentor"
             }), 400
-        return jsonify({
+        body = {
             "success": True,
             "rawOutput": cleaned_response,
             "topic": topic,
             "contentLength": len(cleaned_response),
             "service": "qt_mentor",
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        if content:
+            # Passage, visualData and questions already parsed, so clients can skip rawOutput
+            body["structured"] = content
+        return jsonify(body)
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except requests.exceptions.Timeout:
         print("QT Request timeout occurred")
         return jsonify({
@@ -1520,139 +3623,268 @@ def qt_generate_question():
 # =============================================================================
 # SECTIONAL TEST GENERATOR ROUTES
 # =============================================================================
-@app.route("/generate-test", methods=['POST'])
-def generate_content():
-    """Generate sectional test content with answer key"""
-    try:
-        data = request.get_json()
-        topic = data.get('topic') or data.get('subcategory')
-        if not topic:
-            return jsonify({'error': 'Topic is missing'}), 400
+class GenerationError(Exception):
+    """A sectional generation request that cannot be completed"""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+class GeneratedTestStore:
+    """Generated sectional tests kept by ID, so downloads render the test the student saw.
+
+    Tests live in an LLMResponseCache of their own, for its byte-bounded memory
+    LRU and shared disk tier, keyed by a random test ID. A test can be loaded
+    for retention_seconds after it was generated.
+    """
+
+    # The cache counters that mean something for stored tests
+    STATS = ('memory_hits', 'disk_hits', 'misses', 'stores', 'evictions',
+             'entries', 'bytes', 'hit_rate', 'max_bytes', 'disk_enabled')
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=0, retention_seconds=24 * 3600):
+        self.tests = LLMResponseCache(max_bytes, directory=directory, disk_max_bytes=disk_max_bytes)
+        self.retention_seconds = retention_seconds
+
+    def save(self, topic, sections, answer_key):
+        """Store the passages and numbered questions of a test and return its ID"""
+        questions = []
+        for p_index, section in enumerate(sections):
+            for q in section.questions:
+                q = q.to_dict(passageIndex=p_index)
+                del q['passage']
+                questions.append(q)
+        test_id = uuid.uuid4().hex
+        self.tests.put(test_id, json.dumps({
+            'topic': topic,
+            'sections': [section.raw for section in sections],
+            'passages': [section.text for section in sections],
+            'questions': questions,
+            'answer_key': answer_key,
+        }, default=json_default, ensure_ascii=False))
+        return test_id
+
+    def load(self, test_id):
+        """Return a stored test with Question and AnswerKeyEntry lists, or None"""
+        if not isinstance(test_id, str) or not re.fullmatch(r'[0-9a-f]{32}', test_id):
+            return None
+        value = self.tests.get(test_id, self.retention_seconds)
+        if value is None:
+            return None
+        stored = json.loads(value)
+        passages = stored['passages']
+        stored['questions'] = [Question.from_dict({**q, 'passage': passages[q.pop('passageIndex')]})
+                               for q in stored['questions']]
+        stored['answer_key'] = [AnswerKeyEntry.from_dict(a) for a in stored['answer_key']]
+        return stored
+
+    def stats(self):
+        stats = self.tests.stats()
+        # A stored test past its retention period has expired; it has no stale use
+        return {'expired': stats['stale'], **{name: stats[name] for name in self.STATS}}
+
+test_store = GeneratedTestStore(
+    TEST_STORE_MAX_BYTES,
+    directory=TEST_STORE_DIR or None,
+    disk_max_bytes=TEST_STORE_DISK_MAX_BYTES,
+    retention_seconds=TEST_RETENTION_SECONDS
+)
+
+def load_stored_test(data):
+    """The stored test a download request names by test_id, or None if it names none"""
+    test_id = data.get('test_id')
+    if test_id is None:
+        return None
+    stored = test_store.load(test_id)
+    if stored is None:
+        raise GenerationError('Test not found or expired. Please generate it again.', 404)
+    return stored
+
+def sectional_topic(topic):
+    """Resolve a frontend subcategory ('main-idea') or topic name to its SECTIONAL_PROMPTS key.
+
+    Tests and practice PDFs bank and cache passages under this key, so both
+    endpoints share them.
+    """
+    topic = topic.strip()
+    for candidate in (SUBCATEGORY_MAPPINGS.get(topic.lower()), topic, topic.replace("-", " ").title()):
+        if candidate in SECTIONAL_PROMPTS:
+            return candidate
+    raise GenerationError(f"Invalid topic. Available: {list(SECTIONAL_PROMPTS.keys())}", 400)
+
+def build_sectional_test(data):
+    """Generate a sectional test and return the /generate-test response body"""
+    topic = data.get('topic') or data.get('subcategory')
+    if not topic:
+        raise GenerationError('Topic is missing', 400)
+
+    mapped_topic = sectional_topic(topic)
+
+    count = data.get('count', 1)
+    if not isinstance(count, int) or not (1 <= count <= 5):
+        raise GenerationError('Count must be an integer between 1 and 5', 400)
+
+    sections = take_sections(mapped_topic, count, fresh=data.get('fresh') is True)
+    if not sections:
+        raise GenerationError('Generation failed')
+
+    # Compact responses list each passage once and refer to it by passageIndex, as practice does
+    compact = wants_compact(data)
+    passages = []
+    tested_sections = []
+    all_questions = []
+    all_answer_key = []
+    question_counter = 1
+    for section in sections:
+        questions = section.questions
+        if not questions:
+            print(f"[DEBUG] No questions parsed for a passage. Raw:\n{section.raw[:500]}")
+            continue
+        p_index = len(passages)
+        tested_sections.append(section)
+        passages.append(section.text)
+        # Structured sections carry their answers on the questions themselves
+        answer_key = [] if section.structured else parse_answer_key(section.raw)
+        for idx, q in enumerate(questions):
+            q.id = question_counter
+            # Use the parsed answer key where it covers the question, else the question's own answer
+            entry = answer_key[idx] if idx < len(answer_key) else AnswerKeyEntry.for_question(question_counter, q)
+            entry.question = question_counter
+            all_answer_key.append(entry)
+            if compact:
+                q = q.to_dict(passageIndex=p_index)
+                del q['passage']
+            all_questions.append(q)
+            question_counter += 1
+
+    body = {
+        'success': True,
+        'topic': topic,
+        'mapped_topic': mapped_topic,
+        'count': len(all_questions),
+        'test': all_questions,
+        'answer_key': all_answer_key,
+        # Pass to /download-pdf or /download-answer-key to render this test
+        'test_id': test_store.save(mapped_topic, tested_sections, all_answer_key),
+        'timestamp': datetime.now().isoformat(),
+        'service': 'sectional_tests'
+    }
+    if compact:
+        body['passages'] = passages
+    return body
 
-        # ✅ Do NOT convert with .title(), just map raw
-        mapped_topic = SUBCATEGORY_MAPPINGS.get(topic.strip().lower(), topic.strip())
+def practice_pdf_filename(topic):
+    """'Legal Reasoning – General' -> 'legal_reasoning_general_clat_practice.pdf'"""
+    return f"{re.sub(r'[^a-z0-9]+', '_', topic.lower()).strip('_')}_clat_practice.pdf"
 
-        if mapped_topic not in SECTIONAL_PROMPTS:
-            return jsonify({'error': f"Invalid topic. Available: {list(SECTIONAL_PROMPTS.keys())}"}), 400
+def render_practice_pdf(contents, title):
+    """create_pdf through the render cache and render pool"""
+    return pdf_render_cache.render('practice', {'contents': contents, 'title': title}, render_pdf)
 
-        count = data.get('count', 1)
-        if not isinstance(count, int) or not (1 <= count <= 5):
-            return jsonify({'error': 'Count must be an integer between 1 and 5'}), 400
+def build_practice_pdf(data):
+    """Render a stored test, or generate a practice set, and return (pdf_bytes, download filename)"""
+    stored = load_stored_test(data)
+    if stored:
+        topic = stored['topic']
+        return render_practice_pdf(stored['sections'], f"{topic} Practice Set"), practice_pdf_filename(topic)
 
-        sections = generate_study_material(mapped_topic, count)
-        if not sections:
-            return jsonify({'error': 'Generation failed'}), 500
+    topic = data.get('topic') or data.get('subcategory')
+    if not topic:
+        raise GenerationError('Topic is missing', 400)
+    topic = sectional_topic(topic)
 
-        all_questions = []
-        all_answer_key = []
-        question_counter = 1
-        for section in sections:
-            questions = parse_mcqs(section)
-            if not questions:
-                print(f"[DEBUG] No questions parsed for a passage. Raw:\n{section[:500]}")
-                continue
-            answer_key = parse_answer_key(section)
-            # If answer key is missing, fallback to per-question
-            if not answer_key:
-                answer_key = []
-                for q in questions:
-                    answer_key.append({
-                        "question": question_counter,
-                        "answer": chr(65 + q['correct']),
-                        "answer_index": q['correct']
-                    })
-                    q['id'] = question_counter
-                    all_questions.append(q)
-                    question_counter += 1
-            else:
-                # Use parsed answer key, but ensure question numbers and questions are aligned
-                for idx, q in enumerate(questions):
-                    q['id'] = question_counter
-                    all_questions.append(q)
-                    if idx < len(answer_key):
-                        ak = answer_key[idx]
-                        ak['question'] = question_counter
-                        all_answer_key.append(ak)
-                    else:
-                        # Fallback if answer key is short
-                        all_answer_key.append({
-                            "question": question_counter,
-                            "answer": chr(65 + q['correct']),
-                            "answer_index": q['correct']
-                        })
-                    question_counter += 1
+    count = data.get('count', 1)
+    if not isinstance(count, int) or not (1 <= count <= 5):
+        raise GenerationError('Count must be an integer between 1 and 5', 400)
 
-        return jsonify({
-            'success': True,
-            'topic': topic,
-            'mapped_topic': mapped_topic,
-            'count': len(all_questions),
-            'test': all_questions,
-            'answer_key': all_answer_key,
-            'timestamp': datetime.now().isoformat(),
-            'service': 'sectional_tests'
-        })
+    # PDF downloads are bulk work and queue behind interactive requests
+    sections = take_sections(topic, count, fresh=data.get('fresh') is True, priority='bulk')
+    if not sections:
+        raise GenerationError('Failed to generate content')
+
+    return render_practice_pdf([section.raw for section in sections], f"{topic} Practice Set"), practice_pdf_filename(topic)
 
+@app.route("/generate-test", methods=['POST'])
+def generate_content():
+    """Generate sectional test content with answer key"""
+    try:
+        return jsonify(build_sectional_test(request.get_json()))
+
+    except GenerationError as e:
+        return jsonify({'error': e.message}), e.status
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
-@app.route('/download-pdf', methods=['POST'])
-def download_pdf():
-    """Download test as PDF"""
-    try:
-        data = request.get_json()
-        topic = data.get('topic') or data.get('subcategory')
-        if topic:
-            topic = topic.replace("-", " ").title()
-        else:
-            return jsonify({'error': 'Topic is missing'}), 400
-
-        count = data.get('count', 1)
-        if topic not in SECTIONAL_PROMPTS:
-            return jsonify({'error': f"Invalid topic. Available: {list(SECTIONAL_PROMPTS.keys())}"}), 400
-        if not isinstance(count, int) or not (1 <= count <= 5):
-            return jsonify({'error': 'Count must be an integer between 1 and 5'}), 400
+def build_answer_key_pdf(data):
+    """Render the answer key of a stored or posted test and return (pdf_bytes, download filename)"""
+    stored = load_stored_test(data)
+    if stored:
+        questions, answer_key = stored['questions'], stored['answer_key']
+    else:
+        questions = [Question.from_dict(q, i) for i, q in enumerate(data.get('questions', []), 1)]
+        answer_key = [AnswerKeyEntry.from_dict(a, str(i)) for i, a in enumerate(data.get('answer_key', []), 1)]
+    test_metadata = data.get('test_metadata', {})
+
+    if not questions or not answer_key:
+        raise GenerationError('Questions and answer key data are required', 400)
+
+    content = {
+        'questions': [q.to_dict() for q in questions],
+        'answer_key': [a.to_dict() for a in answer_key],
+        'test_metadata': test_metadata,
+    }
+    pdf_bytes = pdf_render_cache.render('answer-key', content, render_pdf)
+    if not pdf_bytes:
+        raise GenerationError('Failed to create answer key PDF')
 
-        sections = generate_study_material(topic, count)
-        if not sections:
-            return jsonify({'error': 'Failed to generate content'}), 500
+    filename = f"Answer_Key_{test_metadata.get('sectionName', 'Test')}_{test_metadata.get('subcategoryName', 'Practice')}_{datetime.now().strftime('%Y-%m-%d')}.pdf"
+    return pdf_bytes, filename
 
-        pdf_buffer = create_pdf(sections, f"{topic} Practice Set")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_buffer.getvalue())
-            tmp_path = tmp.name
+def pdf_response(pdf_bytes, filename):
+    """Send a PDF straight from memory.
 
-        filename = f"{topic.lower().replace(' ', '_')}_clat_practice.pdf"
-        return send_file(tmp_path, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    The ETag is a hash of the bytes. Content-Length is set, GET requests can
+    fetch byte ranges with Range, and If-None-Match can be answered with a 304.
+    """
+    try:
+        return send_file(BytesIO(pdf_bytes), as_attachment=True, download_name=filename, mimetype='application/pdf',
+                         etag=hashlib.sha256(pdf_bytes).hexdigest(), conditional=True)
+    except RequestedRangeNotSatisfiable as e:
+        # A 416 with the PDF's length, rather than the routes' 500 handler
+        return e.get_response()
 
+@app.route('/download-pdf', methods=['POST'])
+@app.route('/download-pdf/<test_id>', methods=['GET'])
+def download_pdf(test_id=None):
+    """Download test as PDF"""
+    try:
+        # GET links name a stored test, so they can be shared and resumed
+        data = {'test_id': test_id} if test_id else request.get_json()
+        return pdf_response(*build_practice_pdf(data))
+
+    except GenerationError as e:
+        return jsonify({'error': e.message}), e.status
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
 @app.route('/download-answer-key', methods=['POST'])
-def download_answer_key():
+@app.route('/download-answer-key/<test_id>', methods=['GET'])
+def download_answer_key(test_id=None):
     """Download answer key as PDF"""
     try:
-        data = request.get_json()
-        questions = data.get('questions', [])
-        answer_key = data.get('answer_key', [])
-        test_metadata = data.get('test_metadata', {})
-        
-        if not questions or not answer_key:
-            return jsonify({'error': 'Questions and answer key data are required'}), 400
-
-        pdf_buffer = create_answer_key_pdf(questions, answer_key, test_metadata)
-        if not pdf_buffer:
-            return jsonify({'error': 'Failed to create answer key PDF'}), 500
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_buffer.getvalue())
-            tmp_path = tmp.name
-
-        filename = f"Answer_Key_{test_metadata.get('sectionName', 'Test')}_{test_metadata.get('subcategoryName', 'Practice')}_{datetime.now().strftime('%Y-%m-%d')}.pdf"
-        return send_file(tmp_path, as_attachment=True, download_name=filename, mimetype='application/pdf')
+        # GET links take sectionName and subcategoryName for the title as query parameters
+        data = {'test_id': test_id, 'test_metadata': request.args.to_dict()} if test_id else request.get_json()
+        return pdf_response(*build_answer_key_pdf(data))
 
+    except GenerationError as e:
+        return jsonify({'error': e.message}), e.status
     except Exception as e:
         traceback.print_exc()
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
@@ -1691,44 +3923,97 @@ def generate_practice():
             print(f"[ERROR] Mapped topic '{topic_name}' not found in SECTIONAL_PROMPTS")
             return jsonify({"error": f"Unsupported topic: {topic_name}"}), 400
         print(f"[API] Generating practice for {topic_name} (subcategory: {subcategory}) with {passages} passages")
-        generated = generate_study_material(topic_name, passages)
+        if wants_event_stream(data):
+            return event_stream_response(stream_practice(topic_name, passages, fresh=data.get("fresh") is True))
+        generated = take_sections(topic_name, passages, fresh=data.get("fresh") is True)
         if not generated:
             print(f"[ERROR] Content generation failed for topic '{topic_name}'")
             return jsonify({"error": "Content generation failed"}), 500
+        # Compact responses send each passage once, looked up by the questions' passageIndex
+        compact = wants_compact(data)
+        passages = []
         all_questions = []
-        for p_index, raw in enumerate(generated):
+        for p_index, section in enumerate(generated):
             print(f"[API] Processing passage {p_index + 1}")
-            questions = parse_mcqs(raw)
+            passages.append(section.text)
             # REMOVE strict 650-word check
-            if questions:
-                for q_index, q in enumerate(questions):
-                    if not isinstance(q["options"], list) or len(q["options"]) != 4 or any(not opt.strip() for opt in q["options"]):
-                        print(f"[ERROR] Question {q_index+1} in passage {p_index+1} does not have 4 valid options.")
-                        return jsonify({"error": f"Question {q_index+1} in passage {p_index+1} does not have 4 valid options. Please regenerate."}), 500
-                    if not (0 <= q["correct"] < 4):
-                        print(f"[ERROR] Question {q_index+1} in passage {p_index+1} has an invalid correct answer index.")
-                        return jsonify({"error": f"Question {q_index+1} in passage {p_index+1} has an invalid correct answer index. Please regenerate."}), 500
-                    q["passage"] = questions[0]["passage"]
-                    all_questions.append({
-                        "passageIndex": p_index,
-                        "id": f"{p_index}-{q_index}",
-                        "passage": q["passage"],
-                        "question": q["question"],
-                        "options": q["options"],
-                        "correct": q["correct"],
-                        "explanation": q["explanation"]
-                    })
+            for q_index, q in enumerate(section.questions):
+                question = practice_question(p_index, q_index, q, section.text)
+                if compact:
+                    del question["passage"]
+                all_questions.append(question)
         print(f"[API] Generated {len(all_questions)} total questions")
-        return jsonify({
+        body = {
             "success": True,
             "questions": all_questions,
             "total": len(all_questions),
             "service": "sectional_tests"
-        })
+        }
+        if compact:
+            body["passages"] = passages
+        return jsonify(body)
+    except GenerationError as e:
+        return jsonify({"error": str(e)}), e.status
+    except GroqUnavailable as e:
+        return groq_unavailable_response(e)
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": "Server error", "details": str(e)}), 500
 
+def practice_question(p_index, q_index, q, passage):
+    """Shape a parsed question for /api/generate-practice, raising GenerationError if it is unusable"""
+    if not isinstance(q.options, list) or len(q.options) != 4 or any(not opt.strip() for opt in q.options):
+        print(f"[ERROR] Question {q_index+1} in passage {p_index+1} does not have 4 valid options.")
+        raise GenerationError(f"Question {q_index+1} in passage {p_index+1} does not have 4 valid options. Please regenerate.")
+    if not (0 <= q.correct < 4):
+        print(f"[ERROR] Question {q_index+1} in passage {p_index+1} has an invalid correct answer index.")
+        raise GenerationError(f"Question {q_index+1} in passage {p_index+1} has an invalid correct answer index. Please regenerate.")
+    return {"passageIndex": p_index, **q.to_dict(id=f"{p_index}-{q_index}", passage=passage)}
+
+def stream_practice(topic, count, fresh=False):
+    """Relay practice passages as server-sent events, each question as soon as it is parsed"""
+    total = 0
+    p_index = 0
+    unavailable = None
+    sections = stream_sections(topic, count, fresh)
+    try:
+        for events in sections:
+            passage = None
+            q_index = 0
+            for kind, value in events:
+                if kind == 'passage':
+                    passage = value
+                    yield sse_event({"passageIndex": p_index, "passage": passage}, event="passage")
+                elif kind == 'question':
+                    yield sse_event(practice_question(p_index, q_index, value, passage), event="question")
+                    q_index += 1
+                    total += 1
+                else:
+                    print(f"❌ Passage {p_index + 1} for {topic} failed: {value}")
+                    if isinstance(value, GroqUnavailable):
+                        unavailable = value
+            if passage is not None:
+                p_index += 1
+        if not total:
+            print(f"[ERROR] Content generation failed for topic '{topic}'")
+            error = {"error": str(unavailable) if unavailable else "Content generation failed"}
+            if unavailable and unavailable.retry_after:
+                error["retry_after"] = unavailable.retry_after
+            yield sse_event(error, event="error")
+            return
+        print(f"[API] Streamed {total} total questions")
+        yield sse_event({
+            "success": True,
+            "total": total,
+            "service": "sectional_tests",
+            "timestamp": datetime.now().isoformat()
+        }, event="done")
+    except GenerationError as e:
+        yield sse_event({"error": str(e)}, event="error")
+    finally:
+        # A client that disconnected, or a failure above, leaves passages streaming
+        sections.close()
+
 # Test parser endpoint
 @app.route('/test-parser', methods=['GET'])
 def test_parser():
@@ -1763,6 +4048,227 @@ Explanation: Article 14 of the Indian Constitution guarantees the Right to Equal
         'sample_input': sample_text
     })
 
+# =============================================================================
+# BACKGROUND JOB ROUTES
+# =============================================================================
+
+class JobStore:
+    """File-backed store of background generation jobs.
+
+    Each job is a JSON metadata file plus an optional result file, written
+    atomically so any worker can report on a job, and a result written before
+    a restart can still be downloaded afterwards.
+    """
+
+    def __init__(self, directory, retention_seconds, timeout_seconds):
+        self.directory = directory
+        self.retention_seconds = retention_seconds
+        self.timeout_seconds = timeout_seconds
+        # Distinguishes this process from an earlier one that happened to reuse its PID
+        self.boot_id = uuid.uuid4().hex
+        self._lock = threading.Lock()
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def _write(self, path, data, mode='w'):
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(mode, dir=self.directory, suffix='.tmp', delete=False) as tmp:
+            if mode == 'w':
+                json.dump(data, tmp, default=json_default)
+            else:
+                tmp.write(data)
+        os.replace(tmp.name, path)
+
+    def create(self, job_type, params):
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': job_type,
+            'status': 'queued',
+            'params': params,
+            'created': time.time(),
+            'updated': time.time(),
+            'pid': os.getpid(),
+            'boot_id': self.boot_id,
+            'error': None,
+            'error_status': None,
+            'result_type': None,
+            'filename': None,
+        }
+        self._write(self._path(job['id'], '.json'), job)
+        self.prune()
+        return job
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self.load(job_id)
+            if job is None:
+                return None
+            job.update(fields, updated=time.time())
+            self._write(self._path(job_id, '.json'), job)
+            return job
+
+    def load(self, job_id):
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id, '.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def status(self, job_id):
+        """Load a job, marking it failed if the worker holding it has gone away.
+
+        Running jobs also fail once they have not been updated for the timeout.
+        Queued jobs are only waiting for an executor thread in a live worker,
+        so they are left to run however long the queue is.
+        """
+        job = self.load(job_id)
+        if job and job['status'] in ('queued', 'running'):
+            stalled = job['status'] == 'running' and time.time() - job['updated'] > self.timeout_seconds
+            if stalled or not self._worker_alive(job):
+                job = self.update(job_id, status='failed', error_status=500,
+                                  error='Job was interrupted by a server restart. Please submit it again.')
+        return job
+
+    def _worker_alive(self, job):
+        pid = job['pid']
+        if pid == os.getpid():
+            return job.get('boot_id') == self.boot_id
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def save_result(self, job_id, result_type, result, filename=None):
+        if result_type == 'pdf':
+            self._write(self._path(job_id, '.pdf'), result, mode='wb')
+        else:
+            self._write(self._path(job_id, '.result.json'), result)
+        return self.update(job_id, status='succeeded', result_type=result_type, filename=filename)
+
+    def result_path(self, job):
+        suffix = '.pdf' if job['result_type'] == 'pdf' else '.result.json'
+        return self._path(job['id'], suffix)
+
+    def prune(self):
+        """Delete jobs older than the retention window"""
+        cutoff = time.time() - self.retention_seconds
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+job_store = JobStore(JOB_STORE_DIR, JOB_RETENTION_SECONDS, JOB_TIMEOUT_SECONDS)
+
+_job_executor = None
+_job_executor_pid = None
+_job_executor_lock = threading.Lock()
+
+def get_job_executor():
+    """Return this worker's pool of background job threads"""
+    global _job_executor, _job_executor_pid
+    pid = os.getpid()
+    if _job_executor is None or _job_executor_pid != pid:
+        with _job_executor_lock:
+            if _job_executor is None or _job_executor_pid != pid:
+                _job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+                _job_executor_pid = pid
+    return _job_executor
+
+def run_job(job_id, job_type, params):
+    """Execute a queued job and persist its outcome"""
+    job_store.update(job_id, status='running', pid=os.getpid(), boot_id=job_store.boot_id)
+    print(f"[JOB] Running {job_type} job {job_id}")
+    try:
+        if job_type == 'generate-test':
+            job_store.save_result(job_id, 'json', build_sectional_test(params))
+        else:
+            pdf_bytes, filename = build_practice_pdf(params)
+            job_store.save_result(job_id, 'pdf', pdf_bytes, filename=filename)
+        print(f"[JOB] Finished {job_type} job {job_id}")
+    except GenerationError as e:
+        job_store.update(job_id, status='failed', error=e.message, error_status=e.status)
+    except GroqUnavailable as e:
+        job_store.update(job_id, status='failed', error=str(e), error_status=e.status)
+    except Exception as e:
+        traceback.print_exc()
+        job_store.update(job_id, status='failed', error=f'Internal server error: {e}', error_status=500)
+
+JOB_TYPES = ('generate-test', 'download-pdf')
+
+def job_links(job):
+    return {
+        'job_id': job['id'],
+        'type': job['type'],
+        'status': job['status'],
+        'status_url': f"/jobs/{job['id']}",
+        'result_url': f"/jobs/{job['id']}/result",
+    }
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a sectional test or practice PDF generation and return its job ID"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        job_type = data.get('type')
+        if job_type not in JOB_TYPES:
+            return jsonify({'error': f"Invalid job type. Available: {list(JOB_TYPES)}"}), 400
+        params = {k: v for k, v in data.items() if k != 'type'}
+        job = job_store.create(job_type, params)
+        get_job_executor().submit(run_job, job['id'], job_type, params)
+        print(f"[JOB] Queued {job_type} job {job['id']}")
+        return jsonify(job_links(job)), 202
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state of a background job"""
+    job = job_store.status(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    body = job_links(job)
+    body.update({
+        'created': datetime.fromtimestamp(job['created']).isoformat(),
+        'updated': datetime.fromtimestamp(job['updated']).isoformat(),
+        'error': job['error'],
+    })
+    return jsonify(body)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """Return a finished job's test JSON or PDF"""
+    job = job_store.status(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'status': 'failed'}), job['error_status'] or 500
+    if job['status'] != 'succeeded':
+        return jsonify(job_links(job)), 202
+    path = job_store.result_path(job)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Job result has expired'}), 410
+    if job['result_type'] == 'pdf':
+        return send_file(path, as_attachment=True, download_name=job['filename'], mimetype='application/pdf')
+    # Read rather than send_file, so large results are compressed like other JSON responses
+    with open(path, 'rb') as f:
+        return Response(f.read(), mimetype='application/json')
+
 # =============================================================================
 # HEALTH CHECK ROUTES
 # =============================================================================
@@ -1780,6 +4286,14 @@ def health_check():
             'sectional_tests': 'operational'
         },
         'groq_configured': bool(GROQ_API_KEY),
+        'llm_cache': llm_cache.stats(),
+        'test_store': test_store.stats(),
+        'pdf_cache': pdf_render_cache.stats(),
+        'single_flight': single_flight.stats(),
+        'groq_scheduler': groq_scheduler.stats(),
+        'groq_client': groq_resilience.stats(),
+        'question_bank': question_bank.stats(),
+        'structured_output': structured_output_stats(),
         'timestamp': datetime.now().isoformat(),
         'available_topics': {
             'gk_topics': list(TOPIC_CONTEXTS.keys()),
@@ -1882,6 +4396,7 @@ def not_found(error):
             "lexa_chatbot": ["/lexa/chat", "/lexa/health"],
             "qt_mentor": ["/qt/generate-question", "/qt/test"],
             "sectional_tests": ["/generate-test", "/download-pdf", "/topics", "/api/generate-practice"],
+            "jobs": ["/jobs", "/jobs/<job_id>", "/jobs/<job_id>/result"],
             "health": "/health",
             "debug": "/test-parser"
         }
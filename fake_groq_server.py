@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Groq chat completions API, for load and latency testing
+
+Serves POST /openai/v1/chat/completions with canned replies shaped like the
+sectional test, QT, GK and Lexa outputs app.py expects, so the whole app can be
+exercised without spending Groq quota:
+
+    python fake_groq_server.py --port 8000 --latency-ms 800 --tokens-per-second 250
+    GROQ_API_URL=http://127.0.0.1:8000/openai/v1/chat/completions GROQ_API_KEY=fake python app.py
+
+Every option can also be set through the environment variable named in its help
+text. GET /stats reports what the server has served so far.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from flask import Flask, Response, jsonify, request
+
+app = Flask(__name__)
+
+stats = {
+    'requests': 0,
+    'streamed': 0,
+    'errors_injected': 0,
+    'rate_limited': 0,
+    'invalid_json': 0,
+    'completion_tokens': 0,
+    'by_kind': {},
+}
+stats_lock = threading.Lock()
+token_log = deque()  # (timestamp, tokens) over the last minute, for --tpm/--rpm
+sequence = [0]
+
+# =============================================================================
+# CANNED OUTPUTS
+# =============================================================================
+
+FILLER_SENTENCES = [
+    "The principle applies only where the conduct in question was undertaken in good faith.",
+    "Courts have consistently held that a statutory duty cannot be displaced by private agreement.",
+    "A person who voluntarily assumes a risk cannot later claim compensation for the harm that follows.",
+    "Where two interpretations are possible, the one that advances the purpose of the law is preferred.",
+    "The burden of proving an exception lies on the party who seeks to rely on it.",
+    "Consent obtained through coercion or misrepresentation is not free consent in law.",
+    "Public authorities must act reasonably and give reasons when they affect individual rights.",
+    "An omission attracts liability only where the law imposes a duty to act.",
+]
+
+def filler(words, seed):
+    """Deterministic prose of roughly the given number of words"""
+    rng = random.Random(seed)
+    text = []
+    count = 0
+    while count < words:
+        sentence = rng.choice(FILLER_SENTENCES)
+        text.append(sentence)
+        count += len(sentence.split())
+    return " ".join(text)
+
+def sectional_output(seq):
+    questions = []
+    answers = []
+    for n in range(1, 7):
+        correct = "ABCD"[(seq + n) % 4]
+        questions.append(
+            f"Question {n}:\n"
+            f"Applying the principle in passage {seq}, which outcome follows in scenario {n}?\n"
+            f"(A) The claim succeeds because the duty was breached\n"
+            f"(B) The claim fails because the risk was voluntarily assumed\n"
+            f"(C) The claim succeeds only in part\n"
+            f"(D) The claim is barred by limitation\n"
+            f"Answer: ({correct})\n"
+            f"Explanation: {filler(60, seq * 10 + n)}"
+        )
+        answers.append(f"{n}. ({correct})")
+    passage = filler(650, seq)
+    return (
+        f"{passage}\n\n[Word Count: 650]\n\n**MCQs**\n\n"
+        + "\n\n".join(questions)
+        + "\n\n**ANSWER KEY**\n" + "\n".join(answers) + "\n"
+    )
+
+def qt_output(seq):
+    rng = random.Random(seq)
+    values = [rng.randint(100, 900) for _ in range(4)]
+    questions = "\n\n".join(
+        f"1.{n} What is the percentage change between Region {n} and the total?\n"
+        f"(A) {10 + n}%\n(B) {20 + n}%\n(C) {30 + n}%\n(D) {40 + n}%"
+        for n in range(1, 7)
+    )
+    key = "\n\n".join(
+        f"1.{n} – ({'ABCD'[n % 4]}) Step 1: Add the four regional figures. Step 2: Divide the "
+        f"regional figure by the total. Step 3: Multiply by 100. {filler(40, seq + n)}"
+        for n in range(1, 7)
+    )
+    return (
+        f"In recent years, sales of a consumer brand across four regions were "
+        f"₹{values[0]} crore, ₹{values[1]} crore, ₹{values[2]} crore and ₹{values[3]} crore. "
+        f"{filler(90, seq)}\n\n"
+        f'visualData: {{ "type": "bar", "labels": ["North", "South", "East", "West"], "values": {json.dumps(values)} }}\n\n'
+        f"{questions}\n\nAnswer Key\n\n{key}\n"
+    )
+
+def sectional_json(seq):
+    """sectional_output as the JSON object requested in structured-output mode"""
+    return json.dumps({
+        "passage": filler(650, seq),
+        "questions": [{
+            "question": f"Applying the principle in passage {seq}, which outcome follows in scenario {n}?",
+            "options": [
+                "The claim succeeds because the duty was breached",
+                "The claim fails because the risk was voluntarily assumed",
+                "The claim succeeds only in part",
+                "The claim is barred by limitation",
+            ],
+            "answer": (seq + n) % 4,
+            "explanation": filler(60, seq * 10 + n),
+        } for n in range(1, 7)],
+    })
+
+def qt_json(seq):
+    """qt_output as the JSON object requested in structured-output mode"""
+    rng = random.Random(seq)
+    values = [rng.randint(100, 900) for _ in range(4)]
+    return json.dumps({
+        "passage": f"In recent years, sales of a consumer brand across four regions were "
+                   f"₹{values[0]} crore, ₹{values[1]} crore, ₹{values[2]} crore and ₹{values[3]} crore. "
+                   f"{filler(90, seq)}",
+        "visualData": {"type": "bar", "labels": ["North", "South", "East", "West"], "values": values},
+        "questions": [{
+            "question": f"What is the percentage change between Region {n} and the total?",
+            "options": [f"{10 + n}%", f"{20 + n}%", f"{30 + n}%", f"{40 + n}%"],
+            "answer": n % 4,
+            "explanation": f"Step 1: Add the four regional figures. Step 2: Divide the regional figure by "
+                           f"the total. Step 3: Multiply by 100. {filler(40, seq + n)}",
+        } for n in range(1, 7)],
+    })
+
+def gk_output(seq):
+    questions = "\n\n".join(
+        f"1.{n} Which of the following statements about development {n} is correct?\n"
+        f"(A) Statement one\n(B) Statement two\n(C) Statement three\n(D) Statement four"
+        for n in range(1, 6)
+    )
+    key = "\n".join(f"1.{n} – ({'ABCD'[(seq + n) % 4]})" for n in range(1, 6))
+    return f"1 {filler(650, seq)}\n\n{questions}\n\nAnswer Key\n{key}\n"
+
+def chat_output(seq, question):
+    return (
+        f"Great question! Here is how to think about it for CLAT: {question[:200]}\n\n"
+        f"{filler(120, seq)}\n\nKeep practising with past papers to build speed and accuracy."
+    )
+
+def pick_output(messages, json_mode=False):
+    """Choose a canned reply from the system prompt, as each route sends its own"""
+    system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    user = next((m.get('content') or '' for m in reversed(messages) if m.get('role') == 'user'), '')
+    with stats_lock:
+        sequence[0] += 1
+        seq = sequence[0]
+    if 'CLAT study material generator' in system:
+        return 'sectional', sectional_json(seq) if json_mode else sectional_output(seq)
+    if 'Quantitative Aptitude generator' in system:
+        return 'qt', qt_json(seq) if json_mode else qt_output(seq)
+    if 'General Knowledge passage generator' in system:
+        return 'gk', gk_output(seq)
+    if 'You are Lexa' in system:
+        return 'lexa', chat_output(seq, user)
+    return 'chat', chat_output(seq, user)
+
+# =============================================================================
+# LATENCY, LIMITS AND FAULTS
+# =============================================================================
+
+def sample_latency():
+    """Time to first token in seconds, drawn from the configured distribution"""
+    mean = config.latency_ms / 1000
+    jitter = config.latency_jitter_ms / 1000
+    if config.latency_dist == 'uniform':
+        value = random.uniform(mean - jitter, mean + jitter)
+    elif config.latency_dist == 'normal':
+        value = random.gauss(mean, jitter)
+    elif config.latency_dist == 'lognormal':
+        # Heavy tail: the median is mean, jitter/mean sets the spread
+        sigma = jitter / mean if mean else 0
+        value = mean * random.lognormvariate(0, sigma)
+    else:
+        value = mean
+    return max(0.0, value)
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+def rate_limit_headers(now):
+    """x-ratelimit-* headers like Groq's, plus whether this request is over a limit"""
+    with stats_lock:
+        while token_log and now - token_log[0][0] > 60:
+            token_log.popleft()
+        used_tokens = sum(tokens for _, tokens in token_log)
+        used_requests = len(token_log)
+    headers = {
+        'x-ratelimit-limit-requests': str(config.rpm or 14400),
+        'x-ratelimit-remaining-requests': str(max(0, (config.rpm or 14400) - used_requests)),
+        'x-ratelimit-reset-requests': '60s',
+    }
+    over = bool(config.rpm and used_requests >= config.rpm)
+    if config.tpm:
+        headers.update({
+            'x-ratelimit-limit-tokens': str(config.tpm),
+            'x-ratelimit-remaining-tokens': str(max(0, config.tpm - used_tokens)),
+            'x-ratelimit-reset-tokens': f"{60 * min(1.0, used_tokens / config.tpm):.2f}s",
+        })
+        over = over or used_tokens >= config.tpm
+    return headers, over
+
+def count(name, kind=None, amount=1):
+    with stats_lock:
+        stats[name] += amount
+        if kind:
+            stats['by_kind'][kind] = stats['by_kind'].get(kind, 0) + 1
+
+def error_response(status, message, error_type, headers=None):
+    response = jsonify({'error': {'message': message, 'type': error_type}})
+    response.status_code = status
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    return response
+
+# =============================================================================
+# ROUTES
+# =============================================================================
+
+@app.route('/openai/v1/chat/completions', methods=['POST'])
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    payload = request.get_json(silent=True) or {}
+    messages = payload.get('messages') or []
+    if not messages:
+        return error_response(400, "'messages' is required", 'invalid_request_error')
+    count('requests')
+
+    now = time.time()
+    headers, over_limit = rate_limit_headers(now)
+    if over_limit or random.random() < config.rate_limit_rate:
+        count('rate_limited')
+        time.sleep(min(sample_latency(), 0.05))
+        headers['retry-after'] = str(config.retry_after)
+        return error_response(429, 'Rate limit reached. Please try again later.', 'rate_limit_exceeded', headers)
+    if random.random() < config.error_rate:
+        count('errors_injected')
+        time.sleep(sample_latency())
+        return error_response(random.choice([500, 502, 503]), 'Injected upstream error', 'internal_server_error')
+
+    json_mode = (payload.get('response_format') or {}).get('type') == 'json_object'
+    kind, text = pick_output(messages, json_mode)
+    if json_mode and random.random() < config.invalid_json_rate:
+        count('invalid_json')
+        text = text[:len(text) // 2]
+    max_chars = int(payload.get('max_tokens') or 7000) * 4
+    finish_reason = 'stop'
+    if len(text) > max_chars:
+        text, finish_reason = text[:max_chars], 'length'
+    prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in messages)
+    completion_tokens = estimate_tokens(text)
+    usage = {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+    with stats_lock:
+        token_log.append((now, usage['total_tokens']))
+    count('completion_tokens', kind, completion_tokens)
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(now)
+    model = payload.get('model', 'fake-model')
+    first_token = sample_latency()
+    per_token = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+
+    if payload.get('stream'):
+        count('streamed')
+
+        def events():
+            def chunk(delta, finish=None, extra=None):
+                body = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                    'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish}],
+                }
+                if extra:
+                    body.update(extra)
+                return f"data: {json.dumps(body)}\n\n"
+
+            time.sleep(first_token)
+            yield chunk({'role': 'assistant', 'content': ''})
+            words = text.split(' ')
+            for i, word in enumerate(words):
+                piece = word if i == len(words) - 1 else word + ' '
+                time.sleep(per_token * estimate_tokens(piece))
+                yield chunk({'content': piece})
+            yield chunk({}, finish_reason, {'x_groq': {'usage': usage}})
+            yield "data: [DONE]\n\n"
+
+        return Response(events(), mimetype='text/event-stream', headers=headers)
+
+    time.sleep(first_token + per_token * completion_tokens)
+    response = jsonify({
+        'id': completion_id,
+        'object': 'chat.completion',
+        'created': created,
+        'model': model,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': text},
+            'finish_reason': finish_reason,
+        }],
+        'usage': usage,
+    })
+    response.headers.update(headers)
+    return response
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    with stats_lock:
+        return jsonify({**stats, 'by_kind': dict(stats['by_kind']), 'config': vars(config)})
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server")
+    parser.add_argument('--host', default=env('FAKE_GROQ_HOST', '127.0.0.1'), help="FAKE_GROQ_HOST")
+    parser.add_argument('--port', type=int, default=int(env('FAKE_GROQ_PORT', 8000)), help="FAKE_GROQ_PORT")
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'normal', 'lognormal'],
+                        default=env('FAKE_GROQ_LATENCY_DIST', 'lognormal'),
+                        help="Time-to-first-token distribution (FAKE_GROQ_LATENCY_DIST)")
+    parser.add_argument('--latency-ms', type=float, default=float(env('FAKE_GROQ_LATENCY_MS', 800)),
+                        help="Mean (median for lognormal) time to first token (FAKE_GROQ_LATENCY_MS)")
+    parser.add_argument('--latency-jitter-ms', type=float, default=float(env('FAKE_GROQ_LATENCY_JITTER_MS', 400)),
+                        help="Spread of the latency distribution (FAKE_GROQ_LATENCY_JITTER_MS)")
+    parser.add_argument('--tokens-per-second', type=float, default=float(env('FAKE_GROQ_TOKENS_PER_SECOND', 250)),
+                        help="Generation speed after the first token; 0 is instant (FAKE_GROQ_TOKENS_PER_SECOND)")
+    parser.add_argument('--error-rate', type=float, default=float(env('FAKE_GROQ_ERROR_RATE', 0)),
+                        help="Fraction of requests answered with a 5xx (FAKE_GROQ_ERROR_RATE)")
+    parser.add_argument('--rate-limit-rate', type=float, default=float(env('FAKE_GROQ_RATE_LIMIT_RATE', 0)),
+                        help="Fraction of requests answered with a 429 (FAKE_GROQ_RATE_LIMIT_RATE)")
+    parser.add_argument('--invalid-json-rate', type=float, default=float(env('FAKE_GROQ_INVALID_JSON_RATE', 0)),
+                        help="Fraction of JSON-mode replies cut short so they fail to parse (FAKE_GROQ_INVALID_JSON_RATE)")
+    parser.add_argument('--retry-after', type=float, default=float(env('FAKE_GROQ_RETRY_AFTER', 2)),
+                        help="Retry-After seconds on 429 responses (FAKE_GROQ_RETRY_AFTER)")
+    parser.add_argument('--rpm', type=int, default=int(env('FAKE_GROQ_RPM', 0)),
+                        help="Requests per minute before answering 429; 0 is unlimited (FAKE_GROQ_RPM)")
+    parser.add_argument('--tpm', type=int, default=int(env('FAKE_GROQ_TPM', 0)),
+                        help="Tokens per minute before answering 429; 0 is unlimited (FAKE_GROQ_TPM)")
+    parser.add_argument('--seed', type=int, default=env('FAKE_GROQ_SEED'), help="Random seed (FAKE_GROQ_SEED)")
+    return parser.parse_args(argv)
+
+# Defaults from the environment, so the app can also be imported and served elsewhere
+config = parse_args([])
+
+if __name__ == "__main__":
+    config = parse_args()
+    if config.seed is not None:
+        random.seed(int(config.seed))
+    print("=" * 80)
+    print(f"🧪 Fake Groq server on http://{config.host}:{config.port}/openai/v1/chat/completions")
+    print(f"   Latency: {config.latency_dist} {config.latency_ms:.0f}ms ± {config.latency_jitter_ms:.0f}ms, "
+          f"{config.tokens_per_second:g} tokens/s")
+    print(f"   Faults: {config.error_rate:.0%} errors, {config.rate_limit_rate:.0%} rate limited")
+    print("=" * 80)
+    app.run(host=config.host, port=config.port, threaded=True)
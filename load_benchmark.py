@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for every Groq-backed route in app.py
+
+Drives each endpoint at a fixed concurrency and records p50/p95/p99 latency,
+throughput and error rate to JSON. Against a stored baseline it reports
+regressions and exits non-zero, so it can gate a deploy:
+
+    # Start fake_groq_server.py and the app under gunicorn, then benchmark
+    python load_benchmark.py --spawn --concurrency 8 --requests 40 --output bench.json
+
+    # Against an already running app, compared with an earlier run
+    python load_benchmark.py --base-url http://127.0.0.1:5000 --baseline bench.json
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# =============================================================================
+# ENDPOINTS
+# =============================================================================
+
+SAMPLE_QUESTIONS = [
+    {
+        "id": n,
+        "passage": "The doctrine of basic structure limits Parliament's amending power.",
+        "question": f"Which statement about the doctrine is correct in scenario {n}?",
+        "options": ["Statement one", "Statement two", "Statement three", "Statement four"],
+        "correct": n % 4,
+        "explanation": "The doctrine was laid down in Kesavananda Bharati (1973)."
+    }
+    for n in range(1, 7)
+]
+SAMPLE_ANSWER_KEY = [
+    {"question": q["id"], "answer": "ABCD"[q["correct"]], "answer_index": q["correct"]}
+    for q in SAMPLE_QUESTIONS
+]
+
+def sample_pdf():
+    """A one-page PDF for /gk/upload-pdf, or None without PyMuPDF"""
+    try:
+        import fitz
+    except ImportError:
+        return None
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "The G20 summit adopted a declaration on climate finance and digital public "
+                               "infrastructure.\nIndia assumed the presidency and hosted meetings in many cities.")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def build_endpoints(fresh):
+    """name -> (method, path, request kwargs factory taking the request number)"""
+    extra = {"fresh": True} if fresh else {}
+    pdf = sample_pdf()
+
+    def unique(text, i):
+        # Distinct text per request so the response cache does not hide Groq latency
+        return f"{text} (benchmark {i} {uuid.uuid4().hex[:6]})" if fresh else text
+
+    endpoints = {
+        "/gk/generate": ("POST", "/gk/generate", lambda i: {"json": {
+            "message": unique("Generate a passage on recent G20 developments", i), "topic": "International Affairs", **extra}}),
+        "/gk/assistant": ("POST", "/gk/assistant", lambda i: {"json": {
+            "message": unique("Explain the basic structure doctrine", i), **extra}}),
+        "/gk/upload-pdf": ("POST", "/gk/upload-pdf", lambda i: {
+            "files": {"file": ("benchmark.pdf", pdf, "application/pdf")},
+            "data": {"fresh": "true"} if fresh else {}}),
+        "/lexa/chat": ("POST", "/lexa/chat", lambda i: {"json": {
+            "message": unique("How should I prepare for legal reasoning?", i), **extra}}),
+        "/qt/generate-question": ("POST", "/qt/generate-question", lambda i: {"json": {
+            "topic": "bar-charts", **extra}}),
+        "/generate-test": ("POST", "/generate-test", lambda i: {"json": {
+            "subcategory": "Legal Reasoning", "count": 2, **extra}}),
+        "/api/generate-practice": ("POST", "/api/generate-practice", lambda i: {"json": {
+            "section": "logical", "subcategory": "general-legal", "passages": 2, **extra}}),
+        "/download-pdf": ("POST", "/download-pdf", lambda i: {"json": {
+            "topic": "Legal Reasoning", "count": 1, **extra}}),
+        "/download-answer-key": ("POST", "/download-answer-key", lambda i: {"json": {
+            "questions": SAMPLE_QUESTIONS, "answer_key": SAMPLE_ANSWER_KEY,
+            "test_metadata": {"sectionName": "Legal", "subcategoryName": "Benchmark"}}}),
+    }
+    if pdf is None:
+        print("⚠️  PyMuPDF not installed - skipping /gk/upload-pdf")
+        del endpoints["/gk/upload-pdf"]
+    return endpoints
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_endpoint(base_url, method, path, make_kwargs, total, concurrency, timeout):
+    """Send total requests at the given concurrency and summarise them"""
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = local.session.request(method, base_url + path, timeout=timeout, **make_kwargs(i))
+            body = response.content
+            return time.perf_counter() - started, response.status_code, len(body)
+        except requests.exceptions.RequestException as e:
+            return time.perf_counter() - started, type(e).__name__, 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(r[0] * 1000 for r in results)
+    status_codes = {}
+    errors = 0
+    for _, status, _ in results:
+        status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+        if not (isinstance(status, int) and 200 <= status < 300):
+            errors += 1
+    ok_latencies = sorted(r[0] * 1000 for r in results if isinstance(r[1], int) and 200 <= r[1] < 300)
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+        "duration_s": round(elapsed, 3),
+        "latency_ms": summarize(latencies),
+        "success_latency_ms": summarize(ok_latencies),
+        "bytes_mean": round(sum(r[2] for r in results) / total) if total else 0,
+        "status_codes": status_codes,
+    }
+
+def summarize(latencies):
+    if not latencies:
+        return None
+    return {
+        "p50": round(percentile(latencies, 50), 2),
+        "p95": round(percentile(latencies, 95), 2),
+        "p99": round(percentile(latencies, 99), 2),
+        "mean": round(sum(latencies) / len(latencies), 2),
+        "max": round(latencies[-1], 2),
+    }
+
+# =============================================================================
+# BASELINE COMPARISON
+# =============================================================================
+
+def compare(results, baseline, tolerance, error_tolerance):
+    """Print a comparison table and return the list of regressions"""
+    regressions = []
+    print("")
+    print(f"{'Endpoint':<26}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'req/s':>16}{'errors':>14}")
+    for name, current in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before.get("latency_ms") or not current.get("latency_ms"):
+            print(f"{name:<26}  (no baseline)")
+            continue
+        cells = []
+        for pct in ("p50", "p95", "p99"):
+            old, new = before["latency_ms"][pct], current["latency_ms"][pct]
+            change = (new - old) / old if old else 0.0
+            cells.append(f"{new:>9.0f} ({change:+.0%})")
+            if pct != "p50" and change > tolerance:
+                regressions.append(f"{name} {pct} {old:.0f}ms -> {new:.0f}ms ({change:+.0%})")
+        old_rps, new_rps = before["throughput_rps"], current["throughput_rps"]
+        rps_change = (new_rps - old_rps) / old_rps if old_rps else 0.0
+        if rps_change < -tolerance:
+            regressions.append(f"{name} throughput {old_rps:.2f} -> {new_rps:.2f} req/s ({rps_change:+.0%})")
+        error_change = current["error_rate"] - before["error_rate"]
+        if error_change > error_tolerance:
+            regressions.append(f"{name} error rate {before['error_rate']:.1%} -> {current['error_rate']:.1%}")
+        print(f"{name:<26}{cells[0]:>18}{cells[1]:>18}{cells[2]:>18}"
+              f"{new_rps:>8.2f} ({rps_change:+.0%}){current['error_rate']:>13.1%}")
+    return regressions
+
+# =============================================================================
+# SPAWNED SERVERS
+# =============================================================================
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=2)
+            return True
+        except requests.exceptions.RequestException:
+            time.sleep(0.25)
+    return False
+
+def spawn_servers(args):
+    """Start fake_groq_server.py and the app; returns (base_url, processes)"""
+    processes = []
+    fake_cmd = [sys.executable, os.path.join(ROOT, "fake_groq_server.py"), "--port", str(args.fake_port)]
+    fake_cmd += args.fake_args.split()
+    processes.append(subprocess.Popen(fake_cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    if not wait_for(f"http://127.0.0.1:{args.fake_port}/stats", 15):
+        raise RuntimeError("fake_groq_server.py did not start")
+
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_URL": f"http://127.0.0.1:{args.fake_port}/openai/v1/chat/completions",
+        "GROQ_API_KEY": "benchmark",
+        "GROQ_RPM_LIMIT": "0",
+        "PORT": str(args.app_port),
+    })
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    if shutil.which("gunicorn"):
+        app_cmd = ["gunicorn", "app:app", "-b", f"127.0.0.1:{args.app_port}", "-w", str(args.workers),
+                   "--threads", str(args.threads), "--timeout", "300"]
+    else:
+        app_cmd = [sys.executable, os.path.join(ROOT, "app.py")]
+    log = open(os.path.join(ROOT, "load_benchmark_app.log"), "w") if args.app_log else subprocess.DEVNULL
+    processes.append(subprocess.Popen(app_cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT))
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    if not wait_for(f"{base_url}/health", 60):
+        raise RuntimeError(f"App did not start: {' '.join(app_cmd)}")
+    return base_url, processes
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmark for the CLAT AI app")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5000", help="App to benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests per endpoint")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per endpoint")
+    parser.add_argument("--endpoints", default="", help="Comma-separated subset of endpoints to run")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--allow-cache", action="store_true",
+                        help="Repeat identical requests and let the response cache answer them")
+    parser.add_argument("--output", default="benchmark-results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.20,
+                        help="Allowed p95/p99 slowdown or throughput drop before it counts as a regression")
+    parser.add_argument("--error-tolerance", type=float, default=0.01, help="Allowed error-rate increase")
+    parser.add_argument("--spawn", action="store_true", help="Start fake_groq_server.py and the app first")
+    parser.add_argument("--fake-port", type=int, default=8765)
+    parser.add_argument("--fake-args", default="--latency-ms 800 --latency-jitter-ms 400 --tokens-per-second 250",
+                        help="Extra arguments for fake_groq_server.py")
+    parser.add_argument("--app-port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers when spawning")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker when spawning")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the spawned app (repeatable)")
+    parser.add_argument("--app-log", action="store_true", help="Keep the spawned app's output in load_benchmark_app.log")
+    args = parser.parse_args(argv)
+
+    processes = []
+    base_url = args.base_url.rstrip("/")
+    try:
+        if args.spawn:
+            base_url, processes = spawn_servers(args)
+
+        endpoints = build_endpoints(fresh=not args.allow_cache)
+        if args.endpoints:
+            wanted = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+            unknown = [name for name in wanted if name not in endpoints]
+            if unknown:
+                parser.error(f"Unknown endpoints: {unknown}. Available: {list(endpoints)}")
+            endpoints = {name: endpoints[name] for name in wanted}
+
+        print("=" * 80)
+        print(f"🚀 Benchmarking {base_url}: {len(endpoints)} endpoints, "
+              f"{args.requests} requests each at concurrency {args.concurrency}")
+        print("=" * 80)
+        results = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(),
+                "base_url": base_url,
+                "concurrency": args.concurrency,
+                "requests": args.requests,
+                "fresh": not args.allow_cache,
+                "spawned": args.spawn,
+                "fake_args": args.fake_args if args.spawn else None,
+                "git_commit": git_commit(),
+            },
+            "endpoints": {},
+        }
+        for name, (method, path, make_kwargs) in endpoints.items():
+            if args.warmup:
+                run_endpoint(base_url, method, path, make_kwargs, args.warmup, min(args.warmup, args.concurrency),
+                             args.timeout)
+            summary = run_endpoint(base_url, method, path, make_kwargs, args.requests, args.concurrency, args.timeout)
+            results["endpoints"][name] = summary
+            latency = summary["latency_ms"]
+            if latency is None:
+                print(f"⚠️  {name:<24} no requests sent")
+                continue
+            print(f"{'✅' if not summary['errors'] else '⚠️ '} {name:<24} p50 {latency['p50']:>8.0f}ms  "
+                  f"p95 {latency['p95']:>8.0f}ms  p99 {latency['p99']:>8.0f}ms  "
+                  f"{summary['throughput_rps']:>7.2f} req/s  errors {summary['error_rate']:.1%} {summary['status_codes']}")
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📄 Results written to {args.output}")
+
+        if args.baseline:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.tolerance, args.error_tolerance)
+            if regressions:
+                print("\n❌ Regressions against baseline:")
+                for regression in regressions:
+                    print(f"   • {regression}")
+                return 1
+            print("\n✅ No regressions against baseline")
+        return 0
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+if __name__ == "__main__":
+    sys.exit(main())
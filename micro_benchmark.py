@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for hot helpers in app.py (no server or Groq key needed)
+
+Each benchmark checks that the optimized path gives the same output as the
+reference one, then reports the best time per call over several repeats:
+
+    python micro_benchmark.py                      # every benchmark
+    python micro_benchmark.py cleaning --repeat 7  # just one
+    python micro_benchmark.py --output micro.json  # also save the numbers
+    python micro_benchmark.py json --payload test.json  # time a recorded /generate-test response too
+    python micro_benchmark.py pdf                  # practice PDF render time per document
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import re
+import sys
+import time
+from unittest import mock
+
+import app
+import pdf_render
+from fake_groq_server import sectional_output
+from test_cleaning import remove_formatting_artifacts_by_pass
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """Register a benchmark function under name"""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def best_time(fn, repeat, min_seconds=0.2):
+    """Best seconds per call of fn over repeat timing runs of at least min_seconds each"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds / 10:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+def report(name, rows):
+    """Print rows of (case, {label: seconds}) with the speedup of the last label over the first"""
+    print(f"\n{name}")
+    for case, timings in rows:
+        labels = list(timings)
+        cells = "  ".join(f"{label}={timings[label] * 1000:.3f}ms" for label in labels)
+        speedup = timings[labels[0]] / timings[labels[-1]] if timings[labels[-1]] else float('inf')
+        print(f"  {case:<36} {cells}  ({speedup:.1f}x)")
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+
+def with_artifacts(text):
+    """Sectional output dressed up with the markdown and tags the model tends to add"""
+    return (
+        "## Passage  <lend_header_idl>\n\n\n"
+        + text.replace("Question ", "**Question ").replace("\nAnswer:", "**\n\n\n\nAnswer:")
+        .replace("Explanation:", "### Explanation:  \\ ").replace(". ", ".  ")
+    )
+
+@benchmark('cleaning')
+def bench_cleaning(args):
+    """clean_formatting_artifacts: the seven regex passes against the fused deletion scan"""
+    rows = []
+    for passages in (1, 4, 16):
+        text = "\n\n".join(with_artifacts(sectional_output(seq)) for seq in range(passages))
+        expected = remove_formatting_artifacts_by_pass(text).strip()
+        assert app.clean_formatting_artifacts(text) == expected
+
+        def incremental():
+            cleaner = app.IncrementalCleaner()
+            # Roughly the size of a streamed Groq delta
+            parts = [cleaner.feed(text[i:i + 16]) for i in range(0, len(text), 16)]
+            parts.append(cleaner.flush())
+            return "".join(parts)
+
+        assert incremental() == expected
+        case = f"{passages} passage(s), {len(text) // 1024}KB"
+        rows.append((case, {
+            'passes': best_time(lambda: remove_formatting_artifacts_by_pass(text).strip(), args.repeat),
+            'fused': best_time(lambda: app.clean_formatting_artifacts(text), args.repeat),
+        }))
+        # The same stream with every released piece cleaned pass by pass
+        with mock.patch.object(app, 'remove_formatting_artifacts', remove_formatting_artifacts_by_pass):
+            assert incremental() == expected
+            by_pass = best_time(incremental, args.repeat)
+        rows.append((f"{case}, 16B deltas", {
+            'passes': by_pass,
+            'fused': best_time(incremental, args.repeat),
+        }))
+    report("clean_formatting_artifacts", rows)
+    return rows
+
+def generate_test_payloads(args):
+    """/generate-test bodies built from the fake server's sectional outputs, plus any --payload files"""
+    payloads = []
+    with mock.patch.object(app, 'take_sections', lambda topic, count, fresh=False, priority=None: [
+            app.make_section(app.clean_formatting_artifacts(sectional_output(seq))) for seq in range(count)]):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for count in (1, 5):
+                for compact in (False, True):
+                    # As the route returns it, with Question and AnswerKeyEntry objects in it
+                    body = app.build_sectional_test({'topic': 'general-legal', 'count': count, 'compact': compact})
+                    payloads.append((f"{count} passage(s){', compact' if compact else ''}", body))
+    for path in args.payload or ():
+        with open(path, 'rb') as f:
+            payloads.append((path, json.loads(f.read())))
+    return payloads
+
+@benchmark('json')
+def bench_json(args):
+    """JSON responses and request bodies: Flask's stdlib provider against orjson"""
+    if not app.orjson:
+        print("\njson: orjson is not installed, skipping")
+        return []
+    providers = {'stdlib': app.ModelJSONProvider(app.app), 'orjson': app.OrjsonJSONProvider(app.app)}
+    rows = []
+    for case, body in generate_test_payloads(args):
+        encoded = {name: provider.response(body).get_data() for name, provider in providers.items()}
+        assert json.loads(encoded['stdlib']) == json.loads(encoded['orjson'])
+        size = len(encoded['stdlib']) // 1024
+        rows.append((f"{case}, {size}KB, encode", {
+            name: best_time(lambda: provider.response(body), args.repeat) for name, provider in providers.items()
+        }))
+        rows.append((f"{case}, {size}KB, decode", {
+            name: best_time(lambda: provider.loads(encoded['stdlib']), args.repeat)
+            for name, provider in providers.items()
+        }))
+    report("JSON provider", rows)
+    return rows
+
+@benchmark('pdf')
+def bench_pdf(args):
+    """create_pdf: font metrics parsed and widths written per document against the cached font"""
+    rows = []
+    for count in (1, 5):
+        # With the rupee signs and typographic dashes and quotes the model writes
+        contents = [
+            app.clean_formatting_artifacts(sectional_output(seq))
+            .replace("\n\n", "\n\nA fine of ₹5,000 – “at most” – applies.\n", 1)
+            for seq in range(count)
+        ]
+
+        def per_document():
+            # As add_font did it: fresh metrics and FPDF's own widths table for every PDF
+            pdf_render._pdf_font = None
+            with mock.patch.object(pdf_render.UnicodePDF, '_putTTfontwidths', pdf_render.FPDF._putTTfontwidths), \
+                    mock.patch.object(pdf_render.UnicodePDF, '_putfonts', pdf_render.FPDF._putfonts):
+                return pdf_render.create_pdf(contents, "Legal Reasoning Practice Set").getvalue()
+
+        def cached():
+            return pdf_render.create_pdf(contents, "Legal Reasoning Practice Set").getvalue()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            # Identical apart from the creation timestamp
+            strip_date = lambda pdf: re.sub(rb'/CreationDate \(D:\d+\)', b'', pdf)
+            assert strip_date(per_document()) == strip_date(cached())
+            rows.append((f"{count} passage(s), {len(cached()) // 1024}KB", {
+                'per-document': best_time(per_document, args.repeat),
+                'cached': best_time(cached, args.repeat),
+            }))
+    report("create_pdf", rows)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", metavar="benchmark",
+                        help=f"Benchmarks to run: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing runs per case; the best is reported")
+    parser.add_argument("--output", help="Write the timings to this JSON file")
+    parser.add_argument("--payload", action="append", help="A recorded /generate-test response for the json benchmark")
+    args = parser.parse_args(argv)
+    unknown = sorted(set(args.names) - set(BENCHMARKS))
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results = {}
+    for name in args.names or sorted(BENCHMARKS):
+        results[name] = {case: timings for case, timings in BENCHMARKS[name](args)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,414 @@
+"""
+PDF rendering for app.py: practice sets with FPDF and answer keys with PyMuPDF
+
+app.py's render pool processes import only this module and the question model,
+not the whole app, so starting or recycling one stays cheap.
+"""
+
+import os
+import re
+import signal
+import threading
+import traceback
+from io import BytesIO
+
+from fpdf import FPDF
+from fpdf.fpdf import FPDF_VERSION
+from fpdf.ttfonts import TTFontFile
+
+from question_model import AnswerKeyEntry, Question
+
+try:
+    import fitz  # PyMuPDF, for answer keys
+except ImportError:
+    fitz = None
+
+WATERMARK_PATH = os.path.join("images", "CLAT COMMUNITY ILLUSTRATED LOGO .png")
+WATERMARK_OPACITY = 0.2
+ANSWER_KEY_PAGE_SIZE = (612, 792)
+
+_watermark_template = None
+_watermark_lock = threading.Lock()
+
+def get_watermark_template():
+    """Return (pdf bytes, image xref, rect) for a one-page PDF holding the answer key watermark.
+
+    The logo is decoded, faded and compressed once per process. Each answer key
+    starts from this page and references the same image on its later pages,
+    so the image is embedded once per document however many pages it has.
+    """
+    global _watermark_template
+    if _watermark_template is None:
+        with _watermark_lock:
+            if _watermark_template is None:
+                logo = fitz.Pixmap(WATERMARK_PATH)
+                if not logo.alpha:
+                    logo = fitz.Pixmap(logo, 1)
+                # Images have no opacity of their own in PDF, so scale the alpha channel instead
+                fade = bytes(round(i * WATERMARK_OPACITY) for i in range(256))
+                logo.set_alpha(bytes(logo.samples_mv[logo.n - 1::logo.n]).translate(fade))
+
+                # Scale to 60% of the page width, keep aspect ratio, and center
+                page_width, page_height = ANSWER_KEY_PAGE_SIZE
+                scale = page_width * 0.6 / logo.width
+                logo_width = int(logo.width * scale)
+                logo_height = int(logo.height * scale)
+                logo_x = (page_width - logo_width) // 2
+                logo_y = (page_height - logo_height) // 2
+                rect = fitz.Rect(logo_x, logo_y, logo_x + logo_width, logo_y + logo_height)
+
+                template = fitz.open()
+                xref = template.new_page(width=page_width, height=page_height).insert_image(
+                    rect, pixmap=logo, overlay=False)
+                _watermark_template = (template.tobytes(deflate=True, no_new_id=True), xref, rect)
+                template.close()
+    return _watermark_template
+
+def create_answer_key_pdf(questions, answer_key, test_metadata):
+    """Create answer key PDF with watermark image and professional formatting using PyMuPDF only.
+
+    questions and answer_key are Question and AnswerKeyEntry lists.
+    """
+    try:
+        if fitz is None:
+            raise RuntimeError("PyMuPDF is required for watermark-based PDF generation.")
+
+        # PDF page size (A4: 612x792 points)
+        page_width, page_height = ANSWER_KEY_PAGE_SIZE
+
+        # Start from the watermarked first page; later pages reference its image
+        template, logo_xref, logo_rect = get_watermark_template()
+        result_pdf = fitz.open("pdf", template)
+        page = result_pdf[0]
+
+        def new_page():
+            """Add a page with the watermark behind its content"""
+            page = result_pdf.new_page(width=page_width, height=page_height)
+            page.insert_image(logo_rect, xref=logo_xref, overlay=False)
+            return page
+
+        # --- Layout constants ---
+        # Text boxes are taller than the rows they sit in: insert_textbox silently
+        # drops any text whose line height (about 1.7x the font size) overflows the box
+        margin_x = 50
+        y = 60
+        line_height = 18
+        font = "helv"
+        font_bold = "helv"
+        font_size_title = 28
+        font_size_header = 16
+        font_size_table = 13
+        font_size_normal = 12
+        color_black = (0, 0, 0)
+
+        # Title
+        page.insert_textbox(
+            fitz.Rect(margin_x, y, page_width - margin_x, y + 50),
+            "Answer Key",
+            fontname=font_bold,
+            fontsize=font_size_title,
+            align=1,  # center
+            color=color_black
+        )
+        y += 45
+
+        # Answer Key Summary Header
+        page.insert_textbox(
+            fitz.Rect(margin_x, y, page_width - margin_x, y + 2*line_height),
+            "Answer Key Summary:",
+            fontname=font_bold,
+            fontsize=font_size_header,
+            color=color_black
+        )
+        y += line_height + 5
+
+        # Table headers
+        col1_x = margin_x
+        col2_x = margin_x + 70
+        col3_x = margin_x + 130
+        col1_w = 60
+        col2_w = 50
+        col3_w = page_width - margin_x - col3_x  # fill remaining width
+        table_y = y
+        page.insert_textbox(
+            fitz.Rect(col1_x, table_y, col1_x + col1_w, table_y + 2*line_height),
+            "Question", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
+        )
+        page.insert_textbox(
+            fitz.Rect(col2_x, table_y, col2_x + col2_w, table_y + 2*line_height),
+            "Answer", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
+        )
+        page.insert_textbox(
+            fitz.Rect(col3_x, table_y, col3_x + col3_w, table_y + 2*line_height),
+            "Correct Option", fontsize=font_size_table, fontname=font_bold, color=color_black, align=1
+        )
+        y += line_height
+
+        # Leave room for the footer on the last page
+        content_bottom = page_height - 50
+
+        def write_block(text, x, fontname):
+            """Write wrapped text from y down, on a new page if it does not fit, and return the y below it"""
+            nonlocal page, y
+            for _ in range(2):
+                if y < content_bottom:
+                    rect = fitz.Rect(x, y, page_width - margin_x, content_bottom)
+                    # insert_textbox returns the unused height, or a negative number and writes nothing
+                    spare = page.insert_textbox(rect, text, fontname=fontname, fontsize=font_size_normal, color=color_black)
+                    if spare >= 0:
+                        return rect.y1 - spare
+                page = new_page()
+                y = 60
+            print(f"[WARN] Answer key text too long for one page: {text[:60]}...")
+            return y
+
+        # Table content
+        for i,answer in enumerate(answer_key, 1):
+            if y + 2*line_height > content_bottom:
+                page = new_page()
+                y = 60
+            question_num = answer.question
+            answer_letter = answer.answer
+            answer_index = answer.answer_index
+            correct_option = "N/A"
+            if i <= len(questions):
+                question = questions[i-1]
+                if answer_index < len(question.options):
+                    correct_option = question.options[answer_index]
+            # Insert each cell as a textbox to wrap text
+            page.insert_textbox(
+                fitz.Rect(col1_x, y, col1_x + col1_w, y + 2*line_height),
+                f"Q{question_num}", fontsize=font_size_table, fontname=font, color=color_black, align=1
+            )
+            page.insert_textbox(
+                fitz.Rect(col2_x, y, col2_x + col2_w, y + 2*line_height),
+                answer_letter, fontsize=font_size_table, fontname=font, color=color_black, align=1
+            )
+            # Correct Option: wrap and allow up to 2 lines
+            bbox = fitz.Rect(col3_x, y, col3_x + col3_w, y + 2*line_height)
+            page.insert_textbox(
+                bbox,
+                correct_option,
+                fontsize=font_size_table,
+                fontname=font,
+                color=color_black,
+                align=0
+            )
+            y += 2*line_height  # allow for wrapping
+
+        y += 15
+
+        # Detailed Explanations Header
+        page.insert_textbox(
+            fitz.Rect(margin_x, y, page_width - margin_x, y + 2*line_height),
+            "Detailed Explanations:",
+            fontname=font_bold,
+            fontsize=font_size_header,
+            color=color_black
+        )
+        y += line_height + 5
+
+        # Explanations
+        for i, question in enumerate(questions, 1):
+            if y > page_height - 120:
+                # Add new page with watermark
+                page = new_page()
+                y = 60
+            # Question number
+            page.insert_text((margin_x, y), f"Question {i}:", fontsize=font_size_table, fontname=font_bold, color=color_black)
+            y += line_height - 4
+            # Question text
+            question_text = question.question
+            y = write_block(f"Q: {question_text}", margin_x, font) + 2
+            # Options
+            for j, option in enumerate(question.options):
+                option_letter = chr(65 + j)
+                is_correct = j == question.correct
+                option_text = f"{option_letter}. {option}"
+                font_used = font_bold if is_correct else font
+                y = write_block(option_text, margin_x + 10, font_used) + 1
+            # Correct answer
+            correct_letter = question.letter
+            y = write_block(f"Correct Answer: {correct_letter}", margin_x, font_bold) + 2
+            # Explanation
+            explanation = question.explanation
+            y = write_block(f"Explanation: {explanation}", margin_x, font) + 8
+        # Footer
+        page.insert_textbox(
+            fitz.Rect(margin_x, page_height - 45, page_width - margin_x, page_height - 5),
+            'Generated by CLAT.GPT.1 - For more material visit: https://discord.gg/63WcH73DH2\nContact: 7702832727 | Telegram: https://t.me/CLAT_Community',
+            fontname=font,
+            fontsize=9,
+            color=(0.3, 0.3, 0.3),
+            align=1
+        )
+        # Without a random file ID the same answer key always renders to the same bytes
+        output_bytes = result_pdf.write(no_new_id=True)
+        result_pdf.close()
+        return BytesIO(output_bytes)
+    except Exception as e:
+        print(f"[ERROR in create_answer_key_pdf]: {e}")
+        traceback.print_exc()
+        return None
+
+PDF_FONT_PATH = "DejaVuSans.ttf"
+
+_pdf_font = None
+_pdf_font_lock = threading.Lock()
+
+def get_pdf_font():
+    """Return the DejaVu metrics FPDF needs to embed the font, parsed once per process.
+
+    FPDF's add_font loads them again for every document and writes .pkl caches
+    next to the font, so practice PDFs register this copy instead. None when
+    the font file is missing.
+    """
+    global _pdf_font
+    if _pdf_font is None:
+        with _pdf_font_lock:
+            if _pdf_font is None:
+                if not os.path.exists(PDF_FONT_PATH):
+                    print(f"⚠️ {PDF_FONT_PATH} not found, practice PDFs fall back to Latin-1 Arial")
+                    _pdf_font = False
+                else:
+                    ttf = TTFontFile()
+                    ttf.getMetrics(PDF_FONT_PATH)
+                    _pdf_font = {
+                        'name': re.sub('[ ()]', '', ttf.fullName),
+                        'desc': {
+                            'Ascent': int(round(ttf.ascent)),
+                            'Descent': int(round(ttf.descent)),
+                            'CapHeight': int(round(ttf.capHeight)),
+                            'Flags': ttf.flags,
+                            'FontBBox': "[%s %s %s %s]" % tuple(int(round(b)) for b in ttf.bbox),
+                            'ItalicAngle': int(ttf.italicAngle),
+                            'StemV': int(round(ttf.stemV)),
+                            'MissingWidth': int(round(ttf.defaultWidth)),
+                        },
+                        'up': round(ttf.underlinePosition),
+                        'ut': round(ttf.underlineThickness),
+                        'cw': ttf.charWidths,
+                        'ttffile': PDF_FONT_PATH,
+                        'originalsize': os.stat(PDF_FONT_PATH).st_size,
+                    }
+    return _pdf_font or None
+
+# Fixed so a practice PDF's bytes, and its ETag, depend only on its content
+PDF_CREATION_DATE = 'D:20240101000000'
+
+class UnicodePDF(FPDF):
+    """FPDF that embeds the shared DejaVu metrics as its Unicode font"""
+
+    def add_unicode_font(self, family="DejaVu"):
+        """Register the cached DejaVu font under family; False if it is unavailable"""
+        font = get_pdf_font()
+        if not font:
+            return False
+        fontkey = family.lower()
+        self.fonts[fontkey] = {
+            'i': len(self.fonts) + 1, 'type': 'TTF',
+            'name': font['name'], 'desc': font['desc'],
+            'up': font['up'], 'ut': font['ut'],
+            # Read-only, so every document shares the one list
+            'cw': font['cw'],
+            'ttffile': font['ttffile'], 'fontkey': fontkey,
+            # Each document records the characters it uses and embeds only those
+            'subset': list(range(0, 32)), 'unifilename': None,
+        }
+        self.font_files[fontkey] = {'length1': font['originalsize'], 'type': "TTF", 'ttffile': font['ttffile']}
+        return True
+
+    def _putfonts(self):
+        # cell() appends every character it writes, so subsets hold thousands of repeats
+        for font in self.fonts.values():
+            if font['type'] == 'TTF':
+                font['subset'] = sorted(set(font['subset']))
+        super()._putfonts()
+
+    def _putinfo(self):
+        # FPDF stamps the time of the render as the CreationDate, so the same
+        # practice test rendered twice came out as different bytes
+        self._out('/Producer ' + self._textstring('PyFPDF ' + FPDF_VERSION + ' http://pyfpdf.googlecode.com/'))
+        for key in ('title', 'subject', 'author', 'keywords', 'creator'):
+            if hasattr(self, key):
+                self._out(f"/{key.capitalize()} " + self._textstring(getattr(self, key)))
+        self._out('/CreationDate ' + self._textstring(PDF_CREATION_DATE))
+
+    def _putTTfontwidths(self, font, maxUni):
+        # FPDF looks every code point up to the highest one used in the subset
+        # list; with a ₹ in the text that alone took ~0.6s per document
+        super()._putTTfontwidths(dict(font, subset=set(font['subset'])), maxUni)
+
+def create_pdf(contents, title):
+    """Create PDF from content with improved formatting"""
+    pdf = UnicodePDF()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    unicode_font = pdf.add_unicode_font()
+    
+    # Title (topic names have dashes in them, so use the Unicode font when there is one)
+    if unicode_font:
+        pdf.set_font("DejaVu", '', 16)
+    else:
+        pdf.set_font("Arial", 'B', 16)
+        title = title.encode('latin1', 'replace').decode('latin1')
+    pdf.cell(0, 15, title, ln=True, align='C')
+    pdf.ln(10)
+    
+    # Content keeps the ₹ signs, dashes and quotes the model writes
+    pdf.set_font("DejaVu" if unicode_font else "Arial", '', 12)
+    for section in contents:
+        if not unicode_font:
+            section = section.encode('latin1', 'replace').decode('latin1')
+        pdf.multi_cell(0, 10, section)
+        pdf.ln(5)
+    
+    # Add footer
+    pdf.set_y(-30)
+    pdf.set_font("Arial", '', 8)
+    pdf.set_text_color(107, 114, 128)
+    pdf.cell(0, 5, 'Generated by CLAT.GPT.1 - For more material visit: https://discord.gg/63WcH73DH2', ln=True, align='C')
+    pdf.cell(0, 5, 'Contact: 7702832727 | Telegram: https://t.me/CLAT_Community', ln=True, align='C')
+    
+    # FPDF 1.7 returns the document as a Latin-1 str
+    return BytesIO(pdf.output(dest='S').encode('latin1'))
+
+def render_pdf_job(kind, content):
+    """Render a PDF from the JSON-ready content the render cache is keyed on and return its bytes.
+
+    Runs in a render pool process, so it only takes plain data and rebuilds
+    the question model itself.
+    """
+    if kind == 'answer-key':
+        questions = [Question.from_dict(q) for q in content['questions']]
+        answer_key = [AnswerKeyEntry.from_dict(a) for a in content['answer_key']]
+        pdf_buffer = create_answer_key_pdf(questions, answer_key, content['test_metadata'])
+    else:
+        pdf_buffer = create_pdf(content['contents'], content['title'])
+    return pdf_buffer.getvalue() if pdf_buffer else None
+
+class RenderTimeout(BaseException):
+    """A render ran past its time limit.
+
+    A BaseException, so the renderers' own `except Exception` handlers let it through.
+    """
+
+def _render_timed_out(signum, frame):
+    raise RenderTimeout()
+
+def run_render_job(kind, content, timeout):
+    """render_pdf_job for a render pool process, stopped with RenderTimeout after timeout seconds.
+
+    The render stops itself, so its process goes back to the pool and renders
+    running in the other processes are not affected. Without SIGALRM
+    (Windows) the caller's wait is the only limit.
+    """
+    if not hasattr(signal, 'setitimer'):
+        return render_pdf_job(kind, content)
+    previous = signal.signal(signal.SIGALRM, _render_timed_out)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return render_pdf_job(kind, content)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
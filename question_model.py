@@ -0,0 +1,113 @@
+"""
+The question model shared by app.py's endpoints and its PDF render processes
+"""
+
+class Question:
+    """A parsed MCQ. The questions of a passage all refer to the same passage string."""
+
+    __slots__ = ('id', 'passage', 'question', 'options', 'correct', 'explanation')
+
+    def __init__(self, id, passage, question, options, correct, explanation):
+        self.id = id
+        self.passage = passage
+        self.question = question
+        self.options = options
+        self.correct = correct
+        self.explanation = explanation
+
+    @classmethod
+    def from_dict(cls, data, id=None):
+        """A question posted back by a client, with defaults for missing fields"""
+        return cls(
+            data.get('id', id),
+            data.get('passage', ''),
+            data.get('question', 'Question text not available'),
+            data.get('options', []),
+            data.get('correct', 0),
+            data.get('explanation', 'No explanation available.')
+        )
+
+    @property
+    def letter(self):
+        return chr(65 + self.correct)
+
+    def to_dict(self, **changes):
+        """The JSON shape of a question, with changes applied on top"""
+        data = {
+            "id": self.id,
+            "passage": self.passage,
+            "question": self.question,
+            "options": self.options,
+            "correct": self.correct,
+            "explanation": self.explanation
+        }
+        if changes:
+            data.update(changes)
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, Question):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Question(id={self.id!r}, question={self.question[:40]!r}, correct={self.correct!r})"
+
+class AnswerKeyEntry:
+    """The answer to one numbered question of a test"""
+
+    __slots__ = ('question', 'answer', 'answer_index')
+
+    def __init__(self, question, answer, answer_index):
+        self.question = question
+        self.answer = answer
+        self.answer_index = answer_index
+
+    @classmethod
+    def for_question(cls, number, question):
+        return cls(number, question.letter, question.correct)
+
+    @classmethod
+    def from_dict(cls, data, number=None):
+        """An answer key entry posted back by a client, with defaults for missing fields"""
+        return cls(data.get('question', number), data.get('answer', 'N/A'), data.get('answer_index', 0))
+
+    def to_dict(self):
+        return {"question": self.question, "answer": self.answer, "answer_index": self.answer_index}
+
+    def __eq__(self, other):
+        if not isinstance(other, AnswerKeyEntry):
+            return NotImplemented
+        return (self.question, self.answer, self.answer_index) == (other.question, other.answer, other.answer_index)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"AnswerKeyEntry({self.question!r}, {self.answer!r}, {self.answer_index!r})"
+
+class Passage:
+    """A generated sectional passage: the cleaned model output and the questions parsed from it.
+
+    This is what the question bank holds and what tests and PDFs are built
+    from, so a passage is parsed once and its questions are never copied.
+    """
+
+    __slots__ = ('raw', 'questions', 'structured')
+
+    def __init__(self, raw, questions, structured=False):
+        self.raw = raw
+        self.questions = questions
+        self.structured = structured
+
+    @property
+    def text(self):
+        """The passage the questions are about (empty if none were parsed)"""
+        return self.questions[0].passage if self.questions else ""
+
+    def to_dict(self):
+        return {"passage": self.text, "questions": self.questions}
+
+    def __repr__(self):
+        return f"Passage({len(self.raw)} chars, {len(self.questions)} questions)"
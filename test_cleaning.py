@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Tests for clean_formatting_artifacts and IncrementalCleaner in app.py
+"""
+
+import random
+import re
+
+import app
+
+FRAGMENTS = [
+    "<", ">", "<b>", "</i>", "<x\ny>", "\\", "\\n", "\\t", "\\'", '\\"', "\\\\", "#", "##", "*", "**", "***",
+    "(", "(A)", "**MCQs**", "**ANSWER KEY**", " ", "  ", "\n", "\n\n", "\n \n", "\t", "\r\n", "\xa0", "\f",
+    "a", "word", "n", "t", "r", "'", '"',
+]
+
+def remove_formatting_artifacts_by_pass(text):
+    """Apply the artifact-cleaning passes one after another without trimming the result.
+
+    This is the reference definition of the cleaning; app.remove_formatting_artifacts
+    gives the same result with one scan for the deletions.
+    """
+    cleaned = text
+
+    # Remove XML/HTML-like tags such as <lend_header_idl>
+    cleaned = re.sub(r'<[^>]+>', '', cleaned)
+    
+    # Remove backslashes that are not part of valid escape sequences
+    cleaned = re.sub(r'\\(?!n|t|r|\\|"|\')', '', cleaned)
+    
+    # Remove hashtags and markdown symbols that shouldn't be visible
+    cleaned = re.sub(r'#+', '', cleaned)  # Remove hashtags
+    cleaned = re.sub(r'\*\*(?!MCQs|ANSWER KEY)', '', cleaned)  # Remove ** except for MCQs and ANSWER KEY
+    cleaned = re.sub(r'\*(?!\()', '', cleaned)  # Remove * except for option markers like (A)
+    
+    # Remove extra whitespace and normalize line breaks
+    cleaned = re.sub(r'\n\s*\n\s*\n', '\n\n', cleaned)  # Remove excessive line breaks
+    cleaned = re.sub(r' +', ' ', cleaned)  # Remove multiple spaces
+    
+    return cleaned
+
+def random_texts(seed, count):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield rng, "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+def test_clean_formatting_artifacts_examples():
+    clean = app.clean_formatting_artifacts
+    assert clean("## Heading <lend_header_idl>\n\n\n\nBody  text") == "Heading \n\nBody text"
+    assert clean("**MCQs**\n*(A) kept ***(B) kept **(C) dropped") == "MCQs\n*(A) kept *(B) kept (C) dropped"
+    # Stray backslashes go, escapes stay, also once a tag between them is removed
+    assert clean("a\\b \\n \\<i>t") == "ab \\n \\t"
+    assert clean("*#(") == "*("
+    assert clean("") == ""
+    assert clean(None) is None
+
+def test_clean_formatting_artifacts_matches_passes():
+    for _, text in random_texts(14, 20000):
+        expected = remove_formatting_artifacts_by_pass(text).strip() if text else text
+        assert app.clean_formatting_artifacts(text) == expected, repr(text)
+
+def test_incremental_cleaner_matches_whole_text():
+    for rng, text in random_texts(15, 5000):
+        cleaner = app.IncrementalCleaner()
+        parts = []
+        pos = 0
+        while pos < len(text):
+            step = rng.randint(1, 6)
+            parts.append(cleaner.feed(text[pos:pos + step]))
+            pos += step
+        parts.append(cleaner.flush())
+        assert "".join(parts) == app.clean_formatting_artifacts(text), repr(text)
+
+def test_incremental_cleaner_only_holds_back_the_trailing_cluster():
+    cleaner = app.IncrementalCleaner()
+    assert cleaner.feed("The answer is **") == "The answer is"
+    assert cleaner.feed("(B)") == " (B)"
+    assert cleaner.feed(" and <b") == " and"
+    assert cleaner.feed("old>done\n\n\n") == " done"
+    assert cleaner.flush() == ""
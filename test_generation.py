@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Tests for the Groq client, caches and background generation in app.py (no server or Groq key needed)
+"""
+
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+from test_parsers import SAMPLE
+
+def test_sectional_topics_share_one_bank_key():
+    # /generate-test sends subcategories, /download-pdf has sent dashed topic names
+    assert app.sectional_topic('general-legal') == 'Legal Reasoning'
+    assert app.sectional_topic('legal-reasoning') == 'Legal Reasoning'
+    assert app.sectional_topic(' Legal Reasoning ') == 'Legal Reasoning'
+    assert app.sectional_topic('main-idea') == 'English RC – Main Idea'
+    with pytest.raises(app.GenerationError) as e:
+        app.sectional_topic('astrology')
+    assert e.value.status == 400
+
+def make_bank(**kwargs):
+    """A QuestionBank whose producers count as started, so nothing calls Groq"""
+    bank = app.QuestionBank(**{'min_depth': 0, 'max_depth': 5, 'workers': 1, 'refill_seconds': 90,
+                               'rate_window': 1800, 'max_total': 10, **kwargs})
+    bank._started_pid = os.getpid()
+    return bank
+
+def test_take_sections_serves_banked_passages_first(monkeypatch):
+    bank = make_bank()
+    banked = app.make_section(SAMPLE)
+    bank._pools['Legal Reasoning'] = deque([banked])
+    monkeypatch.setattr(app, 'question_bank', bank)
+    monkeypatch.setattr(app, 'QUESTION_BANK_ENABLED', True)
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+    generated = []
+
+    def generate(topic, count, fresh=False, priority=None):
+        generated.append((topic, count, fresh))
+        return [app.make_section(SAMPLE) for _ in range(count)]
+
+    monkeypatch.setattr(app, 'generate_study_material', generate)
+    sections = app.take_sections('Legal Reasoning', 3)
+    assert len(sections) == 3 and sections[0] is banked
+    assert generated == [('Legal Reasoning', 2, False)]
+    assert bank.counters['hits'] == 1 and bank.counters['misses'] == 2
+
+    # fresh requests skip the bank entirely
+    bank._pools['Legal Reasoning'].append(banked)
+    assert banked not in app.take_sections('Legal Reasoning', 1, fresh=True)
+    assert generated[-1] == ('Legal Reasoning', 1, True)
+
+def test_take_sections_falls_back_to_the_bank_when_groq_is_unavailable(monkeypatch):
+    bank = make_bank()
+    banked = app.make_section(SAMPLE)
+    bank._pools['Legal Reasoning'] = deque([banked])
+    monkeypatch.setattr(app, 'question_bank', bank)
+    monkeypatch.setattr(app, 'QUESTION_BANK_ENABLED', True)
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+
+    def unavailable(topic, count, fresh=False, priority=None):
+        raise app.GroqUnavailable('Groq circuit is open', retry_after=30)
+
+    monkeypatch.setattr(app, 'generate_study_material', unavailable)
+    assert app.take_sections('Legal Reasoning', 2, fresh=True) == [banked]
+    with pytest.raises(app.GroqUnavailable):
+        app.take_sections('Legal Reasoning', 1, fresh=True)
+
+def fake_sectional_groq(monkeypatch, reply, per_request=3):
+    """Route generate_study_material's Groq calls to reply(index) on a private executor"""
+    executor = ThreadPoolExecutor(max_workers=8)
+    monkeypatch.setattr(app, 'get_generation_executor', lambda: executor)
+    monkeypatch.setattr(app, 'GENERATION_PER_REQUEST', per_request)
+    monkeypatch.setattr(app, 'STRUCTURED_OUTPUT_ENABLED', False)
+    monkeypatch.setattr(app, 'call_groq_api', lambda messages, variant=None, **kwargs: reply(variant))
+    return executor
+
+def passage(index):
+    return SAMPLE.replace("basic structure", f"passage {index}")
+
+def test_study_material_keeps_request_order_and_drops_failed_passages(monkeypatch):
+    def reply(index):
+        # Later passages finish first
+        time.sleep(0.02 * (4 - index))
+        if index == 1:
+            return None
+        if index == 2:
+            raise RuntimeError('unexpected reply')
+        return passage(index)
+
+    fake_sectional_groq(monkeypatch, reply, per_request=4)
+    sections = app.generate_study_material('Legal Reasoning', 4)
+    assert [[n for n in range(4) if f"passage {n}" in s.text] for s in sections] == [[0], [3]]
+
+def test_study_material_fails_only_when_no_passage_had_capacity(monkeypatch):
+    def reply(index):
+        if index:
+            raise app.GroqUnavailable('busy', retry_after=5)
+        return passage(index)
+
+    fake_sectional_groq(monkeypatch, reply)
+    assert len(app.generate_study_material('Legal Reasoning', 3)) == 1
+
+    def unavailable(index):
+        raise app.GroqUnavailable('busy', retry_after=5)
+
+    fake_sectional_groq(monkeypatch, unavailable)
+    with pytest.raises(app.GroqUnavailable):
+        app.generate_study_material('Legal Reasoning', 3)
+
+def test_study_material_caps_its_concurrent_passages(monkeypatch):
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def reply(index):
+        with lock:
+            running.append(index)
+            peak.append(len(running))
+        time.sleep(0.03)
+        with lock:
+            running.remove(index)
+        return passage(index)
+
+    fake_sectional_groq(monkeypatch, reply, per_request=2)
+    assert len(app.generate_study_material('Legal Reasoning', 5)) == 5
+    assert max(peak) == 2
+
+def test_bank_depth_follows_the_demand_rate_and_a_global_cap():
+    bank = make_bank()
+    now = time.time()
+    # One request for five passages is not a rate worth banking five for
+    bank._demand['Legal Reasoning'] = deque([(now, 5)])
+    assert bank._target_depth('Legal Reasoning', now) == 1
+    bank._demand['Legal Reasoning'].extend((now, 5) for _ in range(99))
+    assert bank._target_depth('Legal Reasoning', now) == 5
+    assert bank._next_topic() == 'Legal Reasoning'
+
+    # Old demand ages out of the rate window
+    assert bank._target_depth('Legal Reasoning', now + 1801) == 0
+
+    bank._pools['Percentages'] = deque([app.make_section(SAMPLE)] * 6)
+    bank._in_flight['Arithmetic'] = 4
+    assert bank._next_topic() is None
+
+def test_scheduler_reserves_and_settles_tokens():
+    scheduler = app.GroqScheduler(rpm=60, tpm=600, max_wait=0.05)
+    assert scheduler.acquire('standard', 100) == 100
+    assert scheduler._tokens == pytest.approx(500, abs=1)
+    scheduler.settle(100, 40)
+    assert scheduler._tokens == pytest.approx(560, abs=1)
+    # Unknown usage keeps the whole reservation
+    scheduler.settle(100, None)
+    assert scheduler._tokens == pytest.approx(560, abs=1)
+
+def test_scheduler_times_out_when_the_request_bucket_is_empty():
+    scheduler = app.GroqScheduler(rpm=2, tpm=0, max_wait=0.05)
+    scheduler.acquire('standard', 100)
+    scheduler.acquire('standard', 100)
+    with pytest.raises(app.GroqUnavailable) as e:
+        scheduler.acquire('interactive', 100)
+    assert e.value.status == 503 and e.value.retry_after >= 1
+    assert scheduler.counters['admitted'] == 2 and scheduler.counters['queue_timeouts'] == 1
+    assert scheduler._waiting == []
+
+def test_scheduler_admits_its_share_of_the_account_limits():
+    scheduler = app.GroqScheduler(rpm=30, tpm=6000, max_wait=1, shares=3)
+    assert (scheduler.rpm, scheduler.tpm) == (10, 2000)
+
+    class Response:
+        status_code = 200
+        headers = {'x-ratelimit-limit-tokens': '9000', 'x-ratelimit-remaining-tokens': '1500'}
+
+    scheduler.observe(Response())
+    assert scheduler.tpm == 3000 and scheduler._tokens == pytest.approx(500)
+
+def test_scheduler_learns_an_unknown_token_limit_from_the_headers():
+    scheduler = app.GroqScheduler(rpm=0, tpm=0, max_wait=0.05)
+    # Admitted while the limit is unknown, so nothing is reserved
+    reservations = [scheduler.acquire('bulk', 7000) for _ in range(3)]
+    assert reservations == [0, 0, 0]
+
+    class Response:
+        status_code = 200
+        headers = {'x-ratelimit-limit-tokens': '30000', 'x-ratelimit-remaining-tokens': '29000'}
+
+    scheduler.observe(Response())
+    assert scheduler.tpm == 30000 and scheduler._tokens == pytest.approx(29000, abs=5)
+    for reserved in reservations:
+        scheduler.settle(reserved, 7000)
+    assert scheduler._tokens == pytest.approx(29000, abs=5)
+    # The next sectional call is admitted straight away
+    assert scheduler.acquire('standard', 7000) == 7000
+
+class FakeStream:
+    """A streamed Groq response with the given content deltas"""
+
+    def __init__(self, *deltas):
+        self.lines = [b'data: ' + json.dumps({'choices': [{'delta': {'content': d}}]}).encode() for d in deltas]
+        self.lines.append(b'data: [DONE]')
+        self.closed = False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+def test_streams_settle_when_closed_early():
+    completed, closed = [], []
+    stream = FakeStream('Hello', ' world')
+    deltas = app.iter_groq_stream(stream, time.monotonic() + 60, completed.append, closed.append)
+    assert next(deltas) == 'Hello'
+    deltas.close()
+    assert stream.closed and completed == [] and closed == ['Hello']
+
+    stream = FakeStream('Hello', ' world')
+    assert "".join(app.iter_groq_stream(stream, time.monotonic() + 60, completed.append, closed.append)) == 'Hello world'
+    assert completed == ['Hello world'] and closed[-1] == 'Hello world'
+
+def test_stream_reservations_are_settled_when_the_request_fails(monkeypatch):
+    scheduler = app.GroqScheduler(rpm=0, tpm=10000, max_wait=1)
+    monkeypatch.setattr(app, 'groq_scheduler', scheduler)
+    monkeypatch.setattr(app, 'groq_resilience', app.GroqResilience(5, 30, 95, 20))
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+
+    class Session:
+        def post(self, *args, **kwargs):
+            raise app.requests.exceptions.ConnectionError('connection refused')
+
+    monkeypatch.setattr(app, 'get_groq_session', lambda: Session())
+    messages = [{'role': 'user', 'content': 'x' * 400}]
+    assert app.open_groq_stream(messages, max_tokens=1000, fresh=True) is None
+    # Only the prompt stays spent, not the 1000-token completion cap
+    assert scheduler._tokens == pytest.approx(10000 - 100, abs=5)
+
+def test_closing_a_practice_stream_cancels_its_passages(monkeypatch):
+    monkeypatch.setattr(app, 'GENERATION_PER_REQUEST', 2)
+    closed = []
+
+    def open_groq_stream(*args, variant=None, **kwargs):
+        def deltas():
+            try:
+                yield SAMPLE
+                while True:
+                    time.sleep(0.01)
+                    yield ' '
+            finally:
+                closed.append(variant)
+        return deltas()
+
+    monkeypatch.setattr(app, 'open_groq_stream', open_groq_stream)
+    events = app.stream_practice('Legal Reasoning', 2, fresh=True)
+    assert next(events).startswith('event: passage')
+    # The client goes away while the first passage is still being relayed
+    events.close()
+    deadline = time.monotonic() + 5
+    while len(closed) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(closed) == [0, 1]
+
+def groq_response(status, body):
+    response = app.requests.Response()
+    response.status_code = status
+    response.raw = io.BytesIO(body)
+    response.url = app.GROQ_API_URL
+    return response
+
+def test_completions_are_parsed_from_the_body_read_under_the_deadline(monkeypatch, capsys):
+    monkeypatch.setattr(app, 'groq_scheduler', app.GroqScheduler(rpm=0, tpm=10000, max_wait=1))
+    monkeypatch.setattr(app, 'groq_resilience', app.GroqResilience(5, 30, 95, 20))
+    responses = [
+        groq_response(200, json.dumps({'choices': [{'message': {'content': 'completion'}}]}).encode()),
+        groq_response(400, b'{"error": {"message": "context too long"}}'),
+    ]
+
+    class Session:
+        def post(self, *args, **kwargs):
+            return responses.pop(0)
+
+    monkeypatch.setattr(app, 'get_groq_session', lambda: Session())
+    payload = {'model': 'm', 'messages': [], 'temperature': 0, 'max_tokens': 10}
+    assert app.retry_groq_completion(payload, 'standard', None) == 'completion'
+    # A rejected request logs Groq's explanation instead of failing to read it
+    assert app.retry_groq_completion(payload, 'standard', None) is None
+    assert 'context too long' in capsys.readouterr().out
+
+def test_single_flight_shares_the_leaders_result():
+    flight = app.SingleFlight(wait_timeout=5)
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return 'completion'
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = [pool.submit(flight.do, 'key', call) for _ in range(3)]
+        while not calls:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        release.set()
+        assert [r.result() for r in results] == ['completion'] * 3
+    assert len(calls) == 1
+    assert flight.stats()['coalesced'] == 2 and flight.stats()['in_flight'] == 0
+
+def test_single_flight_followers_see_the_leaders_error():
+    flight = app.SingleFlight(wait_timeout=5)
+    release = threading.Event()
+
+    def call():
+        release.wait(5)
+        raise app.GroqUnavailable('Groq circuit is open')
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'key', call)
+        while not flight._flights:
+            time.sleep(0.01)
+        follower = pool.submit(flight.do, 'key', lambda: 'not called')
+        time.sleep(0.05)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(app.GroqUnavailable):
+                future.result()
+
+@pytest.mark.skipif(app.fcntl is None, reason="cross-worker coalescing needs fcntl")
+def test_single_flight_picks_up_another_workers_result(tmp_path):
+    flight = app.SingleFlight(wait_timeout=5, lock_dir=str(tmp_path))
+    # Another worker leads: it holds the key's lock file
+    other = open(tmp_path / 'key.lock', 'a')
+    app.fcntl.flock(other, app.fcntl.LOCK_EX | app.fcntl.LOCK_NB)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        result = pool.submit(flight.do, 'key', lambda: 'not called')
+        time.sleep(0.1)
+        flight._write_result(str(tmp_path / 'key.result'), 'completion')
+        other.close()
+        assert result.result() == 'completion'
+    assert flight.counters['coalesced_cross_worker'] == 1 and flight.counters['calls'] == 0
+
+@pytest.mark.skipif(app.fcntl is None, reason="cross-worker coalescing needs fcntl")
+def test_single_flight_prune_keeps_held_locks(tmp_path):
+    flight = app.SingleFlight(wait_timeout=5, lock_dir=str(tmp_path))
+    for name in ('held.lock', 'free.lock', 'old.result'):
+        (tmp_path / name).touch()
+        os.utime(tmp_path / name, (0, 0))
+    with open(tmp_path / 'held.lock', 'a') as held:
+        app.fcntl.flock(held, app.fcntl.LOCK_EX | app.fcntl.LOCK_NB)
+        flight.prune()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['held.lock']
+
+def test_single_flight_waits_out_the_whole_retry_budget():
+    assert app.single_flight.wait_timeout == app.groq_call_budget()
+    assert app.groq_call_budget() > (app.GROQ_MAX_RETRIES + 1) * app.GROQ_TOTAL_TIMEOUT
+
+def test_breaker_opens_probes_and_closes():
+    breaker = app.GroqResilience(threshold=2, cooldown=0.05, hedge_percentile=95, hedge_min_samples=20)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    assert breaker.counters['breaker_opened'] == 1 and breaker.counters['short_circuited'] == 1
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == 'half_open'
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+def test_only_the_probe_call_lets_the_next_probe_through():
+    breaker = app.GroqResilience(threshold=1, cooldown=0, hedge_percentile=95, hedge_min_samples=20)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'half_open'
+    # Another call ending, for example one admitted before the breaker opened,
+    # must not clear this probe
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pool.submit(breaker.finish_probe).result()
+    assert not breaker.allow()
+    breaker.finish_probe()
+    assert breaker.allow()
+
+def test_a_probe_the_scheduler_turns_away_lets_the_next_probe_through(monkeypatch):
+    breaker = app.GroqResilience(threshold=1, cooldown=0, hedge_percentile=95, hedge_min_samples=20)
+    breaker.record_failure()
+    scheduler = app.GroqScheduler(rpm=1, tpm=0, max_wait=0.05)
+    scheduler.acquire('standard', 100)
+    monkeypatch.setattr(app, 'groq_resilience', breaker)
+    monkeypatch.setattr(app, 'groq_scheduler', scheduler)
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+    with pytest.raises(app.GroqUnavailable):
+        app.open_groq_stream([{'role': 'user', 'content': 'hello'}], fresh=True)
+    assert breaker.state == 'half_open' and breaker.allow()
+
+def test_a_retried_call_counts_as_one_breaker_failure(monkeypatch):
+    breaker = app.GroqResilience(threshold=2, cooldown=30, hedge_percentile=95, hedge_min_samples=20)
+    monkeypatch.setattr(app, 'groq_resilience', breaker)
+    monkeypatch.setattr(app, 'GROQ_MAX_RETRIES', 2)
+    monkeypatch.setattr(app, 'retry_delay', lambda attempt, retry_after=None: 0)
+    attempts = []
+
+    def unavailable(payload, priority, service):
+        attempts.append(1)
+        raise app.TransientGroqError('Groq returned HTTP 503', status=503)
+
+    monkeypatch.setattr(app, 'hedged_groq_completion', unavailable)
+    assert app.post_groq_completion({}, 'standard', 'lexa_chatbot') is None
+    assert len(attempts) == 3
+    assert breaker.state == 'closed' and breaker._failures == 1
+    assert breaker.counters['retries'] == 2
+
+def test_retry_delay_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(app, 'GROQ_RETRY_BASE_DELAY', 0.5)
+    monkeypatch.setattr(app, 'GROQ_RETRY_MAX_DELAY', 10)
+    for attempt in range(6):
+        assert 0 <= app.retry_delay(attempt) <= min(10, 0.5 * 2 ** attempt)
+        assert app.retry_delay(attempt, retry_after=7) >= 7
+
+    # Retry-After above the backoff cap is not waited out at all
+    def rate_limited(payload, priority, service):
+        raise app.TransientGroqError('Groq returned HTTP 429', status=429, retry_after=60)
+
+    monkeypatch.setattr(app, 'hedged_groq_completion', rate_limited)
+    monkeypatch.setattr(app, 'groq_resilience', app.GroqResilience(5, 30, 95, 20))
+    started = time.monotonic()
+    with pytest.raises(app.GroqUnavailable) as e:
+        app.post_groq_completion({}, 'standard', 'lexa_chatbot')
+    assert time.monotonic() - started < 1
+    assert e.value.status == 429 and e.value.retry_after >= 60
+
+def test_job_status_fails_jobs_whose_worker_is_gone(tmp_path):
+    jobs = app.JobStore(str(tmp_path), retention_seconds=3600, timeout_seconds=60)
+    job = jobs.create('generate-test', {'topic': 'general-legal'})
+    assert jobs.status(job['id'])['status'] == 'queued'
+
+    # Same PID, but written by an earlier process before a restart
+    jobs.update(job['id'], boot_id='0' * 32)
+    assert jobs.status(job['id'])['status'] == 'failed'
+
+    job = jobs.create('generate-test', {'topic': 'general-legal'})
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    jobs.update(job['id'], status='running', pid=exited.pid)
+    failed = jobs.status(job['id'])
+    assert failed['status'] == 'failed' and failed['error_status'] == 500
+
+def test_job_status_times_out_running_jobs_but_not_queued_ones(tmp_path):
+    jobs = app.JobStore(str(tmp_path), retention_seconds=3600, timeout_seconds=60)
+    queued = jobs.create('download-pdf', {'topic': 'general-legal'})
+    running = jobs.create('download-pdf', {'topic': 'general-legal'})
+    jobs.update(running['id'], status='running')
+    for job_id in (queued['id'], running['id']):
+        job = jobs.load(job_id)
+        job['updated'] -= 120
+        jobs._write(jobs._path(job_id, '.json'), job)
+
+    # A long queue is not a stall: the executor still runs the job later
+    assert jobs.status(queued['id'])['status'] == 'queued'
+    assert jobs.status(running['id'])['status'] == 'failed'
+    assert jobs.status('not-a-job-id') is None
+
+def test_llm_cache_evicts_least_recently_used_entries():
+    entry = len('a') + len('x' * 100)
+    cache = app.LLMResponseCache(max_bytes=3 * entry)
+    for key in 'abc':
+        cache.put(key, 'x' * 100)
+    assert cache.get('a', 60) is not None  # 'a' is now the most recently used
+    cache.put('d', 'x' * 100)
+    assert cache.get('b', 60) is None
+    assert [cache.get(key, 60) is not None for key in 'acd'] == [True] * 3
+    assert cache.stats()['evictions'] == 1 and cache.stats()['bytes'] == 3 * entry
+    # Values bigger than the whole budget are not kept at all
+    cache.put('e', 'x' * 1000)
+    assert cache.get('e', 60) is None and cache.stats()['entries'] == 3
+
+def test_llm_cache_ttl_is_checked_on_read(tmp_path, monkeypatch):
+    cache = app.LLMResponseCache(max_bytes=1024, directory=str(tmp_path))
+    cache.put('k' * 64, 'completion')
+    later = time.time() + 120
+    monkeypatch.setattr(app.time, 'time', lambda: later)
+    assert cache.get('k' * 64, 60) is None
+    assert cache.get('k' * 64, 300) == 'completion'
+    assert cache.get('k' * 64, 60, allow_stale=True) == 'completion'
+
+    # A new worker starts from the disk tier, with the same freshness rule
+    fresh_worker = app.LLMResponseCache(max_bytes=1024, directory=str(tmp_path))
+    assert fresh_worker.get('k' * 64, 60) is None
+    assert fresh_worker.get('k' * 64, 300) == 'completion'
+    assert fresh_worker.stats()['stale'] == 1 and fresh_worker.stats()['disk_hits'] == 1
+
+def test_llm_cache_disk_hits_keep_files_from_being_pruned(tmp_path):
+    cache = app.LLMResponseCache(max_bytes=1024, directory=str(tmp_path))
+    for key in ('a' * 64, 'b' * 64):
+        cache.put(key, 'completion')
+        os.utime(cache.disk.path(key), (0, 0))
+    app.LLMResponseCache(max_bytes=1024, directory=str(tmp_path)).get('a' * 64, 0, allow_stale=True)
+    # Room for one file: the one read most recently stays
+    cache.disk.max_bytes = os.path.getsize(cache.disk.path('a' * 64))
+    cache.disk.prune()
+    assert os.path.exists(cache.disk.path('a' * 64)) and not os.path.exists(cache.disk.path('b' * 64))
+
+def test_chat_replies_stay_off_the_disk_tier(tmp_path, monkeypatch):
+    cache = app.LLMResponseCache(max_bytes=1024, directory=str(tmp_path))
+    monkeypatch.setattr(app, 'llm_cache', cache)
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+    monkeypatch.setattr(app, 'post_groq_completion', lambda payload, priority, service: 'reply')
+    for service in ('lexa_chatbot', 'gk_research'):
+        assert app.call_groq_api([{'role': 'user', 'content': f'hello from {service}'}], service=service) == 'reply'
+    assert cache.stats()['entries'] == 2
+    assert len([name for _, _, names in os.walk(tmp_path) for name in names]) == 1
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Tests for the sectional test parsers in app.py (no server or Groq key needed)
+"""
+
+import json
+import random
+import re
+import time
+
+import app
+
+SAMPLE = """The doctrine of basic structure limits Parliament's amending power.
+
+[Word Count: 650]
+
+Question 1:
+Which case established the doctrine?
+(A) Golaknath
+(B) Kesavananda Bharati
+(C) Minerva Mills
+(D) Shankari Prasad
+Answer: (B)
+Explanation: Kesavananda Bharati (1973) established it.
+
+Question 2:
+What does the doctrine limit?
+(A) Executive power
+(B) Judicial review
+(C) Amending power
+(D) Federalism
+Answer: (C)
+Explanation: It limits Parliament's amending power under Article 368.
+"""
+
+def reference_parse_mcqs(raw_text):
+    """The original regex implementation of parse_mcqs, kept to check the rewrite against"""
+    question_blocks = re.findall(
+        r'(Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s).*?)(?=Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)|\Z)',
+        raw_text, re.DOTALL | re.IGNORECASE
+    )
+    if not question_blocks:
+        return []
+    passage = re.split(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)', raw_text, maxsplit=1, flags=re.IGNORECASE)[0].strip()
+    structured_questions = []
+    for idx, block in enumerate(question_blocks, start=1):
+        q_text_match = re.match(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)+(.*?)(?=\(A\)|A\))', block, re.DOTALL | re.IGNORECASE)
+        if q_text_match:
+            question = q_text_match.group(1).strip()
+        else:
+            after_q = re.split(r'Q(?:uestion)?\s*\d+[:\.]?(?:\n|\s)+', block, maxsplit=1, flags=re.IGNORECASE)[-1]
+            lines = [l.strip() for l in after_q.split('\n') if l.strip()]
+            question = lines[0] if lines else "Unknown question"
+        if question == "Unknown question" or len(question) < 5:
+            continue
+        options = []
+        for opt in ['A', 'B', 'C', 'D']:
+            pattern = rf'\({opt}\)\s*(.+?)(?=\n\([A-D]\)|\nAnswer:|\nExplanation:|\n\Z)'
+            match = re.search(pattern, block, re.DOTALL)
+            options.append(match.group(1).strip() if match else f"Option {opt} missing")
+        ans_match = re.search(r'Answer:\s*\(([A-D])\)', block)
+        correct_letter = ans_match.group(1).strip().upper() if ans_match else 'A'
+        exp_match = re.search(r'Explanation:\s*(.*)', block, re.DOTALL)
+        explanation = exp_match.group(1).strip() if exp_match else "Explanation not available"
+        structured_questions.append({
+            "id": idx,
+            "passage": passage,
+            "question": question,
+            "options": options,
+            "correct": ord(correct_letter) - ord('A'),
+            "explanation": explanation
+        })
+    return structured_questions
+
+FRAGMENTS = [
+    "Question 1:", "Question 2:\n", "Question 3\n", "Q3. ", "q4 ", "Iraq 5 ", "QUESTION 6.\t",
+    "(A)", "(B)", "(C)", "(D)", "(a)", "a)", "A)", "para)", "\n(", ")", "1", "12", ":", ".",
+    "Answer:", "Answer: (B)", "Answer:  (C)", "Answer:\n(D)", "\nAnswer:",
+    "Explanation:", "Explanation: because", "\n", "\n\n", "\r\n", " ", "  ", "\t",
+    "word", "text here ok", "(A) opt one", "\n(B) two", "\n(C)", "\n(D) four\n",
+]
+
+def test_parse_mcqs_sample():
+    questions = app.parse_mcqs(SAMPLE)
+    assert [q.id for q in questions] == [1, 2]
+    assert questions[0].passage.startswith("The doctrine of basic structure")
+    # Questions share their passage rather than copying it
+    assert questions[0].passage is questions[1].passage
+    assert questions[0].question == "Which case established the doctrine?"
+    assert questions[0].options == ["Golaknath", "Kesavananda Bharati", "Minerva Mills", "Shankari Prasad"]
+    assert questions[0].correct == 1
+    assert questions[1].correct == 2
+    assert questions[1].explanation == "It limits Parliament's amending power under Article 368."
+
+def test_parse_mcqs_defaults_and_skipped_blocks():
+    questions = app.parse_mcqs("Intro\nQuestion 1:\nHi\nQuestion 2:\nWhat is missing here?\n(A) Only one\n")
+    # Question 1 is too short and skipped, but still counts towards the ids
+    assert len(questions) == 1
+    assert questions[0].id == 2
+    assert questions[0].options == ["Only one", "Option B missing", "Option C missing", "Option D missing"]
+    assert questions[0].correct == 0
+    assert questions[0].explanation == "Explanation not available"
+    assert app.parse_mcqs("No numbered questions at all") == []
+
+def test_parse_mcqs_matches_reference_implementation():
+    rng = random.Random(12)
+    for _ in range(20000):
+        text = "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 50)))
+        assert [q.to_dict() for q in app.parse_mcqs(text)] == reference_parse_mcqs(text), repr(text)
+
+def test_parse_mcqs_is_linear_on_malformed_output():
+    # An option label repeated with nothing ending it made the regex version quadratic
+    text = "Question 1:\nWhat happens next?\n" + "(A) x " * 20000
+    started = time.perf_counter()
+    questions = app.parse_mcqs(text)
+    assert time.perf_counter() - started < 0.5
+    assert questions[0].options[0] == "Option A missing"
+
+def test_stream_parser_matches_parse_mcqs():
+    rng = random.Random(13)
+    texts = [SAMPLE] + ["".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 50))) for _ in range(5000)]
+    for text in texts:
+        parser = app.MCQStreamParser()
+        events = []
+        pos = 0
+        while pos < len(text):
+            step = rng.randint(1, 8)
+            events += parser.feed(text[pos:pos + step])
+            pos += step
+        events += parser.close()
+        expected = app.parse_mcqs(text)
+        assert [value for kind, value in events if kind == 'question'] == expected, repr(text)
+        passages = [value for kind, value in events if kind == 'passage']
+        assert passages == ([expected[0].passage] if expected else passages[:1]), repr(text)
+
+def test_stream_parser_emits_questions_as_they_close():
+    parser = app.MCQStreamParser()
+    first, rest = SAMPLE.split("Question 2:")
+    events = parser.feed(first)
+    assert [kind for kind, _ in events] == ['passage']
+    # The header is only complete once the whitespace after it arrives
+    assert parser.feed("Question 2:") == []
+    events = parser.feed(rest[:1])
+    assert [kind for kind, _ in events] == ['question']
+    assert events[0][1].question == "Which case established the doctrine?"
+    assert parser.feed(rest[1:]) == []
+    assert [value.id for _, value in parser.close()] == [2]
+
+STRUCTURED = {
+    "passage": "The doctrine of basic structure limits Parliament's amending power.",
+    "questions": [{
+        "question": "Which case established the doctrine?",
+        "options": ["Golaknath", "Kesavananda Bharati", "Minerva Mills", "Shankari Prasad"],
+        "answer": 1,
+        "explanation": "Kesavananda Bharati (1973) established it."
+    }]
+}
+
+def test_compile_schema_reports_first_error():
+    validate = app.validate_section_output
+    assert validate(STRUCTURED) is None
+    assert validate([]) == "$: expected object"
+    assert validate({"passage": "x"}) == "$: missing 'questions'"
+    question = dict(STRUCTURED["questions"][0])
+    for field, value, error in [
+        ("answer", 4, "$.questions[].answer: must be at most 3"),
+        ("answer", True, "$.questions[].answer: expected integer"),
+        ("options", ["a", "b", "c"], "$.questions[].options: needs at least 4 items"),
+        ("options", ["a", "b", "c", 4], "$.questions[].options[]: expected string"),
+        ("question", "  ", "$.questions[].question: must be at least 5 characters"),
+    ]:
+        bad = {**STRUCTURED, "questions": [{**question, field: value}]}
+        assert validate(bad) == error
+    visual = {"type": "bar", "labels": ["North"], "values": [1.5]}
+    assert app.validate_qt_output({**STRUCTURED, "visualData": visual}) is None
+    assert app.validate_qt_output({**STRUCTURED, "visualData": {**visual, "type": "radar"}}) is not None
+    assert app.validate_qt_visual_output(STRUCTURED) == "$: missing 'visualData'"
+
+def test_load_structured_output():
+    text = json.dumps(STRUCTURED)
+    assert app.load_structured_output(text, app.validate_section_output, "test") == STRUCTURED
+    assert app.load_structured_output(f"```json\n{text}\n```", app.validate_section_output, "test") == STRUCTURED
+    assert app.load_structured_output(text[:-1], app.validate_section_output, "test") is None
+    assert app.load_structured_output('{"passage": "x"}', app.validate_section_output, "test") is None
+
+def test_structured_section_matches_text_layout():
+    section = app.structured_section("Legal Reasoning", STRUCTURED)
+    assert section.structured is True
+    assert section.raw.startswith("Topic: Legal Reasoning\n\nThe doctrine")
+    # The rendered text parses back to the same questions
+    assert app.parse_mcqs(section.raw) == section.questions
+    assert section.questions[0].correct == 1
+    assert section.questions[0].options[1] == "Kesavananda Bharati"
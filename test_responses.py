@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Tests for the JSON and PDF responses app.py sends (no server or Groq key needed)
+"""
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+import app
+import pdf_render
+from test_parsers import SAMPLE
+
+@pytest.fixture(autouse=True)
+def render_pdfs_inline(monkeypatch):
+    # Render every PDF the tests ask for, in the test process; the cache and the
+    # render pool have their own tests
+    monkeypatch.setattr(app, 'pdf_render_cache', app.PDFRenderCache(None, 0))
+    monkeypatch.setattr(app, 'PDF_RENDER_WORKERS', 0)
+
+def sample_sections(topic, count, fresh=False, priority=None):
+    return [app.make_section(SAMPLE.replace("basic structure", f"passage {n}")) for n in range(count)]
+
+def test_compact_responses_list_each_passage_once(monkeypatch):
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+
+    full = client.post('/generate-test', json={'topic': 'general-legal', 'count': 2}).get_json()
+    compact = client.post('/generate-test', json={'topic': 'general-legal', 'count': 2, 'compact': True}).get_json()
+    assert 'passages' not in full
+    assert len(compact['passages']) == 2
+    assert [q['passageIndex'] for q in compact['test']] == [0, 0, 1, 1]
+    expanded = [{**{k: v for k, v in q.items() if k != 'passageIndex'}, 'passage': compact['passages'][q['passageIndex']]}
+                for q in compact['test']]
+    assert expanded == full['test']
+    assert compact['answer_key'] == full['answer_key']
+    assert [(a['question'], a['answer']) for a in full['answer_key']] == [(1, 'B'), (2, 'C'), (3, 'B'), (4, 'C')]
+
+    body = {'section': 'legal', 'subcategory': 'general-legal', 'passages': 2}
+    full = client.post('/api/generate-practice', json=body).get_json()
+    compact = client.post('/api/generate-practice', json={**body, 'compact': True}).get_json()
+    assert len(compact['passages']) == 2
+    assert [{**q, 'passage': compact['passages'][q['passageIndex']]} for q in compact['questions']] == full['questions']
+
+def test_large_responses_are_compressed_when_accepted(monkeypatch):
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    body = {'topic': 'general-legal', 'count': 5}
+    plain = client.post('/generate-test', json=body)
+    compressed = client.post('/generate-test', json=body, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert len(compressed.data) < len(plain.data) / 3
+    assert json.loads(gzip.decompress(compressed.data))['test'] == plain.get_json()['test']
+    # Below the threshold bodies are left alone
+    small = client.post('/generate-test', json={}, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+def test_static_files_are_served_precompressed(monkeypatch):
+    monkeypatch.setattr(app, 'static_assets', app.load_static_assets())
+    client = app.app.test_client()
+    raw = client.get('/practice-online.html')
+    with open('practice-online.html', 'rb') as f:
+        assert raw.data == f.read()
+    compressed = client.get('/practice-online.html', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == raw.data
+    assert compressed.headers['ETag'] != raw.headers['ETag']
+    cached = client.get('/practice-online.html', headers={'Accept-Encoding': 'gzip',
+                                                          'If-None-Match': compressed.headers['ETag']})
+    assert cached.status_code == 304
+
+def test_only_served_files_are_precompressed(tmp_path):
+    for name in ('index.html', 'radix-icons/home.svg', '.venv/lib/site.js', 'node_modules/pkg/index.js', 'notes.txt'):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_text('<svg></svg>' * 200)
+    assert sorted(app.load_static_assets(str(tmp_path))) == ['index.html', 'radix-icons/home.svg']
+
+def test_json_providers_agree(monkeypatch):
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    bodies = []
+    for provider in (app.ModelJSONProvider, app.select_json_provider('orjson')):
+        monkeypatch.setattr(app.app, 'json', provider(app.app))
+        response = client.post('/generate-test', json={'topic': 'general-legal', 'count': 2, 'compact': True})
+        assert response.status_code == 200
+        body = json.loads(response.data)
+        del body['timestamp'], body['test_id']
+        bodies.append(body)
+    assert bodies[0] == bodies[1]
+
+def test_json_providers_write_dates_the_same_way():
+    from datetime import date, datetime, timezone
+    value = {'at': datetime(2024, 5, 1, 9, 30, tzinfo=timezone.utc), 'on': date(2024, 5, 1), 'é': 'ü'}
+    stdlib, fast = (provider(app.app) for provider in (app.ModelJSONProvider, app.select_json_provider('orjson')))
+    assert json.loads(fast.dumps(value)) == json.loads(stdlib.dumps(value)) == {
+        'at': 'Wed, 01 May 2024 09:30:00 GMT', 'on': 'Wed, 01 May 2024 00:00:00 GMT', 'é': 'ü'}
+    with app.app.test_request_context():
+        assert json.loads(fast.response(value).data) == json.loads(stdlib.response(value).data)
+
+LEXA_REPLY = "## Article 21\n\n\n\n**Right to life** covers <b>privacy</b>  too (Puttaswamy, 2017)."
+
+class FakeGroqStream:
+    """A streamed Groq reply that can drop the connection after some lines"""
+    status_code = 200
+    headers = {}
+
+    def __init__(self, lines, fail_after=None):
+        self.lines = lines
+        self.fail_after = fail_after
+
+    def iter_lines(self):
+        for n, line in enumerate(self.lines):
+            if n == self.fail_after:
+                raise app.requests.exceptions.ChunkedEncodingError('connection reset')
+            yield line
+
+    def close(self):
+        pass
+
+class FakeGroq:
+    """A Groq session answering every call with LEXA_REPLY, streamed in small pieces"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+
+    def post(self, url, **kwargs):
+        if kwargs['json'].get('stream'):
+            lines = [b'data: ' + json.dumps({'choices': [{'delta': {'content': LEXA_REPLY[i:i + 5]}}]}).encode()
+                     for i in range(0, len(LEXA_REPLY), 5)]
+            return FakeGroqStream(lines + [b'data: [DONE]'], self.fail_after)
+        response = app.requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(json.dumps({'choices': [{'message': {'content': LEXA_REPLY}}]}).encode())
+        return response
+
+def sse_frames(body):
+    frames = []
+    for block in body.decode().strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        frames.append((fields.get('event'), json.loads(fields['data'])))
+    return frames
+
+def test_lexa_chat_streams_the_cleaned_reply(monkeypatch):
+    monkeypatch.setattr(app, 'GROQ_API_KEY', 'test')
+    monkeypatch.setattr(app, 'llm_cache', app.LLMResponseCache(1024 * 1024))
+    monkeypatch.setattr(app, 'groq_scheduler', app.GroqScheduler(rpm=0, tpm=0, max_wait=1))
+    monkeypatch.setattr(app, 'groq_resilience', app.GroqResilience(5, 30, 95, 20))
+    monkeypatch.setattr(app, 'get_groq_session', lambda: FakeGroq())
+    client = app.app.test_client()
+    body = {'message': 'What does Article 21 protect?', 'fresh': True}
+    reply = client.post('/lexa/chat', json=body).get_json()['response']
+    assert reply == app.clean_formatting_artifacts(LEXA_REPLY) != LEXA_REPLY
+
+    streamed = client.post('/lexa/chat', json={**body, 'stream': True})
+    assert streamed.mimetype == 'text/event-stream'
+    frames = sse_frames(streamed.data)
+    assert "".join(data['delta'] for event, data in frames if event is None) == reply
+    assert frames[-1][0] == 'done' and frames[-1][1]['status'] == 'success'
+
+    # Groq dropping the connection mid-reply ends the stream with an error event
+    monkeypatch.setattr(app, 'get_groq_session', lambda: FakeGroq(fail_after=3))
+    frames = sse_frames(client.post('/lexa/chat', json={**body, 'stream': True}).data)
+    assert frames[-1][0] == 'error' and all(event is None for event, _ in frames[:-1])
+    assert reply.startswith("".join(data['delta'] for _, data in frames[:-1]))
+
+def test_answer_key_pdf_embeds_the_watermark_once():
+    fitz = app.fitz
+    questions = [q for _ in range(8) for q in app.parse_mcqs(SAMPLE)]
+    answer_key = [app.AnswerKeyEntry.for_question(i, q) for i, q in enumerate(questions, 1)]
+    pdf = fitz.open(stream=pdf_render.create_answer_key_pdf(questions, answer_key, {}).getvalue())
+    assert pdf.page_count > 1
+    assert {image[0] for page in pdf for image in page.get_images()} == {pdf_render.get_watermark_template()[1]}
+    text = "".join(page.get_text() for page in pdf)
+    assert "Answer Key Summary:" in text and "Q16" in text
+    assert text.count("Kesavananda Bharati (1973) established it.") == 8
+
+def test_answer_keys_fill_pages_to_the_bottom_margin():
+    # Some lengths end a block exactly where the next one has no room left at all
+    base = app.parse_mcqs(SAMPLE)
+    for n in range(1, 13):
+        questions = base * n
+        answer_key = [app.AnswerKeyEntry.for_question(i, q) for i, q in enumerate(questions, 1)]
+        assert pdf_render.create_answer_key_pdf(questions, answer_key, {}) is not None, n
+
+def test_practice_pdf_keeps_unicode_text(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'take_sections', lambda topic, count, fresh=False, priority=None: [
+        app.make_section(SAMPLE.replace("Golaknath", "Fine of ₹5,000 – “Golaknath”"))])
+    # Load a copy of the font so any cache file written beside it would show up
+    font_path = shutil.copy(pdf_render.PDF_FONT_PATH, tmp_path)
+    monkeypatch.setattr(pdf_render, 'PDF_FONT_PATH', font_path)
+    monkeypatch.setattr(pdf_render, '_pdf_font', None)
+    client = app.app.test_client()
+    for _ in range(2):
+        response = client.post('/download-pdf', json={'topic': 'legal-reasoning'})
+        assert response.status_code == 200
+        text = "".join(page.get_text() for page in app.fitz.open(stream=response.data))
+        assert "Fine of ₹5,000 – “Golaknath”" in text
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['DejaVuSans.ttf']
+
+def test_practice_pdfs_do_not_depend_on_the_render_time(monkeypatch):
+    import datetime
+    import fpdf.fpdf
+    renders = []
+    for year in (2001, 2002):
+        monkeypatch.setattr(fpdf.fpdf, 'datetime', type('clock', (), {'now': staticmethod(lambda: datetime.datetime(year, 1, 1))}))
+        renders.append(pdf_render.create_pdf([SAMPLE], 'Legal Reasoning Practice').getvalue())
+    assert renders[0] == renders[1]
+
+def test_downloads_render_the_stored_test(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'test_store', app.GeneratedTestStore(1024 * 1024, directory=str(tmp_path)))
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    body = client.post('/generate-test', json={'topic': 'general-legal', 'count': 2, 'compact': True}).get_json()
+
+    def no_generation(*args, **kwargs):
+        raise AssertionError("downloads of a stored test must not generate a new one")
+    monkeypatch.setattr(app, 'take_sections', no_generation)
+    # Another worker only has the copy on disk
+    monkeypatch.setattr(app, 'test_store', app.GeneratedTestStore(1024 * 1024, directory=str(tmp_path)))
+
+    response = client.post('/download-pdf', json={'test_id': body['test_id']})
+    assert response.status_code == 200
+    text = "".join(page.get_text() for page in app.fitz.open(stream=response.data))
+    assert "doctrine of passage 0" in text and "doctrine of passage 1" in text
+    assert f"{body['mapped_topic']} Practice Set" in text
+
+    response = client.post('/download-answer-key', json={'test_id': body['test_id'], 'test_metadata': {}})
+    assert response.status_code == 200
+    text = "".join(page.get_text() for page in app.fitz.open(stream=response.data))
+    assert "Q4" in text and text.count("Kesavananda Bharati (1973) established it.") == 2
+
+    stored = app.test_store.load(body['test_id'])
+    expanded = [{**{k: v for k, v in q.items() if k != 'passageIndex'}, 'passage': body['passages'][q['passageIndex']]}
+                for q in body['test']]
+    assert [q.to_dict() for q in stored['questions']] == expanded
+    assert [a.to_dict() for a in stored['answer_key']] == body['answer_key']
+    for test_id in ('0' * 32, '../../etc/passwd', 7):
+        assert client.post('/download-pdf', json={'test_id': test_id}).status_code == 404
+    # /health reports the counters that mean something for stored tests
+    stats = client.get('/health').get_json()['test_store']
+    assert 'bypassed' not in stats and stats['disk_hits'] == 1 and stats['expired'] == 0
+
+def test_pdf_downloads_leave_no_temp_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    monkeypatch.setattr(app, 'test_store', app.GeneratedTestStore(1024 * 1024))
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    body = client.post('/generate-test', json={'topic': 'general-legal', 'count': 1}).get_json()
+    for _ in range(5):
+        for response in (
+            client.post('/download-pdf', json={'topic': 'legal-reasoning'}),
+            client.post('/download-pdf', json={'test_id': body['test_id']}),
+            client.post('/download-answer-key', json={'questions': body['test'], 'answer_key': body['answer_key']}),
+            client.get(f"/download-answer-key/{body['test_id']}?sectionName=Legal"),
+        ):
+            assert response.status_code == 200
+            assert response.headers['Content-Length'] == str(len(response.data))
+    assert list(tmp_path.iterdir()) == []
+
+def test_pdf_downloads_support_ranges_and_etags(monkeypatch):
+    monkeypatch.setattr(app, 'test_store', app.GeneratedTestStore(1024 * 1024))
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    test_id = client.post('/generate-test', json={'topic': 'general-legal', 'count': 1}).get_json()['test_id']
+    url = f"/download-answer-key/{test_id}?sectionName=Legal&subcategoryName=General"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    assert 'Answer_Key_Legal_General_' in full.headers['Content-Disposition']
+    etag = full.headers['ETag']
+
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    part = client.get(url, headers={'Range': 'bytes=100-199', 'If-Range': etag})
+    assert part.status_code == 206
+    assert part.headers['Content-Range'] == f"bytes 100-199/{len(full.data)}"
+    assert part.data == full.data[100:200]
+    unsatisfiable = client.get(url, headers={'Range': f"bytes={len(full.data)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers['Content-Range'] == f"bytes */{len(full.data)}"
+    assert client.get('/download-pdf/' + '0' * 32).status_code == 404
+
+def test_answer_keys_are_rendered_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, 'pdf_render_cache', app.PDFRenderCache(str(tmp_path), 16 * 1024 * 1024))
+    renders = []
+    create_answer_key_pdf = pdf_render.create_answer_key_pdf
+    monkeypatch.setattr(pdf_render, 'create_answer_key_pdf', lambda *args: renders.append(args) or create_answer_key_pdf(*args))
+    monkeypatch.setattr(app, 'take_sections', sample_sections)
+    client = app.app.test_client()
+    body = client.post('/generate-test', json={'topic': 'general-legal', 'count': 1}).get_json()
+    posted = {'questions': body['test'], 'answer_key': body['answer_key'], 'test_metadata': {}}
+
+    first = client.post('/download-answer-key', json=posted)
+    # The stored copy of the same test hashes to the same cached PDF
+    again = client.get(f"/download-answer-key/{body['test_id']}")
+    assert again.data == first.data and again.headers['ETag'] == first.headers['ETag']
+    assert client.get(f"/download-answer-key/{body['test_id']}",
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert len(renders) == 1
+
+    # Any change to what is rendered is a different PDF
+    client.post('/download-answer-key', json={**posted, 'test_metadata': {'sectionName': 'Legal'}})
+    monkeypatch.setattr(app, 'PDF_RENDERER_VERSION', app.PDF_RENDERER_VERSION + 1)
+    client.post('/download-answer-key', json=posted)
+    assert len(renders) == 3
+    assert app.pdf_render_cache.stats()['hits'] == 2
+
+def test_pdf_cache_evicts_least_recently_used(tmp_path):
+    cache = app.PDFRenderCache(str(tmp_path), 250)
+    a, b, c = ('a' * 64, 'b' * 64, 'c' * 64)
+    cache.put(a, b'x' * 100)
+    cache.put(b, b'y' * 100)
+    os.utime(cache.disk.path(a), (1, 1))
+    os.utime(cache.disk.path(b), (2, 2))
+    # Reading a makes b the least recently used
+    assert cache.get(a) == b'x' * 100
+    cache.put(c, b'z' * 100)
+    assert cache.get(b) is None
+    assert cache.get(a) == b'x' * 100 and cache.get(c) == b'z' * 100
+    assert cache.stats()['evictions'] == 1
+
+def test_pdfs_render_in_a_recycled_process_pool(monkeypatch):
+    monkeypatch.setattr(app, 'PDF_RENDER_WORKERS', 1)
+    monkeypatch.setattr(app, 'PDF_RENDER_MAX_TASKS', 2)
+    questions = app.parse_mcqs(SAMPLE)
+    content = {
+        'questions': [q.to_dict() for q in questions],
+        'answer_key': [app.AnswerKeyEntry.for_question(i, q).to_dict() for i, q in enumerate(questions, 1)],
+        'test_metadata': {},
+    }
+    pool = app.get_pdf_render_pool()
+    try:
+        # Each process is replaced after two tasks
+        pids = [pool.submit(os.getpid).result() for _ in range(4)]
+        assert pids[0] == pids[1] != pids[2] == pids[3] != os.getpid()
+        # Render processes load the renderer, not the app
+        assert pool.submit(eval, "'pdf_render' in __import__('sys').modules").result()
+        assert not pool.submit(eval, "'app' in __import__('sys').modules").result()
+
+        assert app.render_pdf('answer-key', content) == pdf_render.render_pdf_job('answer-key', content)
+        practice = {'contents': [SAMPLE], 'title': "Legal Reasoning Practice Set"}
+        assert "Kesavananda Bharati" in "".join(
+            page.get_text() for page in app.fitz.open(stream=app.render_pdf('practice', practice)))
+
+        # A render that runs too long stops itself and leaves the pool working
+        monkeypatch.setattr(app, 'PDF_RENDER_TIMEOUT', 0.001)
+        with pytest.raises(app.GenerationError) as e:
+            app.render_pdf('answer-key', content)
+        assert e.value.status == 503
+        monkeypatch.setattr(app, 'PDF_RENDER_TIMEOUT', 20)
+        assert app.get_pdf_render_pool() is pool
+        assert app.render_pdf('practice', practice)
+
+        # Retiring a pool lets the renders it is running finish
+        running = pool.submit(time.sleep, 0.2)
+        app.retire_pdf_render_pool(pool)
+        assert running.result(timeout=5) is None
+        assert app.get_pdf_render_pool() is not pool
+    finally:
+        if app._pdf_render_pool:
+            app._pdf_render_pool.shutdown()
+            app._pdf_render_pool = None